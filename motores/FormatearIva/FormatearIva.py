@@ -4,24 +4,50 @@
 # Comentario tecnico: declara codificacion UTF-8 para permitir literales unicode en el archivo.
 """
 Motor FormatearIva.
-Procesa reporte Amazon (.txt) y base IVA (.csv/.xlsx) para actualizar la base
+Procesa reporte Amazon (.txt, tambien .gz/.bz2/.xz/.zip) y base IVA (.csv/.xlsx) para actualizar la base
 in-place, generar previsualizacion CSV y un reporte detallado.
 """
 # Comentario tecnico: el docstring resume el flujo de procesamiento y efectos en archivos.
 # Comentario tecnico: argparse gestiona el parsing de argumentos CLI del motor.
 import argparse
+import bz2
+import concurrent.futures
+import cProfile
 # Comentario tecnico: csv aporta lectura y escritura con delimitadores para TXT/CSV.
 import csv
+import glob
+import gzip
+import hashlib
+import heapq
+import html
+import io
+import itertools
+import json
+import lzma
+import multiprocessing
+import operator
 # Comentario tecnico: os provee operaciones de filesystem y resolucion de rutas.
 import os
+import pickle
+import pstats
+import queue
 import subprocess
 import tempfile
 import re
+import shutil
+import signal
+import sqlite3
+import struct
+import threading
+import time
+import tracemalloc
 import uuid
 import zipfile
+import zlib
 # Comentario tecnico: sys permite manipular sys.path y escribir errores en stderr.
 import sys
 # Comentario tecnico: OrderedDict preserva orden de insercion en los mapas de ASIN.
+from array import array
 from collections import OrderedDict
 # Comentario tecnico: datetime genera marcas de tiempo para el reporte final.
 from datetime import datetime
@@ -136,6 +162,105 @@ def _normalize_iva(value):
     return s
 
 
+# Comentario tecnico: los ASIN ASCII de hasta _CLAVE_BYTES caracteres se guardan como el entero de sus bytes (little
+# endian): 36 bytes por clave contra 59 de un str de 10 caracteres. Un NUL final no sobreviviria al rstrip, asi que
+# esos ASIN (y los no ASCII o mas largos) quedan como str; un int nunca es igual a un str, no hay colisiones.
+_CLAVE_BYTES = 16
+
+
+def _clave_asin(asin):
+    if len(asin) <= _CLAVE_BYTES and asin.isascii() and asin[-1:] != '\x00':
+        return int.from_bytes(asin.encode('ascii'), 'little')
+    return asin
+
+
+def _asin_clave(clave):
+    if clave.__class__ is str:
+        return clave
+    return clave.to_bytes(_CLAVE_BYTES, 'little').rstrip(b'\x00').decode('ascii')
+
+
+# Comentario tecnico: almacen compacto de la base: ASIN -> IVA en orden de insercion.
+# Cada ASIN se guarda una sola vez (como clave, empaquetada con _clave_asin) y el IVA como un codigo entero que
+# indexa la tabla de valores distintos; los codigos son objetos compartidos, asi que por registro solo existen la
+# clave y su entrada del dict.
+class _BaseIva:
+    __slots__ = ('_registros', '_valores', '_codigos')
+
+    def __init__(self):
+        self._registros = {}
+        self._valores = ['SI', 'NO', '']
+        self._codigos = {'SI': 0, 'NO': 1, '': 2}
+
+    def _codigo(self, iva):
+        codigo = self._codigos.get(iva)
+        if codigo is None:
+            codigo = len(self._valores)
+            self._valores.append(iva)
+            self._codigos[iva] = codigo
+        return codigo
+
+    def __len__(self):
+        return len(self._registros)
+
+    def __contains__(self, asin):
+        return _clave_asin(asin) in self._registros
+
+    def __iter__(self):
+        return map(_asin_clave, self._registros)
+
+    def __getitem__(self, asin):
+        return self._valores[self._registros[_clave_asin(asin)]]
+
+    def __setitem__(self, asin, iva):
+        self._registros[_clave_asin(asin)] = self._codigo(iva)
+
+    def get(self, asin, default=None):
+        codigo = self._registros.get(_clave_asin(asin))
+        return default if codigo is None else self._valores[codigo]
+
+    # Comentario tecnico: asigna el IVA y retorna el anterior (None si el ASIN es nuevo) empaquetando la clave una vez.
+    def reemplazar(self, asin, iva):
+        clave = _clave_asin(asin)
+        codigo = self._registros.get(clave)
+        self._registros[clave] = self._codigo(iva)
+        return None if codigo is None else self._valores[codigo]
+
+    # Comentario tecnico: pares (ASIN, IVA) en orden, de desde a hasta (sin incluir). Si el tramo esta mas cerca
+    # del final se recorre el dict al reves, asi el costo depende de lo que se pide y no de los registros previos.
+    def items(self, desde=0, hasta=None):
+        valores = self._valores
+        pares = self._registros.items()
+        total = len(self._registros)
+        hasta = total if hasta is None else min(hasta, total)
+        if desde >= hasta:
+            return iter(())
+        if desde > total - desde:
+            tramo = list(itertools.islice(reversed(pares), total - hasta, total - desde))
+            tramo.reverse()
+            pares = tramo
+        elif desde or hasta < total:
+            pares = itertools.islice(pares, desde, hasta)
+        # Comentario tecnico: _asin_clave en linea (es el recorrido de cada escritura de la base).
+        return ((clave.to_bytes(_CLAVE_BYTES, 'little').rstrip(b'\x00').decode('ascii')
+                 if clave.__class__ is int else clave, valores[codigo]) for clave, codigo in pares)
+
+    # Comentario tecnico: consolida una fila de la base; retorna True si el ASIN ya existia (SI gana).
+    def consolidar(self, asin, iva):
+        # Comentario tecnico: _clave_asin en linea (una llamada por fila de la base).
+        if len(asin) <= _CLAVE_BYTES and asin.isascii() and asin[-1:] != '\x00':
+            clave = int.from_bytes(asin.encode('ascii'), 'little')
+        else:
+            clave = asin
+        codigo = self._registros.get(clave)
+        if codigo is None:
+            self._registros[clave] = self._codigo(iva)
+            return False
+        if iva == 'SI' and codigo != 0:
+            self._registros[clave] = 0
+        return True
+
+
 # Comentario tecnico: lee la primera linea de un archivo de texto con BOM opcional.
 def _read_header_line(path):
     # Comentario tecnico: utf-8-sig elimina BOM y errors replace evita fallas por bytes invalidos.
@@ -147,7 +272,8 @@ def _read_header_line(path):
 
 
 # Comentario tecnico: carga la base en CSV y consolida IVA por ASIN preservando orden.
-def _load_base_csv(base_path):
+# base_map permite otro destino con el mismo metodo consolidar (el modo --max-memory vuelca las filas a disco).
+def _load_base_csv(base_path, base_map=None, progreso=None):
     # Comentario tecnico: lee encabezado para inferir delimitador y presencia de columnas.
     header_line = _read_header_line(base_path)
     # Comentario tecnico: si no hay encabezado, el archivo base es invalido.
@@ -170,50 +296,67 @@ def _load_base_csv(base_path):
         raise ValueError('No se encontro la columna IVA en el CSV base.')
 
     # Comentario tecnico: estructura base en memoria para consolidacion.
-    base_map = OrderedDict()
-    # Comentario tecnico: lista de duplicados para reporte y estadisticas.
-    base_duplicates = []
+    if base_map is None:
+        base_map = _BaseIva()
+    # Comentario tecnico: filas duplicadas eliminadas por ASIN (en orden de aparicion).
+    base_duplicates = {}
     # Comentario tecnico: contador de filas leidas (sin encabezado).
     total_rows = 0
 
+    asin_idx = header_map['asin']
+    iva_idx = header_map['iva']
+    # Comentario tecnico: solo hace falta cortar hasta la ultima columna proyectada (ASIN o IVA).
+    need = max(asin_idx, iva_idx) + 1
+    # Comentario tecnico: la base repite pocos valores de IVA; se normaliza una vez por texto crudo.
+    iva_cache = {}
+
     # Comentario tecnico: itera todas las filas del CSV base.
     with open(base_path, 'r', encoding='utf-8-sig', errors='replace', newline='') as f:
-        # Comentario tecnico: usa el delimitador detectado para lectura correcta.
-        reader = csv.reader(f, delimiter=delimiter)
         try:
-            # Comentario tecnico: descarta encabezado ya procesado.
-            next(reader)
+            # Comentario tecnico: descarta encabezado ya procesado (puede ocupar varias lineas con comillas).
+            next(csv.reader(f, delimiter=delimiter))
         except StopIteration:
             # Comentario tecnico: si no hay filas, retorna estructuras vacias y metadata.
-            return base_map, header_fields, header_map, delimiter, trailing_delim, total_rows, base_duplicates, header_line.rstrip('\r\n')
+            return (base_map, header_fields, header_map, delimiter, trailing_delim, total_rows, base_duplicates,
+                    header_line.rstrip('\r\n'))
+        lines = iter(_con_progreso(progreso, f, posicion=f.buffer.tell, tamano=os.path.getsize(base_path)))
         # Comentario tecnico: procesa cada fila y consolida duplicados.
-        for row in reader:
+        for line in lines:
+            # Comentario tecnico: sin comillas, split equivale a csv.reader; con comillas el registro se delega a
+            # csv.reader, que consume del mismo iterador las lineas de un campo multilinea.
+            if '"' in line:
+                row = next(csv.reader(itertools.chain((line,), lines), delimiter=delimiter), [])
+            else:
+                row = line.split(delimiter, need)
+                # Comentario tecnico: csv.reader entrega una fila vacia para las lineas en blanco.
+                if len(row) == 1 and not row[0].strip('\r\n'):
+                    row = []
             # Comentario tecnico: omite filas vacias.
             if not row:
                 continue
             # Comentario tecnico: incrementa contador de filas procesadas.
             total_rows += 1
             # Comentario tecnico: completa filas cortas para evitar accesos fuera de rango.
-            if len(row) < len(header_fields):
-                row += [''] * (len(header_fields) - len(row))
-            # Comentario tecnico: extrae ASIN y IVA desde columnas mapeadas.
-            asin = row[header_map['asin']].strip()
-            iva = row[header_map['iva']].strip()
+            if len(row) < need:
+                row += [''] * (need - len(row))
+            # Comentario tecnico: extrae ASIN desde su columna (el fin de linea se recorta junto con los espacios).
+            asin = row[asin_idx].strip()
             # Comentario tecnico: descarta filas sin ASIN.
             if not asin:
                 continue
             # Comentario tecnico: normaliza ASIN a mayusculas para clave canonica.
             asin_norm = asin.upper()
             # Comentario tecnico: normaliza IVA con el mismo criterio de salida.
-            iva_norm = _normalize_iva(iva)
-            # Comentario tecnico: si el ASIN ya existe, consolida priorizando SI.
-            if asin_norm in base_map:
-                base_duplicates.append(asin_norm)
-                if base_map[asin_norm]['IVA'] != 'SI' and iva_norm == 'SI':
-                    base_map[asin_norm]['IVA'] = 'SI'
-                continue
-            # Comentario tecnico: inserta el registro consolidado en el mapa base.
-            base_map[asin_norm] = {'ASIN': asin_norm, 'IVA': iva_norm}
+            iva = row[iva_idx]
+            try:
+                iva_norm = iva_cache[iva]
+            except KeyError:
+                iva_norm = _normalize_iva(iva.strip())
+                if len(iva_cache) < _CLASSIFY_CACHE_LIMIT:
+                    iva_cache[iva] = iva_norm
+            # Comentario tecnico: inserta el registro o, si el ASIN ya existe, consolida priorizando SI.
+            if base_map.consolidar(asin_norm, iva_norm):
+                base_duplicates[asin_norm] = base_duplicates.get(asin_norm, 0) + 1
 
     # Comentario tecnico: retorna mapa base y metadata necesaria para reescritura.
     return base_map, header_fields, header_map, delimiter, trailing_delim, total_rows, base_duplicates, header_line.rstrip('\r\n')
@@ -249,9 +392,9 @@ def _load_base_xlsx(base_path, sheet_name):
         raise ValueError('No se encontro la columna IVA en la hoja base.')
 
     # Comentario tecnico: estructura base en memoria para consolidacion.
-    base_map = OrderedDict()
-    # Comentario tecnico: lista de ASIN duplicados para reporte.
-    base_duplicates = []
+    base_map = _BaseIva()
+    # Comentario tecnico: filas duplicadas eliminadas por ASIN para el reporte.
+    base_duplicates = {}
     # Comentario tecnico: contador de filas con ASIN valido.
     total_rows = 0
     # Comentario tecnico: indices 1-based para acceder a celdas de Excel.
@@ -275,66 +418,851 @@ def _load_base_xlsx(base_path, sheet_name):
         asin_norm = asin.upper()
         # Comentario tecnico: normaliza IVA a SI/NO u otros literales.
         iva_norm = _normalize_iva(iva)
-        # Comentario tecnico: consolida duplicados priorizando SI.
-        if asin_norm in base_map:
-            base_duplicates.append(asin_norm)
-            if base_map[asin_norm]['IVA'] != 'SI' and iva_norm == 'SI':
-                base_map[asin_norm]['IVA'] = 'SI'
-            continue
-        # Comentario tecnico: inserta nuevo ASIN en el mapa base.
-        base_map[asin_norm] = {'ASIN': asin_norm, 'IVA': iva_norm}
+        # Comentario tecnico: inserta el ASIN o consolida duplicados priorizando SI.
+        if base_map.consolidar(asin_norm, iva_norm):
+            base_duplicates[asin_norm] = base_duplicates.get(asin_norm, 0) + 1
 
     # Comentario tecnico: retorna libro, hoja, metadata y conteos para el flujo principal.
     return wb, ws, sheet_name, base_map, header_fields, header_map, total_rows, base_duplicates
 
 
-# Comentario tecnico: carga filas del reporte Amazon normalizadas a un dict minimal.
-def _load_reporte_rows(reporte_path):
-    # Comentario tecnico: lee encabezado para detectar delimitador.
-    header_line = _read_header_line(reporte_path)
+# Comentario tecnico: obtiene el nombre local de un tag XML sin namespace.
+def _local_tag(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+# Comentario tecnico: obtiene el prefijo de namespace '{uri}' de un tag XML.
+def _tag_ns(tag):
+    if tag.startswith('{'):
+        return tag[:tag.index('}') + 1]
+    return ''
+
+
+# Comentario tecnico: convierte una referencia de celda (AB12) a indice de columna 1-based.
+def _col_index(ref):
+    idx = 0
+    for ch in ref:
+        code = ord(ch)
+        if 65 <= code <= 90:
+            idx = idx * 26 + code - 64
+        elif 97 <= code <= 122:
+            idx = idx * 26 + code - 96
+        else:
+            break
+    return idx
+
+
+# Comentario tecnico: convierte un indice de columna 1-based a letras de Excel.
+def _col_letter(idx):
+    letters = ''
+    while idx > 0:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+# Comentario tecnico: resuelve el Target de una relacion a una ruta dentro del zip.
+def _resolve_part(target, base_dir='xl'):
+    if target.startswith('/'):
+        return target.lstrip('/')
+    parts = []
+    for piece in (base_dir + '/' + target).split('/'):
+        if piece == '..':
+            if parts:
+                parts.pop()
+        elif piece and piece != '.':
+            parts.append(piece)
+    return '/'.join(parts)
+
+
+# Comentario tecnico: lista (nombre, parte) de las hojas leyendo solo workbook.xml y sus relaciones.
+def _xlsx_sheets(zf):
+    rels = {}
+    try:
+        rels_root = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+        for rel in rels_root:
+            rels[rel.get('Id')] = rel.get('Target', '')
+    except KeyError:
+        pass
+    root = ET.fromstring(zf.read('xl/workbook.xml'))
+    sheets = []
+    for elem in root.iter():
+        if _local_tag(elem.tag) != 'sheet':
+            continue
+        rel_id = None
+        for key, value in elem.attrib.items():
+            if key.startswith('{') and _local_tag(key) == 'id':
+                rel_id = value
+                break
+        target = rels.get(rel_id)
+        sheets.append((elem.get('name', ''), _resolve_part(target) if target else None))
+    return sheets
+
+
+# Comentario tecnico: concatena el texto de un <si>/<is> incluyendo runs enriquecidos.
+def _xlsx_si_text(elem):
+    parts = []
+    for child in elem:
+        name = _local_tag(child.tag)
+        if name == 't':
+            parts.append(child.text or '')
+        elif name == 'r':
+            for sub in child:
+                if _local_tag(sub.tag) == 't':
+                    parts.append(sub.text or '')
+    return ''.join(parts)
+
+
+# Comentario tecnico: carga la tabla de strings compartidos en streaming (opcionalmente solo hasta un indice).
+def _xlsx_shared_strings(zf, limit=None):
+    strings = []
+    try:
+        fh = zf.open('xl/sharedStrings.xml')
+    except KeyError:
+        return strings
+    with fh:
+        root = None
+        for event, elem in ET.iterparse(fh, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                continue
+            if _local_tag(elem.tag) == 'si':
+                strings.append(_xlsx_si_text(elem))
+                # Comentario tecnico: libera los <si> ya leidos para mantener memoria acotada.
+                root.clear()
+                if limit is not None and len(strings) > limit:
+                    break
+    return strings
+
+
+# Comentario tecnico: convierte un numero en texto al tipo que devuelve openpyxl.
+def _xlsx_number(text):
+    try:
+        if '.' in text or 'E' in text or 'e' in text:
+            return float(text)
+        return int(text)
+    except ValueError:
+        return text
+
+
+# Comentario tecnico: obtiene el valor de una celda <c> con el mismo tipado que openpyxl.
+def _xlsx_cell_value(cell, ns, shared_strings):
+    cell_type = cell.get('t', 'n')
+    if cell_type == 'inlineStr':
+        inline = cell.find(ns + 'is')
+        return _xlsx_si_text(inline) if inline is not None else None
+    value = cell.find(ns + 'v')
+    if value is None or value.text is None:
+        return None
+    text = value.text
+    if cell_type == 's':
+        return shared_strings[int(text)]
+    if cell_type == 'n':
+        return _xlsx_number(text)
+    if cell_type == 'b':
+        return text.strip() in ('1', 'true')
+    return text
+
+
+# Comentario tecnico: extrae valores de las columnas pedidas de un <row> y su ultima columna.
+def _xlsx_row_values(row, ns, shared_strings, columns=None):
+    values = {}
+    col = 0
+    for cell in row:
+        ref = cell.get('r')
+        col = _col_index(ref) if ref else col + 1
+        if columns is None or col in columns:
+            values[col] = _xlsx_cell_value(cell, ns, shared_strings)
+    return values, col
+
+
+# Comentario tecnico: recorre los <row> de una hoja con iterparse liberando cada fila ya leida.
+def _iter_xlsx_rows(fh):
+    sheet_data = None
+    ns = None
+    row_tag = None
+    row_num = 0
+    for event, elem in ET.iterparse(fh, events=('start', 'end')):
+        if event == 'start':
+            if ns is None:
+                ns = _tag_ns(elem.tag)
+                row_tag = ns + 'row'
+            elif sheet_data is None and elem.tag == ns + 'sheetData':
+                sheet_data = elem
+            continue
+        if elem.tag != row_tag:
+            continue
+        ref = elem.get('r')
+        row_num = int(ref) if ref else row_num + 1
+        yield row_num, elem, ns
+        # Comentario tecnico: descarta la fila procesada para que la memoria no crezca con la hoja.
+        if sheet_data is not None:
+            sheet_data.clear()
+        else:
+            elem.clear()
+
+
+# Comentario tecnico: carga la base XLSX en streaming leyendo solo la hoja y las columnas ASIN/IVA.
+def _load_base_xlsx_stream(base_path, sheet_name, progreso=None):
+    # Comentario tecnico: aplica nombre de hoja por defecto si no se especifica.
+    if sheet_name is None:
+        sheet_name = BASE_SHEET_NAME
+    with zipfile.ZipFile(base_path, 'r') as zf:
+        # Comentario tecnico: resuelve la parte XML de la hoja desde workbook.xml.
+        sheets = _xlsx_sheets(zf)
+        part = None
+        for name, target in sheets:
+            if name == sheet_name:
+                part = target
+                break
+        if part is None:
+            names = '|'.join(name for name, _ in sheets)
+            raise ValueError('HOJA_NO_ENCONTRADA|' + names)
+        shared_strings = _xlsx_shared_strings(zf)
+
+        base_map = _BaseIva()
+        base_duplicates = {}
+        total_rows = 0
+        header_values = {}
+        header_map = None
+        columns = None
+        asin_col = iva_col = None
+        max_col = 0
+
+        with zf.open(part) as fh:
+            part_size = zf.getinfo(part).file_size
+            for row_num, row, ns in _iter_xlsx_rows(fh):
+                # Comentario tecnico: iterparse reutiliza las filas ya leidas, asi que el avance se informa aqui.
+                if progreso is not None and not row_num & 8191:
+                    progreso.paso(row_num, lambda: fh.tell() / part_size if part_size else None)
+                # Comentario tecnico: la primera fila se proyecta completa para obtener encabezados.
+                if header_map is None:
+                    if row_num == 1:
+                        header_values, max_col = _xlsx_row_values(row, ns, shared_strings)
+                    header_map = {}
+                    for col, h in header_values.items():
+                        if str(h or '').strip() != '':
+                            header_map[_normalize_header(h)] = col - 1
+                    if 'asin' not in header_map:
+                        raise ValueError('No se encontro la columna ASIN en la hoja base.')
+                    if 'iva' not in header_map:
+                        raise ValueError('No se encontro la columna IVA en la hoja base.')
+                    asin_col = header_map['asin'] + 1
+                    iva_col = header_map['iva'] + 1
+                    columns = (asin_col, iva_col)
+                    if row_num == 1:
+                        continue
+                # Comentario tecnico: proyecta solo ASIN e IVA de cada fila de datos.
+                values, last_col = _xlsx_row_values(row, ns, shared_strings, columns)
+                if last_col > max_col:
+                    max_col = last_col
+                asin = str(values.get(asin_col) or '').strip()
+                iva = str(values.get(iva_col) or '').strip()
+                if not asin:
+                    continue
+                total_rows += 1
+                asin_norm = asin.upper()
+                iva_norm = _normalize_iva(iva)
+                # Comentario tecnico: consolida duplicados priorizando SI.
+                if base_map.consolidar(asin_norm, iva_norm):
+                    base_duplicates[asin_norm] = base_duplicates.get(asin_norm, 0) + 1
+
+    # Comentario tecnico: hoja sin filas equivale a encabezado vacio.
+    if header_map is None:
+        raise ValueError('No se encontro la columna ASIN en la hoja base.')
+    # Comentario tecnico: encabezados 1..max_col como los expone openpyxl (None en celdas vacias).
+    header_fields = [header_values.get(col) for col in range(1, max_col + 1)]
+    return sheet_name, base_map, header_fields, header_map, total_rows, base_duplicates, max_col
+
+
+# Comentario tecnico: abre el workbook completo con openpyxl para la escritura de respaldo.
+def _open_xlsx_sheet(base_path, sheet_name):
+    openpyxl = _load_openpyxl()
+    wb = openpyxl.load_workbook(base_path)
+    return wb, wb[sheet_name]
+
+
+# Comentario tecnico: cache de metadata de hojas por archivo, invalidada por tamano y fecha de modificacion.
+_SHEET_INFO_CACHE = {}
+_DIMENSION_REF_RE = re.compile(rb'<(?:[\w.-]+:)?dimension\b[^>]*?\bref="([^"]*)"')
+
+
+# Comentario tecnico: lee dimension y fila de encabezado de una hoja sin cargar el resto de la parte. El encabezado
+# es None si no se pudo leer (desconocido); una lista vacia significa que la hoja no tiene encabezado.
+def _xlsx_sheet_header(zf, part):
+    if not part or part not in zf.NameToInfo:
+        return '', None
+    try:
+        with zf.open(part) as fh:
+            head = fh.read(1 << 16)
+        match = _DIMENSION_REF_RE.search(head)
+        dimension = match.group(1).decode('utf-8', 'replace') if match else ''
+        values, last_col = _xlsx_header_row(zf, part)
+    except Exception:
+        return '', None
+    header = ['' if values.get(col) is None else str(values.get(col)) for col in range(1, last_col + 1)]
+    return dimension, header
+
+
+# Comentario tecnico: lee solo la fila 1 de una hoja y retorna (valores por columna, ultima columna).
+def _xlsx_header_row(zf, part):
+    with zf.open(part) as fh:
+        for row_num, row, ns in _iter_xlsx_rows(fh):
+            if row_num != 1:
+                break
+            # Comentario tecnico: solo se leen los strings compartidos hasta el mayor indice usado por el encabezado.
+            needed = -1
+            for cell in row:
+                if cell.get('t') == 's':
+                    v = cell.find(ns + 'v')
+                    if v is not None and (v.text or '').strip().isdigit():
+                        needed = max(needed, int(v.text))
+            shared_strings = _xlsx_shared_strings(zf, needed) if needed >= 0 else []
+            return _xlsx_row_values(row, ns, shared_strings)
+    return {}, 0
+
+
+# Comentario tecnico: lista hojas con su dimension y encabezado leyendo solo workbook.xml y el inicio de cada hoja.
+def _xlsx_sheet_info(base_path):
+    base_path = os.path.abspath(base_path)
+    stat = os.stat(base_path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    cached = _SHEET_INFO_CACHE.get(base_path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    info = []
+    with zipfile.ZipFile(base_path, 'r') as zf:
+        for name, part in _xlsx_sheets(zf):
+            dimension, header = _xlsx_sheet_header(zf, part)
+            info.append({'name': name, 'dimension': dimension, 'header': header})
+    _SHEET_INFO_CACHE[base_path] = (key, info)
+    return info
+
+
+# Comentario tecnico: extensiones de reportes comprimidos que se descomprimen al vuelo.
+_REPORTE_COMPRESSED = ('.gz', '.bz2', '.xz', '.zip')
+# Comentario tecnico: bloque descomprimido por lectura y bloques adelantados por el hilo de prefetch.
+_PREFETCH_BLOCK = 1 << 20
+_PREFETCH_DEPTH = 8
+
+
+# Comentario tecnico: retorna la extension de compresion del reporte o None si es texto plano.
+def _reporte_compression(reporte_path):
+    lower = reporte_path.lower()
+    for ext in _REPORTE_COMPRESSED:
+        if lower.endswith(ext):
+            return ext
+    return None
+
+
+# Comentario tecnico: lector binario que descomprime en un hilo aparte mientras el parser consume.
+class _PrefetchReader(io.RawIOBase):
+    def __init__(self, raw, reporte_path):
+        super().__init__()
+        self._raw = raw
+        self._path = reporte_path
+        self._queue = queue.Queue(maxsize=_PREFETCH_DEPTH)
+        self._pending = memoryview(b'')
+        self._done = False
+        self._stop = threading.Event()
+        # Comentario tecnico: zlib, bz2 y lzma liberan el GIL al descomprimir, asi que el hilo avanza en paralelo.
+        self._thread = threading.Thread(target=self._fill, name='ivasins-prefetch', daemon=True)
+        self._thread.start()
+
+    def _fill(self):
+        try:
+            while not self._stop.is_set():
+                block = self._raw.read(_PREFETCH_BLOCK)
+                self._queue.put(block)
+                if not block:
+                    return
+        except (OSError, EOFError, zlib.error, lzma.LZMAError, zipfile.BadZipFile) as exc:
+            self._queue.put(ValueError('No se pudo descomprimir el reporte ' + self._path + ': ' + str(exc)))
+        except Exception as exc:
+            self._queue.put(exc)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            if self._done:
+                return 0
+            block = self._queue.get()
+            if isinstance(block, Exception):
+                self._done = True
+                raise block
+            if not block:
+                self._done = True
+                return 0
+            self._pending = memoryview(block)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            # Comentario tecnico: vacia la cola para desbloquear al hilo si quedo esperando espacio.
+            while self._thread.is_alive():
+                try:
+                    self._queue.get(timeout=0.05)
+                except queue.Empty:
+                    pass
+            self._raw.close()
+        super().close()
+
+
+# Comentario tecnico: abre el contenido binario descomprimido de un reporte .gz/.bz2/.xz/.zip.
+def _open_reporte_compressed(reporte_path, ext):
+    if ext == '.gz':
+        return gzip.open(reporte_path, 'rb')
+    if ext == '.bz2':
+        return bz2.open(reporte_path, 'rb')
+    if ext == '.xz':
+        return lzma.open(reporte_path, 'rb')
+    zf = zipfile.ZipFile(reporte_path)
+    try:
+        members = [info for info in zf.infolist() if not info.is_dir()]
+        if len(members) != 1:
+            raise ValueError('El zip del reporte debe contener un solo archivo: ' + reporte_path)
+        # Comentario tecnico: el miembro abierto mantiene vivo el archivo zip aunque se cierre el ZipFile.
+        return zf.open(members[0])
+    finally:
+        zf.close()
+
+
+# Comentario tecnico: abre un reporte como texto (BOM tolerante); los comprimidos se leen sin expandir a disco.
+def _open_reporte(reporte_path):
+    ext = _reporte_compression(reporte_path)
+    if ext is None:
+        return open(reporte_path, 'r', encoding='utf-8-sig', errors='replace', newline='')
+    raw = _PrefetchReader(_open_reporte_compressed(reporte_path, ext), reporte_path)
+    return io.TextIOWrapper(io.BufferedReader(raw, _PREFETCH_BLOCK), encoding='utf-8-sig', errors='replace',
+                            newline='')
+
+
+# Comentario tecnico: lee el encabezado desde el reporte abierto y resuelve delimitador e indices requeridos.
+def _reporte_header(f):
+    # Comentario tecnico: la primera linea (ya descomprimida) define el delimitador.
+    header_line = f.readline()
     # Comentario tecnico: falla si el reporte no contiene encabezados.
     if not header_line:
         raise ValueError('El reporte esta vacio.')
     # Comentario tecnico: detecta delimitador con heuristica de conteo.
     delimiter = _detect_delimiter(header_line)
+    try:
+        # Comentario tecnico: obtiene encabezados crudos de la primera fila (puede seguir en lineas con comillas).
+        raw_headers = next(csv.reader(itertools.chain((header_line,), f), delimiter=delimiter))
+    except StopIteration:
+        # Comentario tecnico: reporte invalido si no hay encabezados.
+        raise ValueError('El reporte no tiene encabezados.')
 
-    # Comentario tecnico: lee el archivo completo con BOM tolerante.
-    with open(reporte_path, 'r', encoding='utf-8-sig', errors='replace', newline='') as f:
-        # Comentario tecnico: lector CSV con delimitador detectado.
-        reader = csv.reader(f, delimiter=delimiter)
-        try:
-            # Comentario tecnico: obtiene encabezados crudos de la primera fila.
-            raw_headers = next(reader)
-        except StopIteration:
-            # Comentario tecnico: reporte invalido si no hay encabezados.
-            raise ValueError('El reporte no tiene encabezados.')
-
-        # Comentario tecnico: normaliza encabezados para acceso estable.
-        normalized_headers = [_normalize_header(h) for h in raw_headers]
-        # Comentario tecnico: mapea encabezado normalizado a indice.
-        header_map = {h: i for i, h in enumerate(normalized_headers)}
-
-        # Comentario tecnico: columnas requeridas por el motor para deducir IVA.
-        required = ['asin', 'item-tax', 'order-status']
-        # Comentario tecnico: valida columnas faltantes y reporta error detallado.
-        missing = [r for r in required if r not in header_map]
-        if missing:
-            raise ValueError('Faltan columnas en el reporte: ' + ', '.join(missing))
-
-        # Comentario tecnico: itera filas de datos y devuelve solo campos relevantes.
-        for row in reader:
-            # Comentario tecnico: omite filas vacias.
-            if not row:
+    # Comentario tecnico: normaliza encabezados para acceso estable.
+    normalized_headers = [_normalize_header(h) for h in raw_headers]
+    # Comentario tecnico: mapea encabezado normalizado a indice.
+    header_map = {h: i for i, h in enumerate(normalized_headers)}
+
+    # Comentario tecnico: columnas requeridas por el motor para deducir IVA.
+    required = ['asin', 'item-tax', 'order-status']
+    # Comentario tecnico: valida columnas faltantes y reporta error detallado.
+    missing = [r for r in required if r not in header_map]
+    if missing:
+        raise ValueError('Faltan columnas en el reporte: ' + ', '.join(missing))
+    return delimiter, (header_map['asin'], header_map['item-tax'], header_map['order-status'])
+
+
+# Comentario tecnico: lee solo el encabezado de un reporte.
+def _reporte_layout(reporte_path):
+    with _open_reporte(reporte_path) as f:
+        return _reporte_header(f)
+
+
+# Comentario tecnico: tope de valores distintos memorizados por clasificacion (estado / item-tax).
+_CLASSIFY_CACHE_LIMIT = 4096
+
+
+# Comentario tecnico: aplica las lineas del reporte sobre un mapa ASIN->IVA y acumula contadores.
+def _consolidate_reporte_rows(lines, delimiter, columns, report_map, cancelled_asins, stats):
+    asin_idx, tax_idx, status_idx = columns
+    # Comentario tecnico: solo hace falta rellenar hasta la ultima columna proyectada.
+    need = max(columns) + 1
+    # Comentario tecnico: los reportes repiten pocos estados e impuestos; se clasifica una vez por texto crudo.
+    cancelled_cache = {}
+    tax_cache = {}
+    # Comentario tecnico: cada fila cae en exactamente un contador; el total se obtiene de su suma.
+    cancelled = no_asin = duplicates = new = 0
+    get = report_map.get
+    add_cancelled = cancelled_asins.add
+    for line in lines:
+        # Comentario tecnico: sin comillas, split equivale a csv.reader; con comillas (campos multilinea) se
+        # delega ese registro a csv.reader, que consume del mismo iterador solo las lineas que necesita.
+        # El fin de linea puede quedar en un campo proyectado: ASIN, estado e impuesto se recortan al clasificar.
+        if '"' in line:
+            row = next(csv.reader(itertools.chain((line,), lines), delimiter=delimiter), [])
+        else:
+            # Comentario tecnico: corta solo hasta la ultima columna proyectada; el resto de la linea no se divide.
+            row = line.split(delimiter, need)
+        if len(row) < need:
+            # Comentario tecnico: omite filas vacias y rellena filas incompletas para proteger indices.
+            if not row or (len(row) == 1 and not row[0].strip('\r\n')):
                 continue
-            # Comentario tecnico: rellena filas incompletas para proteger indices.
-            if len(row) < len(raw_headers):
-                row += [''] * (len(raw_headers) - len(row))
-            # Comentario tecnico: produce una fila normalizada para el pipeline.
-            yield {
-                'asin': row[header_map['asin']].strip(),
-                'item-tax': row[header_map['item-tax']].strip(),
-                'order-status': row[header_map['order-status']].strip(),
-            }
+            row += [''] * (need - len(row))
+        status = row[status_idx]
+        try:
+            is_cancelled = cancelled_cache[status]
+        except KeyError:
+            is_cancelled = _is_cancelled(status)
+            if len(cancelled_cache) < _CLASSIFY_CACHE_LIMIT:
+                cancelled_cache[status] = is_cancelled
+        asin = row[asin_idx].strip()
+        # Comentario tecnico: omite pedidos cancelados y acumula ASIN cancelados.
+        if is_cancelled:
+            cancelled += 1
+            if asin:
+                add_cancelled(asin.upper())
+            continue
+        # Comentario tecnico: contabiliza filas sin ASIN util.
+        if not asin:
+            no_asin += 1
+            continue
+        # Comentario tecnico: normaliza ASIN a mayusculas para clave canonica.
+        asin = asin.upper()
+        # Comentario tecnico: determina IVA segun el monto de item-tax.
+        tax = row[tax_idx]
+        try:
+            iva_value = tax_cache[tax]
+        except KeyError:
+            iva_value = 'SI' if _has_tax(tax) else 'NO'
+            if len(tax_cache) < _CLASSIFY_CACHE_LIMIT:
+                tax_cache[tax] = iva_value
+        # Comentario tecnico: consolida duplicados (tambien entre reportes) priorizando SI.
+        current = get(asin)
+        if current is None:
+            report_map[asin] = iva_value
+            new += 1
+        else:
+            duplicates += 1
+            if current == 'NO' and iva_value == 'SI':
+                report_map[asin] = 'SI'
+    stats['total'] += cancelled + no_asin + duplicates + new
+    stats['cancelados'] += cancelled
+    stats['sin_asin'] += no_asin
+    stats['duplicados'] += duplicates
+    stats['asin_nuevos'] += new
+
+
+# Comentario tecnico: consolida un reporte completo en serie, en una sola pasada (tambien si esta comprimido).
+# desde/tamano ubican el archivo dentro de los bytes de todos los reportes para el porcentaje de avance.
+def _consolidate_reporte_file(reporte_path, report_map, cancelled_asins, stats, progreso=None, desde=0, tamano=None):
+    with _open_reporte(reporte_path) as f:
+        delimiter, columns = _reporte_header(f)
+        # Comentario tecnico: en un comprimido no se conoce la posicion descomprimida; se informan solo filas.
+        posicion = f.buffer.tell if _reporte_compression(reporte_path) is None else None
+        lines = _con_progreso(progreso, f, posicion=posicion, tamano=tamano, desde=desde)
+        _consolidate_reporte_rows(lines, delimiter, columns, report_map, cancelled_asins, stats)
+
+
+# Comentario tecnico: reportes menores a este tamano se procesan en serie (el pool no compensa).
+_PARALLEL_MIN_BYTES = 64 << 20
+_PARALLEL_CHUNK_BYTES = 32 << 20
+
+
+# Comentario tecnico: resuelve la cantidad de procesos para parsear un reporte (1 = serie).
+def _report_workers(requested, size):
+    if requested is None:
+        try:
+            requested = int(os.getenv('IVASINS_WORKERS', '0').strip() or '0')
+        except ValueError:
+            requested = 0
+    cpus = os.cpu_count() or 1
+    if requested <= 0:
+        # Comentario tecnico: modo automatico, paralelo solo en reportes grandes.
+        return cpus if size >= _PARALLEL_MIN_BYTES else 1
+    return max(1, requested)
+
+
+# Comentario tecnico: parsea un rango de bytes alineado a lineas; lo ejecuta cada proceso del pool.
+def _parse_reporte_range(reporte_path, start, end, delimiter, columns):
+    with open(reporte_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # Comentario tecnico: con comillas un campo puede contener saltos de linea; se descarta el modo paralelo.
+    if b'"' in data:
+        return None
+    lines = io.StringIO(data.decode('utf-8', 'replace'), newline='')
+    report_map = {}
+    cancelled_asins = set()
+    stats = {'total': 0, 'cancelados': 0, 'sin_asin': 0, 'duplicados': 0, 'asin_nuevos': 0}
+    _consolidate_reporte_rows(lines, delimiter, columns, report_map, cancelled_asins, stats)
+    return report_map, cancelled_asins, stats
+
+
+# Comentario tecnico: divide el cuerpo del reporte en rangos de bytes que terminan en salto de linea.
+def _reporte_ranges(reporte_path, parts):
+    with open(reporte_path, 'rb') as f:
+        header = f.readline()
+        # Comentario tecnico: encabezados con comillas o fines de linea solo CR quedan para el modo serie.
+        if not header.endswith(b'\n') or b'"' in header or b'\r' in header[:-2]:
+            return None
+        start = len(header)
+        end = f.seek(0, 2)
+        bounds = [start]
+        step = max(1, (end - start) // parts)
+        for k in range(1, parts):
+            f.seek(start + k * step)
+            f.readline()
+            pos = f.tell()
+            if bounds[-1] < pos < end:
+                bounds.append(pos)
+        bounds.append(end)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+
+
+# Comentario tecnico: une un parcial al mapa global con la regla SI gana; el orden de primera aparicion se conserva.
+def _merge_reporte_partial(report_map, cancelled_asins, stats, partial):
+    partial_map, partial_cancelled, partial_stats = partial
+    for key in ('total', 'cancelados', 'sin_asin', 'duplicados'):
+        stats[key] += partial_stats[key]
+    cancelled_asins.update(partial_cancelled)
+    for asin, iva in partial_map.items():
+        current = report_map.get(asin)
+        if current is None:
+            report_map[asin] = iva
+            stats['asin_nuevos'] += 1
+            continue
+        # Comentario tecnico: la primera aparicion del parcial ya estaba en el global: cuenta como duplicado.
+        stats['duplicados'] += 1
+        if current == 'NO' and iva == 'SI':
+            report_map[asin] = 'SI'
+
+
+# Comentario tecnico: encola los rangos de un reporte en el pool; retorna (futures, rangos) o None si requiere
+# el modo serie.
+def _submit_reporte_ranges(executor, reporte_path, workers):
+    delimiter, columns = _reporte_layout(reporte_path)
+    size = os.path.getsize(reporte_path)
+    parts = max(workers * 4, size // _PARALLEL_CHUNK_BYTES + 1)
+    ranges = _reporte_ranges(reporte_path, parts)
+    if not ranges:
+        return None
+    futures = [executor.submit(_parse_reporte_range, reporte_path, start, end, delimiter, columns)
+               for start, end in ranges]
+    return futures, ranges
+
+
+# Comentario tecnico: parsea un reporte en paralelo; retorna None si el archivo requiere el modo serie.
+def _parse_reporte_parallel(executor, reporte_path, workers, progreso=None, desde=0, tamano=None):
+    submitted = _submit_reporte_ranges(executor, reporte_path, workers)
+    if submitted is None:
+        return None
+    return _collect_reporte_ranges(submitted[0], submitted[1], progreso, desde, tamano)
+
+
+# Comentario tecnico: espera los rangos en el orden del archivo; retorna None si alguno requiere el modo serie.
+def _collect_reporte_ranges(futures, ranges, progreso=None, desde=0, tamano=None):
+    partials = []
+    inicio = progreso.contador() if progreso is not None else 0
+    try:
+        for future, (start, end) in zip(futures, ranges):
+            partial = future.result()
+            if partial is None:
+                # Comentario tecnico: el modo serie vuelve a contar el archivo desde el principio.
+                if progreso is not None:
+                    progreso.paso(inicio)
+                return None
+            partials.append(partial)
+            # Comentario tecnico: el avance se informa al completar cada rango, en el orden del archivo.
+            if progreso is not None:
+                progreso.paso(progreso.contador() + partial[2]['total'], (desde + end) / tamano if tamano else None)
+    finally:
+        # Comentario tecnico: ante fallback o cancelacion no quedan rangos pendientes en el pool.
+        if len(partials) < len(futures):
+            for future in futures:
+                future.cancel()
+    return partials
+
+
+# Comentario tecnico: indica si un nombre de archivo de una carpeta corresponde a un reporte.
+def _is_reporte_name(name):
+    lower = name.lower()
+    ext = _reporte_compression(lower)
+    if ext == '.zip':
+        return True
+    if ext is not None:
+        lower = lower[:-len(ext)]
+    return lower.endswith('.txt')
+
+
+# Comentario tecnico: expande --reporte (archivos, carpetas o globs) a una lista en orden cronologico.
+def _resolve_reportes(values):
+    found = []
+    for value in values:
+        path = os.path.abspath(value)
+        if os.path.isdir(path):
+            # Comentario tecnico: una carpeta aporta todos sus reportes .txt (comprimidos o no) y .zip.
+            found.extend(os.path.join(path, name) for name in os.listdir(path)
+                         if _is_reporte_name(name) and os.path.isfile(os.path.join(path, name)))
+        elif glob.has_magic(value):
+            matched = [os.path.abspath(m) for m in glob.glob(value) if os.path.isfile(m)]
+            if not matched:
+                raise FileNotFoundError('No hay reportes que coincidan con: ' + value)
+            found.extend(matched)
+        elif os.path.isfile(path):
+            found.append(path)
+        else:
+            raise FileNotFoundError('No existe el reporte: ' + path)
+    # Comentario tecnico: elimina repetidos y ordena por fecha de modificacion (desempate por nombre).
+    unique = {os.path.normcase(path): path for path in found}
+    paths = sorted(unique.values(), key=lambda path: (os.path.getmtime(path), path))
+    if not paths:
+        raise FileNotFoundError('No se encontraron reportes en: ' + ', '.join(values))
+    return paths
+
+
+# Comentario tecnico: consolida uno o mas reportes en un solo mapa ASIN->IVA priorizando SI.
+def _parse_reportes(reporte_paths, workers=None, progreso=None):
+    # Comentario tecnico: mapa del reporte con ASIN unicos y su IVA inferido.
+    report_map = OrderedDict()
+    # Comentario tecnico: ASIN de filas canceladas (todas las fuentes).
+    cancelled_asins = set()
+    # Comentario tecnico: contadores por reporte; los globales son su suma.
+    per_report = []
+    executor = None
+    sizes = [os.path.getsize(reporte_path) for reporte_path in reporte_paths]
+    try:
+        for number, reporte_path in enumerate(reporte_paths):
+            stats = {'archivo': reporte_path, 'total': 0, 'cancelados': 0, 'sin_asin': 0, 'duplicados': 0,
+                     'asin_nuevos': 0}
+            partials = None
+            desde = sum(sizes[:number])
+            count = _report_workers(workers, sizes[number])
+            # Comentario tecnico: un flujo comprimido no se puede dividir por bytes; se parsea en serie con prefetch.
+            if count > 1 and _reporte_compression(reporte_path) is None:
+                if executor is None:
+                    executor = concurrent.futures.ProcessPoolExecutor(max_workers=count)
+                partials = _parse_reporte_parallel(executor, reporte_path, count, progreso, desde, sum(sizes))
+            if partials is not None:
+                # Comentario tecnico: los parciales se unen en el orden del archivo.
+                for partial in partials:
+                    _merge_reporte_partial(report_map, cancelled_asins, stats, partial)
+            else:
+                _consolidate_reporte_file(reporte_path, report_map, cancelled_asins, stats, progreso, desde,
+                                          sum(sizes))
+            per_report.append(stats)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return report_map, cancelled_asins, per_report
+
+
+# Comentario tecnico: umbrales del parseo solapado con la carga. El proceso principal paga siempre el unpickle del
+# mapa del reporte (~10% del parseo en serie) y el arranque del pool; solo se gana si el reporte tarda lo bastante
+# y la base tarda al menos eso en cargarse (una base chica no deja nada que ocultar). Por debajo, todo en serie.
+_SOLAPE_MIN_BYTES = 32 << 20
+_SOLAPE_MIN_BASE_BYTES = 4 << 20
+
+
+# Comentario tecnico: el parseo de reportes en paralelo con la carga de la base se desactiva con IVASINS_OVERLAP=0.
+def _overlap_enabled():
+    if (os.cpu_count() or 1) < 2:
+        return False
+    return os.getenv('IVASINS_OVERLAP', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+# Comentario tecnico: consolida un reporte completo en un proceso del pool; retorna un parcial como los rangos.
+def _parse_reporte_archivo(reporte_path):
+    report_map = {}
+    cancelled_asins = set()
+    stats = {'total': 0, 'cancelados': 0, 'sin_asin': 0, 'duplicados': 0, 'asin_nuevos': 0}
+    _consolidate_reporte_file(reporte_path, report_map, cancelled_asins, stats)
+    return report_map, cancelled_asins, stats
+
+
+# Comentario tecnico: parseo de los reportes lanzado en un pool de procesos antes de cargar la base; la carga y el
+# parseo usan nucleos distintos (ambos son Python puro y con hilos competirian por el GIL). Los errores de los
+# reportes salen al pedir el resultado, despues de los de la base, con los mismos mensajes que en serie.
+class _ParseoReportes:
+    def __init__(self, reporte_paths, workers=None, parseado=None, base_bytes=None):
+        self._paths = reporte_paths
+        self._workers = workers
+        self._base_bytes = base_bytes
+        # Comentario tecnico: resultado ya parseado por quien llama (modo de varias bases); no se relee nada.
+        self._parseado = parseado
+        self._sizes = [os.path.getsize(reporte_path) for reporte_path in reporte_paths]
+        self._executor = None
+        # Comentario tecnico: por reporte (futures, rangos); rangos es None si el reporte va completo a un proceso.
+        self._trabajos = []
+
+    def iniciar(self):
+        if self._parseado is not None:
+            return
+        if not _overlap_enabled() or sum(self._sizes) < _SOLAPE_MIN_BYTES:
+            return
+        if self._base_bytes is not None and self._base_bytes < _SOLAPE_MIN_BASE_BYTES:
+            return
+        counts = [_report_workers(self._workers, size) for size in self._sizes]
+        try:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max(counts + [min(len(self._paths), os.cpu_count() or 1)]))
+            for reporte_path, count in zip(self._paths, counts):
+                submitted = None
+                # Comentario tecnico: un flujo comprimido no se puede dividir por bytes; va completo a un proceso.
+                if count > 1 and _reporte_compression(reporte_path) is None:
+                    submitted = _submit_reporte_ranges(self._executor, reporte_path, count)
+                if submitted is None:
+                    submitted = ([self._executor.submit(_parse_reporte_archivo, reporte_path)], None)
+                self._trabajos.append(submitted)
+        except Exception:
+            # Comentario tecnico: sin pool (o con un encabezado invalido) el parseo queda en serie tras la carga,
+            # que informa el error en el mismo punto que antes.
+            self.cerrar()
+            self._executor = None
+            self._trabajos = []
+
+    def resultado(self, progreso=None):
+        if self._parseado is not None:
+            return self._parseado
+        if self._executor is None:
+            return _parse_reportes(self._paths, self._workers, progreso)
+        report_map = OrderedDict()
+        cancelled_asins = set()
+        per_report = []
+        tamano = sum(self._sizes)
+        for number, (reporte_path, (futures, ranges)) in enumerate(zip(self._paths, self._trabajos)):
+            stats = {'archivo': reporte_path, 'total': 0, 'cancelados': 0, 'sin_asin': 0, 'duplicados': 0,
+                     'asin_nuevos': 0}
+            desde = sum(self._sizes[:number])
+            if ranges is not None:
+                partials = _collect_reporte_ranges(futures, ranges, progreso, desde, tamano)
+            else:
+                partials = [futures[0].result()]
+                if progreso is not None:
+                    progreso.paso(progreso.contador() + partials[0][2]['total'],
+                                  (desde + self._sizes[number]) / tamano if tamano else None)
+            if partials is None:
+                _consolidate_reporte_file(reporte_path, report_map, cancelled_asins, stats, progreso, desde, tamano)
+            elif not report_map and len(partials) == 1:
+                # Comentario tecnico: el primer reporte completo se adopta tal cual (sin recorrer sus claves).
+                report_map, partial_cancelled, partial_stats = partials[0]
+                cancelled_asins.update(partial_cancelled)
+                stats.update(partial_stats)
+            else:
+                for partial in partials:
+                    _merge_reporte_partial(report_map, cancelled_asins, stats, partial)
+            per_report.append(stats)
+        return report_map, cancelled_asins, per_report
+
+    def cerrar(self):
+        if self._executor is None:
+            return
+        # Comentario tecnico: ante un error o una cancelacion se descartan los trabajos que aun no empezaron.
+        for futures, _ in self._trabajos:
+            for future in futures:
+                future.cancel()
+        self._executor.shutdown()
 
 
 # Comentario tecnico: genera un archivo properties plano con claves y valores.
@@ -343,6 +1271,8 @@ def _write_properties(path, data):
     with open(path, 'w', encoding='utf-8') as f:
         # Comentario tecnico: escribe cada par clave=valor en una linea.
         for key, value in data.items():
+            # Comentario tecnico: escapa backslash y saltos de linea segun el formato properties (rutas Windows).
+            value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('\r', '\\r')
             f.write(f"{key}={value}\n")
 
 
@@ -417,35 +1347,36 @@ def _remove_calc_chain_rel(xml_bytes):
         return xml_bytes
 
 
-# Comentario tecnico: fuerza recalculo completo al abrir.
-def _force_full_calc(xml_bytes):
-    try:
-        ns = {'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
-        ET.register_namespace('', ns['main'])
-        root = ET.fromstring(xml_bytes)
-        calc_tag = f"{{{ns['main']}}}calcPr"
-        calc_pr = root.find(calc_tag)
-        if calc_pr is None:
-            calc_pr = ET.SubElement(root, calc_tag)
-        calc_pr.set('fullCalcOnLoad', '1')
-        calc_pr.set('calcMode', 'auto')
-        return _serialize_xml(root, xml_bytes)
-    except Exception:
-        return xml_bytes
+# Comentario tecnico: marca calcPr para recalculo completo sobre un arbol ya parseado.
+def _apply_full_calc(root):
+    ns = {'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+    calc_tag = f"{{{ns['main']}}}calcPr"
+    calc_pr = root.find(calc_tag)
+    if calc_pr is None:
+        calc_pr = ET.SubElement(root, calc_tag)
+    calc_pr.set('fullCalcOnLoad', '1')
+    calc_pr.set('calcMode', 'auto')
+
 
+# Comentario tecnico: ajusta workbookPr sobre un arbol ya parseado.
+def _apply_workbook_pr(root):
+    ns = {'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+    pr_tag = f"{{{ns['main']}}}workbookPr"
+    pr = root.find(pr_tag)
+    if pr is None:
+        pr = ET.SubElement(root, pr_tag)
+    pr.set('updateLinks', 'never')
+    pr.set('refreshAllConnections', '0')
 
-# Comentario tecnico: desactiva actualizaciones automaticas de links/conexiones.
-def _update_workbook_pr(xml_bytes):
+
+# Comentario tecnico: aplica en un solo parseo todos los ajustes de xl/workbook.xml.
+def _patch_workbook_xml(xml_bytes):
     try:
-        ns = {'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
-        ET.register_namespace('', ns['main'])
+        ET.register_namespace('', 'http://schemas.openxmlformats.org/spreadsheetml/2006/main')
         root = ET.fromstring(xml_bytes)
-        pr_tag = f"{{{ns['main']}}}workbookPr"
-        pr = root.find(pr_tag)
-        if pr is None:
-            pr = ET.SubElement(root, pr_tag)
-        pr.set('updateLinks', 'never')
-        pr.set('refreshAllConnections', '0')
+        _apply_full_calc(root)
+        _apply_workbook_pr(root)
+        _apply_disable_refresh(root)
         return _serialize_xml(root, xml_bytes)
     except Exception:
         return xml_bytes
@@ -550,6 +1481,18 @@ def _ensure_custom_props_content_type(xml_bytes):
         return xml_bytes
 
 
+# Comentario tecnico: pone en 0 los atributos de refresco sobre un arbol ya parseado.
+def _apply_disable_refresh(root):
+    changed = False
+    for elem in root.iter():
+        for attr in ('refreshOnLoad', 'refreshOnOpen', 'refreshOnSave', 'backgroundRefresh'):
+            val = elem.get(attr)
+            if val is not None and val not in ('0', 'false', 'False'):
+                elem.set(attr, '0')
+                changed = True
+    return changed
+
+
 # Comentario tecnico: desactiva refreshOnLoad/refreshOnOpen en XMLs de conexiones.
 def _disable_refresh(xml_bytes):
     if (b'refreshOnLoad' not in xml_bytes and b'refreshOnOpen' not in xml_bytes
@@ -557,60 +1500,64 @@ def _disable_refresh(xml_bytes):
         return xml_bytes
     try:
         root = ET.fromstring(xml_bytes)
-        changed = False
-        for elem in root.iter():
-            for attr in ('refreshOnLoad', 'refreshOnOpen', 'refreshOnSave', 'backgroundRefresh'):
-                val = elem.get(attr)
-                if val is not None and val not in ('0', 'false', 'False'):
-                    elem.set(attr, '0')
-                    changed = True
-        if not changed:
+        if not _apply_disable_refresh(root):
             return xml_bytes
         return _serialize_xml(root, xml_bytes)
     except Exception:
         return xml_bytes
 
 
+# Comentario tecnico: partes que pueden declarar refresco de conexiones, consultas o pivots.
+def _may_refresh_part(name):
+    if name == 'xl/connections.xml':
+        return True
+    if name.startswith('xl/queryTables/') and name.endswith('.xml'):
+        return True
+    return name.startswith('xl/pivotCache/pivotCacheDefinition') and name.endswith('.xml')
+
+
 # Comentario tecnico: reescribe el XLSX para limpiar caches y metadatos.
 def _sanitize_xlsx_file(path):
     temp_path = path + '.san'
     document_id = str(uuid.uuid4()).upper()
     custom_found = False
     try:
-        with zipfile.ZipFile(path, 'r') as zin:
+        with open(path, 'rb') as src, zipfile.ZipFile(path, 'r') as zin:
             with zipfile.ZipFile(temp_path, 'w') as zout:
                 for item in zin.infolist():
                     name = item.filename
                     if name == 'xl/calcChain.xml':
                         continue
-                    data = zin.read(name)
+                    # Comentario tecnico: solo se descomprimen las partes que el sanitizado puede cambiar.
                     if name == 'docProps/core.xml':
-                        data = _update_core_xml(data, document_id)
+                        original = zin.read(name)
+                        data = _update_core_xml(original, document_id)
                     elif name == 'docProps/custom.xml':
-                        data = _update_custom_xml(data, document_id)
+                        original = zin.read(name)
+                        data = _update_custom_xml(original, document_id)
                         custom_found = True
                     elif name == '_rels/.rels':
-                        data = _ensure_custom_props_relationship(data)
+                        original = zin.read(name)
+                        data = _ensure_custom_props_relationship(original)
                     elif name == '[Content_Types].xml':
-                        data = _ensure_custom_props_content_type(data)
+                        original = zin.read(name)
+                        data = _ensure_custom_props_content_type(original)
                     elif name == 'xl/_rels/workbook.xml.rels':
-                        data = _remove_calc_chain_rel(data)
+                        original = zin.read(name)
+                        data = _remove_calc_chain_rel(original)
                     elif name == 'xl/workbook.xml':
-                        data = _force_full_calc(data)
-                        data = _update_workbook_pr(data)
-                    if name.endswith('.xml'):
-                        data = _disable_refresh(data)
-                    zi = zipfile.ZipInfo(filename=name, date_time=item.date_time)
-                    zi.compress_type = item.compress_type
-                    zi.comment = item.comment
-                    zi.extra = item.extra
-                    zi.create_system = item.create_system
-                    zi.create_version = item.create_version
-                    zi.extract_version = item.extract_version
-                    zi.flag_bits = item.flag_bits
-                    zi.internal_attr = item.internal_attr
-                    zi.external_attr = item.external_attr
-                    zout.writestr(zi, data)
+                        original = zin.read(name)
+                        data = _patch_workbook_xml(original)
+                    elif _may_refresh_part(name):
+                        original = zin.read(name)
+                        data = _disable_refresh(original)
+                    else:
+                        original = data = None
+                    # Comentario tecnico: las partes sin cambios se copian con sus bytes comprimidos.
+                    if data is original:
+                        _zip_copy_raw(zin, src, zout, item)
+                        continue
+                    zout.writestr(_clone_zipinfo(item), data)
                 if not custom_found:
                     custom_xml = _create_custom_xml(document_id)
                     zout.writestr('docProps/custom.xml', custom_xml)
@@ -625,6 +1572,230 @@ def _sanitize_xlsx_file(path):
         return False
 
 
+# Comentario tecnico: clona los metadatos de una entrada del zip para reescribirla en otro archivo.
+def _clone_zipinfo(item):
+    zi = zipfile.ZipInfo(filename=item.filename, date_time=item.date_time)
+    zi.compress_type = item.compress_type
+    zi.comment = item.comment
+    zi.extra = item.extra
+    zi.create_system = item.create_system
+    zi.create_version = item.create_version
+    zi.extract_version = item.extract_version
+    zi.flag_bits = item.flag_bits
+    zi.internal_attr = item.internal_attr
+    zi.external_attr = item.external_attr
+    return zi
+
+
+# Comentario tecnico: copia una entrada del zip con sus bytes comprimidos, sin descomprimir ni recomprimir. Usa
+# detalles internos de zipfile (cabecera local, fp y start_dir del escritor); si faltan o fallan, la entrada se copia
+# descomprimiendo y recomprimiendo con la API publica.
+def _zip_copy_raw(zin, src, zout, item):
+    try:
+        _zip_copy_raw_bytes(src, zout, item)
+    except Exception:
+        # Comentario tecnico: writestr vuelve a posicionarse en start_dir y pisa lo que se haya escrito a medias.
+        zout.writestr(_clone_zipinfo(item), zin.read(item))
+
+
+def _zip_copy_raw_bytes(src, zout, item):
+    src.seek(item.header_offset)
+    header = src.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile('Cabecera local invalida: ' + item.filename)
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    # Comentario tecnico: los campos 10 y 11 son las longitudes de nombre y extra de la cabecera local.
+    src.seek(item.header_offset + zipfile.sizeFileHeader + fields[10] + fields[11])
+    zi = _clone_zipinfo(item)
+    zi.CRC = item.CRC
+    zi.compress_size = item.compress_size
+    zi.file_size = item.file_size
+    # Comentario tecnico: sin data descriptor; CRC y tamanos van en la cabecera local.
+    zi.flag_bits &= ~0x08
+    zout.fp.seek(zout.start_dir)
+    zi.header_offset = zout.fp.tell()
+    zout.fp.write(zi.FileHeader())
+    remaining = item.compress_size
+    while remaining > 0:
+        chunk = src.read(min(remaining, 1 << 20))
+        if not chunk:
+            raise zipfile.BadZipFile('Entrada truncada: ' + item.filename)
+        zout.fp.write(chunk)
+        remaining -= len(chunk)
+    zout.start_dir = zout.fp.tell()
+    zout.filelist.append(zi)
+    zout.NameToInfo[zi.filename] = zi
+
+
+# Comentario tecnico: caracteres de control que XML 1.0 no admite (Excel rechaza la hoja); se quitan como hacia
+# openpyxl con ILLEGAL_CHARACTERS_RE.
+_XML_ILEGALES_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+# Comentario tecnico: escapa texto para contenido de elementos XML (isprintable descarta rapido el caso comun).
+def _xml_escape(text):
+    if not text.isprintable():
+        text = _XML_ILEGALES_RE.sub('', text)
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+_SHEETDATA_OPEN_RE = re.compile(rb'<((?:[\w.-]+:)?)sheetData\b[^>]*?(/?)>')
+_SHEETDATA_CLOSE_RE = re.compile(rb'</(?:[\w.-]+:)?sheetData\s*>')
+_ROW_OPEN_RE = re.compile(rb'<(?:[\w.-]+:)?row\b([^>]*?)(/?)>')
+_ROW_CLOSE_RE = re.compile(rb'</(?:[\w.-]+:)?row\s*>')
+_ROW_NUM_RE = re.compile(rb'\sr="(\d+)"')
+_DIMENSION_RE = re.compile(rb'(<(?:[\w.-]+:)?dimension\b[^>]*?\bref=")[^"]*(")')
+_DIMENSION_ELEM_RE = re.compile(rb'<(?:[\w.-]+:)?dimension\b[^>]*?/>')
+
+
+# Comentario tecnico: genera una nueva parte de hoja conservando todo salvo las filas de datos. Con huella (un hash
+# de hashlib) acumula los bytes escritos dentro de sheetData para que la verificacion no rearme los esperados.
+def _write_sheet_part(src, dst, asin_col, iva_col, max_col, records, row_count, huella=None):
+    chunk_size = 1 << 20
+    buf = b''
+    eof = False
+
+    def fill():
+        nonlocal buf, eof
+        chunk = src.read(chunk_size)
+        if chunk:
+            buf += chunk
+        else:
+            eof = True
+
+    # Comentario tecnico: ubica la apertura de sheetData; lo anterior se copia tal cual.
+    match = _SHEETDATA_OPEN_RE.search(buf)
+    while match is None and not eof:
+        fill()
+        match = _SHEETDATA_OPEN_RE.search(buf)
+    if match is None:
+        raise ValueError('La hoja no contiene sheetData.')
+    head = buf[:match.start()]
+    prefix = match.group(1)
+    self_closing = match.group(2) == b'/'
+    buf = buf[match.end():]
+
+    # Comentario tecnico: ajusta dimension al nuevo rango o la elimina si no se conoce el total.
+    last_col = _col_letter(max(max_col, asin_col, iva_col)).encode('ascii')
+    if row_count is not None:
+        ref = b'A1:' + last_col + str(row_count + 1).encode('ascii')
+        head = _DIMENSION_RE.sub(lambda m: m.group(1) + ref + m.group(2), head, count=1)
+    else:
+        head = _DIMENSION_ELEM_RE.sub(b'', head, count=1)
+
+    # Comentario tecnico: conserva la fila 1 original (encabezados con sus estilos y strings compartidos).
+    header = b''
+    if not self_closing:
+        while True:
+            row_match = _ROW_OPEN_RE.search(buf)
+            close_match = _SHEETDATA_CLOSE_RE.search(buf)
+            if close_match is not None and (row_match is None or close_match.start() < row_match.start()):
+                break
+            if row_match is not None:
+                num = _ROW_NUM_RE.search(row_match.group(1))
+                if num is not None and num.group(1) != b'1':
+                    break
+                if row_match.group(2) == b'/':
+                    header = buf[row_match.start():row_match.end()]
+                    break
+                row_close = _ROW_CLOSE_RE.search(buf, row_match.end())
+                if row_close is not None:
+                    header = buf[row_match.start():row_close.end()]
+                    break
+            if eof:
+                raise ValueError('Fila de encabezado incompleta en la hoja.')
+            fill()
+        # Comentario tecnico: descarta las filas de datos originales hasta el cierre de sheetData.
+        close_match = _SHEETDATA_CLOSE_RE.search(buf)
+        while close_match is None:
+            if eof:
+                raise ValueError('La hoja no cierra sheetData.')
+            buf = buf[-32:]
+            fill()
+            close_match = _SHEETDATA_CLOSE_RE.search(buf)
+        buf = buf[close_match.end():]
+
+    dst.write(head)
+    dst.write(b'<' + prefix + b'sheetData>')
+    dst.write(header)
+    if huella is not None:
+        huella.update(header)
+
+    # Comentario tecnico: escribe ASIN/IVA como inlineStr en orden de columna, sin tocar sharedStrings.
+    cells = sorted([(asin_col, 0), (iva_col, 1)])
+    p = prefix.decode('ascii')
+    templates = [(_col_letter(col), pos) for col, pos in cells]
+    lines = []
+    row_idx = 1
+    for asin, iva in records:
+        row_idx += 1
+        values = (asin, iva)
+        parts = [f'<{p}row r="{row_idx}">']
+        for letter, pos in templates:
+            value = values[pos]
+            if value:
+                parts.append(f'<{p}c r="{letter}{row_idx}" t="inlineStr"><{p}is><{p}t>'
+                             f'{_xml_escape(value)}</{p}t></{p}is></{p}c>')
+        parts.append(f'</{p}row>')
+        lines.append(''.join(parts))
+        if len(lines) >= 4096:
+            data = ''.join(lines).encode('utf-8')
+            dst.write(data)
+            if huella is not None:
+                huella.update(data)
+            lines = []
+    if lines:
+        data = ''.join(lines).encode('utf-8')
+        dst.write(data)
+        if huella is not None:
+            huella.update(data)
+    dst.write(b'</' + prefix + b'sheetData>')
+
+    # Comentario tecnico: copia el resto de la hoja (merges, formatos, drawings) sin cambios.
+    dst.write(buf)
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        dst.write(chunk)
+
+
+# Comentario tecnico: escribe la base XLSX reemplazando solo la hoja destino dentro del zip.
+def _write_xlsx_stream(src_path, dest_path, sheet_name, asin_col, iva_col, max_col, records, row_count=None,
+                       huella=None):
+    flag = os.getenv('IVASINS_XLSX_STREAM', '1').strip().lower()
+    if flag in ('0', 'false', 'no', 'off'):
+        return False
+    if row_count is None:
+        try:
+            row_count = len(records)
+        except TypeError:
+            row_count = None
+    try:
+        with zipfile.ZipFile(src_path, 'r') as zin:
+            part = _xlsx_sheet_part(zin, sheet_name)
+            if part is None or part not in zin.NameToInfo:
+                return False
+            with open(src_path, 'rb') as src, zipfile.ZipFile(dest_path, 'w') as zout:
+                for item in zin.infolist():
+                    if item.filename != part:
+                        _zip_copy_raw(zin, src, zout, item)
+                        continue
+                    zi = _clone_zipinfo(item)
+                    zi.compress_type = zipfile.ZIP_DEFLATED
+                    zi.flag_bits &= ~0x08
+                    with zin.open(item) as part_in, zout.open(zi, 'w') as part_out:
+                        _write_sheet_part(part_in, part_out, asin_col, iva_col, max_col, records, row_count, huella)
+        return True
+    except Exception:
+        try:
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+        except Exception:
+            pass
+        return False
+
+
 # Comentario tecnico: escribe la base XLSX usando Excel para sincronizar caches.
 def _write_xlsx_with_excel(path, sheet_name, asin_col, iva_col, max_col, records):
     global _LAST_EXCEL_LOG
@@ -648,8 +1819,8 @@ def _write_xlsx_with_excel(path, sheet_name, asin_col, iva_col, max_col, records
         os.close(fd)
         with open(temp_data, 'w', encoding='utf-8', newline='') as f:
             f.write('ASIN,IVA\r\n')
-            for record in records:
-                f.write(f"{record['ASIN']},{record['IVA']}\r\n")
+            for asin, iva in records:
+                f.write(f"{asin},{iva}\r\n")
 
         ps_script = r"""
 param(
@@ -914,173 +2085,2480 @@ try {
                 pass
 
 
-# Comentario tecnico: genera un CSV de previsualizacion a partir de nuevos registros.
-def _write_preview_csv(path, header_fields, header_map, delimiter, trailing_delim, base_map, start_index):
-    # Comentario tecnico: asegura directorio de salida para el archivo preview.
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    # Comentario tecnico: normaliza encabezados a string para escritura segura.
-    header_fields = [str(h or '') for h in header_fields]
-    # Comentario tecnico: construye linea de encabezado con el delimitador original.
-    header_line = delimiter.join(header_fields)
-    # Comentario tecnico: preserva delimitador final si existia en el CSV base.
-    if trailing_delim and (not header_fields or header_fields[-1] != ''):
-        header_line += delimiter
+_XML_TEXT_RE = re.compile(rb'<(?:[\w.-]+:)?[vt]\b[^>]*>(.*?)</', re.S)
+_XML_INLINE_T_RE = re.compile(rb'<(?:[\w.-]+:)?t\b[^>]*>(.*?)</(?:[\w.-]+:)?t>', re.S)
+_CELL_TYPE_RE = re.compile(rb'\st="([^"]*)"')
 
-    # Comentario tecnico: abre el archivo de salida en modo texto con newline controlado.
-    with open(path, 'w', encoding='utf-8', newline='') as f:
-        # Comentario tecnico: escribe encabezado en formato CRLF.
-        f.write(header_line + '\r\n')
-        # Comentario tecnico: itera registros desde el indice de primer agregado.
-        for idx, record in enumerate(base_map.values()):
-            # Comentario tecnico: descarta registros previos al primer agregado.
-            if idx < start_index:
-                continue
-            # Comentario tecnico: inicializa fila con longitud del encabezado.
-            row_out = [''] * len(header_fields)
-            # Comentario tecnico: coloca ASIN e IVA en sus columnas respectivas.
-            row_out[header_map['asin']] = record['ASIN']
-            row_out[header_map['iva']] = record['IVA']
-            # Comentario tecnico: serializa fila con delimitador.
-            line = delimiter.join(row_out)
-            # Comentario tecnico: mantiene delimitador trailing para consistencia.
-            if trailing_delim and (not row_out or row_out[-1] != ''):
-                line += delimiter
-            # Comentario tecnico: escribe fila con terminacion CRLF.
-            f.write(line + '\r\n')
-
-
-# Comentario tecnico: construye un reporte detallado con resumen y listados de cambios.
-def _write_report(report_path, base_path, base_type, sheet_name, reporte_path, resumen, added, modified, cancelled_only,
-                  base_duplicates, preview_start_index):
-    # Comentario tecnico: calcula cantidad de eliminaciones por ASIN duplicado.
-    removed_counts = OrderedDict()
-    # Comentario tecnico: acumula cantidad de ocurrencias por ASIN duplicado.
-    for asin in base_duplicates:
-        removed_counts[asin] = removed_counts.get(asin, 0) + 1
-
-    # Comentario tecnico: buffer de lineas para escribir el reporte completo.
-    lines = []
-    # Comentario tecnico: timestamp para trazabilidad del proceso.
-    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    # Comentario tecnico: encabezado general del reporte.
-    lines.append('REPORTE IVA PROCESS')
-    lines.append(f'Fecha/Hora: {now}')
-    lines.append('')
+
+# Comentario tecnico: decodifica el texto de una celda leida con regex (entidades incluidas).
+def _xml_unescape(raw):
+    text = raw.decode('utf-8', errors='replace')
+    if '&' in text:
+        text = html.unescape(text)
+    return text
+
+
+# Comentario tecnico: obtiene la parte XML de una hoja por nombre o None si no existe.
+def _xlsx_sheet_part(zf, sheet_name):
+    for name, target in _xlsx_sheets(zf):
+        if name == sheet_name:
+            return target
+    return None
+
+
+# Comentario tecnico: lee una parte XML en bloques cortados siempre al final de un </row>.
+def _iter_row_chunks(fh, chunk_size=1 << 22):
+    pending = b''
+    while True:
+        chunk = fh.read(chunk_size)
+        if not chunk:
+            break
+        pending += chunk
+        # Comentario tecnico: busca desde el final el ultimo cierre de fila (con o sin prefijo).
+        cut = -1
+        idx = pending.rfind(b'row>')
+        while idx != -1:
+            lt = pending.rfind(b'<', 0, idx)
+            if lt != -1 and pending[lt + 1:lt + 2] == b'/' and b'>' not in pending[lt:idx]:
+                cut = idx + 4
+                break
+            idx = pending.rfind(b'row>', 0, idx)
+        if cut == -1:
+            continue
+        yield pending[:cut]
+        pending = pending[cut:]
+    if pending:
+        yield pending
+
+
+# Comentario tecnico: compara fila a fila la hoja contra los registros para ubicar diferencias.
+def _verify_xlsx_detail(zf, part, asin_col, iva_col, records):
+    asin_letters = _col_letter(asin_col).encode('ascii')
+    iva_letters = _col_letter(iva_col).encode('ascii')
+    cell_re = re.compile(
+        rb'<(?:[\w.-]+:)?c r="(' + asin_letters + rb'|' + iva_letters + rb')(\d+)"([^>]*?)(?:/>|>(.*?)</(?:[\w.-]+:)?c>)',
+        re.S)
+    shared_strings = None
+    expected = iter(records)
+    state = {'row': 0, 'asin': '', 'iva': '', 'next_row': 2, 'last_row': 1, 'diferencias': 0, 'primer_error': 0}
+
+    def cell_text(attrs, inner):
+        nonlocal shared_strings
+        if inner is None:
+            return ''
+        type_match = _CELL_TYPE_RE.search(attrs)
+        cell_type = type_match.group(1) if type_match else b'n'
+        if cell_type == b'inlineStr':
+            return ''.join(_xml_unescape(t) for t in _XML_INLINE_T_RE.findall(inner))
+        value = _XML_TEXT_RE.search(inner)
+        if value is None:
+            return ''
+        text = _xml_unescape(value.group(1))
+        if cell_type == b's':
+            if shared_strings is None:
+                shared_strings = _xlsx_shared_strings(zf)
+            return shared_strings[int(text)]
+        if cell_type == b'n':
+            return str(_xlsx_number(text))
+        if cell_type == b'b':
+            return 'True' if text.strip() in ('1', 'true') else ''
+        return text
+
+    def close_row():
+        row = state['row']
+        if row < 2:
+            return
+        asin = state['asin'].strip()
+        iva = state['iva'].strip()
+        if asin:
+            state['last_row'] = row
+        record = next(expected, None)
+        if record is None or row != state['next_row'] or (asin, iva) != (record[0], record[1]):
+            state['diferencias'] += 1
+            if not state['primer_error']:
+                state['primer_error'] = row
+        state['next_row'] += 1
+
+    with zf.open(part) as fh:
+        for chunk in _iter_row_chunks(fh):
+            for match in cell_re.finditer(chunk):
+                row = int(match.group(2))
+                if row != state['row']:
+                    close_row()
+                    state['row'] = row
+                    state['asin'] = ''
+                    state['iva'] = ''
+                text = cell_text(match.group(3), match.group(4))
+                if match.group(1) == asin_letters:
+                    state['asin'] = text
+                else:
+                    state['iva'] = text
+        close_row()
+
+    # Comentario tecnico: registros esperados que no aparecieron en la hoja.
+    missing = sum(1 for _ in expected)
+    if missing:
+        state['diferencias'] += missing
+        if not state['primer_error']:
+            state['primer_error'] = state['next_row']
+    return {'filas': state['last_row'], 'diferencias': state['diferencias'], 'primer_error': state['primer_error']}
+
+
+# Comentario tecnico: huella de los bytes dentro de sheetData tal como quedaron en la hoja, con el mismo formato que
+# arma _write_sheet_part; retorna (digest, filas) o None si sheetData no esta completo. Los trozos de
+# _iter_row_chunks terminan en un cierre de fila, asi que ninguna etiqueta queda partida entre dos.
+def _xlsx_sheetdata_huella(zf, part):
+    huella = hashlib.blake2b(digest_size=16)
+    row_open = None
+    filas = 0
+    with zf.open(part) as fh:
+        for chunk in _iter_row_chunks(fh):
+            start = 0
+            if row_open is None:
+                opening = _SHEETDATA_OPEN_RE.search(chunk)
+                if opening is None or opening.group(2) == b'/':
+                    return None
+                row_open = b'<' + opening.group(1) + b'row '
+                start = opening.end()
+            # Comentario tecnico: find descarta rapido los trozos sin cierre (la regex recorreria cada trozo entero).
+            close = None
+            if chunk.find(b'sheetData', start) != -1:
+                close = _SHEETDATA_CLOSE_RE.search(chunk, start)
+            end = close.start() if close is not None else len(chunk)
+            huella.update(memoryview(chunk)[start:end])
+            filas += chunk.count(row_open, start, end)
+            if close is not None:
+                return huella.digest(), filas
+    return None
+
+
+# Comentario tecnico: verifica la hoja escrita leyendo su parte XML directamente del zip. huella es el digest de
+# _write_sheet_part cuando la hoja se escribio en streaming: basta con hashear sheetData sin interpretar celdas.
+def _verify_xlsx_native(path, sheet_name, asin_col, iva_col, iter_records, huella=None):
+    flag = os.getenv('IVASINS_VERIFY', '1').strip().lower()
+    if flag in ('0', 'false', 'no', 'off'):
+        return None
+    try:
+        with zipfile.ZipFile(path, 'r') as zf:
+            part = _xlsx_sheet_part(zf, sheet_name)
+            if part is None:
+                return None
+            if huella is not None:
+                actual = _xlsx_sheetdata_huella(zf, part)
+                if actual is not None and actual[0] == huella:
+                    return {'filas': actual[1], 'diferencias': 0, 'primer_error': 0}
+                return _verify_xlsx_detail(zf, part, asin_col, iva_col, iter_records())
+            shared_escaped = None
+            asin_re = iva_re = shared_re = None
+            actual_asin = hashlib.blake2b(digest_size=16)
+            actual_iva = hashlib.blake2b(digest_size=16)
+            actual_iva_rows = hashlib.blake2b(digest_size=16)
+            first_row = 0
+            last_row = 1
+            count = 0
+            contiguous = True
+            with zf.open(part) as fh:
+                for chunk in _iter_row_chunks(fh):
+                    if asin_re is None:
+                        # Comentario tecnico: una regex por columna captura fila, atributos y valor de cada celda.
+                        opening = _SHEETDATA_OPEN_RE.search(chunk)
+                        p = opening.group(1) if opening else b''
+                        tail = (rb'(\d+)"([^>]*)>(?:<' + p + rb'f\b[^>]*>[^<]*</' + p + rb'f>)?(?:<' + p
+                                + rb'is>)?<' + p + rb'[vt]\b[^>]*>([^<]*)<')
+                        asin_letters = _col_letter(asin_col).encode('ascii')
+                        iva_letters = _col_letter(iva_col).encode('ascii')
+                        asin_re = re.compile(rb'<' + p + rb'c r="' + asin_letters + tail)
+                        iva_re = re.compile(rb'<' + p + rb'c r="' + iva_letters + tail)
+                        shared_re = re.compile(rb'<' + p + rb'c r="(?:' + asin_letters + rb'|' + iva_letters
+                                               + rb')(?!1")\d+"[^>]*\st="s"')
+                    # Comentario tecnico: los strings compartidos se resuelven a su forma escapada para comparar bytes.
+                    if shared_escaped is None and shared_re.search(chunk):
+                        shared_escaped = [_xml_escape(s).encode('utf-8') for s in _xlsx_shared_strings(zf)]
+                    asin_cells = asin_re.findall(chunk)
+                    iva_cells = iva_re.findall(chunk)
+                    if asin_cells and asin_cells[0][0] == b'1':
+                        del asin_cells[0]
+                    if iva_cells and iva_cells[0][0] == b'1':
+                        del iva_cells[0]
+                    if not asin_cells:
+                        continue
+                    asin_rows, asin_attrs, asin_values = zip(*asin_cells)
+                    if shared_escaped is not None:
+                        asin_values = [shared_escaped[int(value)] if b't="s"' in attrs else value
+                                       for attrs, value in zip(asin_attrs, asin_values)]
+                    # Comentario tecnico: filas crecientes y sin huecos se validan con primera, ultima y conteo.
+                    start = int(asin_rows[0])
+                    end = int(asin_rows[-1])
+                    if not first_row:
+                        first_row = start
+                    if start != last_row + 1 or end - start + 1 != len(asin_rows):
+                        contiguous = False
+                    last_row = end
+                    count += len(asin_rows)
+                    actual_asin.update(b'\n'.join(asin_values) + b'\n')
+                    if iva_cells:
+                        iva_rows, iva_attrs, iva_values = zip(*iva_cells)
+                        if shared_escaped is not None:
+                            iva_values = [shared_escaped[int(value)] if b't="s"' in attrs else value
+                                          for attrs, value in zip(iva_attrs, iva_values)]
+                        actual_iva_rows.update(b'\n'.join(iva_rows) + b'\n')
+                        actual_iva.update(b'\n'.join(iva_values) + b'\n')
+
+            # Comentario tecnico: huella esperada construida por lotes con el mismo formato.
+            expected_asin = hashlib.blake2b(digest_size=16)
+            expected_iva = hashlib.blake2b(digest_size=16)
+            expected_iva_rows = hashlib.blake2b(digest_size=16)
+            expected_count = 0
+            records = iter_records()
+            while True:
+                batch = list(itertools.islice(records, 65536))
+                if not batch:
+                    break
+                base_row = expected_count + 2
+                expected_count += len(batch)
+                asins, ivas = zip(*batch)
+                expected_asin.update(_xml_escape('\n'.join(asins) + '\n').encode('utf-8'))
+                if all(ivas):
+                    iva_rows = '\n'.join(map(str, range(base_row, base_row + len(batch))))
+                    iva_values = '\n'.join(ivas)
+                else:
+                    iva_rows = '\n'.join(str(row) for row, iva in enumerate(ivas, base_row) if iva)
+                    iva_values = '\n'.join(iva for iva in ivas if iva)
+                if iva_values:
+                    expected_iva_rows.update((iva_rows + '\n').encode('ascii'))
+                    expected_iva.update(_xml_escape(iva_values + '\n').encode('utf-8'))
+
+            matches = (contiguous and count == expected_count and (count == 0 or first_row == 2)
+                       and actual_asin.digest() == expected_asin.digest()
+                       and actual_iva.digest() == expected_iva.digest()
+                       and actual_iva_rows.digest() == expected_iva_rows.digest())
+            if matches:
+                return {'filas': last_row, 'diferencias': 0, 'primer_error': 0}
+            # Comentario tecnico: solo ante diferencias se hace el recorrido detallado fila a fila.
+            return _verify_xlsx_detail(zf, part, asin_col, iva_col, iter_records())
+    except Exception:
+        return None
+
+
+# Comentario tecnico: indice de offsets de filas del CSV base (cabecera fija + offsets uint64).
+_CSV_INDEX_HEADER = struct.Struct('<8sQQ16sQQ')
+_CSV_INDEX_MAGIC = b'IVAIDX01'
+
+
+# Comentario tecnico: el modo append/patch del CSV es opcional (--patch o IVASINS_CSV_PATCH=1).
+def _csv_patch_enabled(args):
+    if getattr(args, 'patch', False):
+        return True
+    return os.getenv('IVASINS_CSV_PATCH', '0').strip().lower() in ('1', 'true', 'yes', 'on', 'si')
+
+
+# Comentario tecnico: ruta del sidecar con el indice de offsets junto a la base.
+def _csv_index_path(base_path):
+    return base_path + '.ivaidx'
+
+
+# Comentario tecnico: serializa un registro como lo hace la reescritura completa (sin CRLF).
+def _csv_base_line(asin, iva, field_count, header_map, delimiter, trailing_delim):
+    row_out = [''] * field_count
+    row_out[header_map['asin']] = asin
+    row_out[header_map['iva']] = iva
+    # Comentario tecnico: serializa la fila con el delimitador detectado.
+    line = delimiter.join(row_out)
+    # Comentario tecnico: conserva delimitador trailing si corresponde.
+    if trailing_delim and (not row_out or row_out[-1] != ''):
+        line += delimiter
+    return line
+
+
+# Comentario tecnico: reescribe la base CSV completa con los pares (ASIN, IVA) en orden y retorna los offsets de
+# inicio de cada fila (None con indice=False, cuando no se va a guardar el sidecar).
+def _write_csv_base(base_path, header_line, records, header_fields, header_map, delimiter, trailing_delim, indice=True):
+    os.makedirs(os.path.dirname(base_path), exist_ok=True)
+    field_count = len(header_fields)
+    offsets = array('Q') if indice else None
+    with open(base_path, 'wb') as f:
+        head = (header_line + '\r\n').encode('utf-8')
+        f.write(head)
+        pos = len(head)
+        lines = []
+        # Comentario tecnico: reescribe la base en el orden consolidado.
+        for asin, iva in records:
+            line = (_csv_base_line(asin, iva, field_count, header_map, delimiter,
+                                   trailing_delim) + '\r\n').encode('utf-8')
+            if offsets is not None:
+                offsets.append(pos)
+                pos += len(line)
+            lines.append(line)
+            if len(lines) >= 65536:
+                f.write(b''.join(lines))
+                lines = []
+        if lines:
+            f.write(b''.join(lines))
+    return len(head), offsets
+
+
+# Comentario tecnico: guarda el indice de offsets junto con la huella de la base que describe.
+def _write_csv_index(base_path, data_start, offsets):
+    index_path = _csv_index_path(base_path)
+    temp_path = index_path + '.tmp'
+    try:
+        fingerprint = _file_fingerprint(base_path)
+        with open(temp_path, 'wb') as f:
+            f.write(_CSV_INDEX_HEADER.pack(_CSV_INDEX_MAGIC, fingerprint['size'], fingerprint['mtime_ns'],
+                                           bytes.fromhex(fingerprint['hash']), data_start, len(offsets)))
+            offsets.tofile(f)
+        os.replace(temp_path, index_path)
+        return True
+    except Exception:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        _remove_csv_index(base_path)
+        return False
+
+
+# Comentario tecnico: extiende el indice en su lugar con los offsets nuevos y actualiza la huella.
+def _append_csv_index(base_path, data_start, offsets, old_count):
+    try:
+        fingerprint = _file_fingerprint(base_path)
+        with open(_csv_index_path(base_path), 'r+b') as f:
+            f.seek(_CSV_INDEX_HEADER.size + old_count * offsets.itemsize)
+            offsets[old_count:].tofile(f)
+            f.truncate()
+            # Comentario tecnico: la cabecera se escribe al final; si algo falla antes, la huella no coincide.
+            f.seek(0)
+            f.write(_CSV_INDEX_HEADER.pack(_CSV_INDEX_MAGIC, fingerprint['size'], fingerprint['mtime_ns'],
+                                           bytes.fromhex(fingerprint['hash']), data_start, len(offsets)))
+        return True
+    except Exception:
+        _remove_csv_index(base_path)
+        return False
+
+
+# Comentario tecnico: elimina un indice que ya no describe la base.
+def _remove_csv_index(base_path):
+    try:
+        os.remove(_csv_index_path(base_path))
+    except OSError:
+        pass
+
+
+# Comentario tecnico: lee el indice si la huella coincide con la base actual; retorna None si no aplica.
+def _read_csv_index(base_path):
+    index_path = _csv_index_path(base_path)
+    if not os.path.isfile(index_path):
+        return None
+    try:
+        with open(index_path, 'rb') as f:
+            head = f.read(_CSV_INDEX_HEADER.size)
+            magic, size, mtime_ns, digest, data_start, count = _CSV_INDEX_HEADER.unpack(head)
+            if magic != _CSV_INDEX_MAGIC:
+                return None
+            current = _file_fingerprint(base_path, with_hash=False)
+            if current['size'] != size or current['mtime_ns'] != mtime_ns:
+                return None
+            if _file_fingerprint(base_path)['hash'] != digest.hex():
+                return None
+            offsets = array('Q')
+            offsets.fromfile(f, count)
+    except Exception:
+        return None
+    return data_start, offsets
+
+
+# Comentario tecnico: aplica cambios de IVA en su lugar y agrega filas nuevas al final del CSV.
+def _patch_csv_base(base_path, index, header_line, base_map, base_count, modified, added, header_fields, header_map,
+                    delimiter, trailing_delim):
+    data_start, offsets = index
+    field_count = len(header_fields)
+    if len(offsets) != base_count or data_start != len((header_line + '\r\n').encode('utf-8')):
+        return None
+    # Comentario tecnico: un cambio de ancho obliga a desplazar el resto del archivo (reescritura completa).
+    for _, old_iva, new_iva in modified:
+        if len(old_iva.encode('utf-8')) != len(new_iva.encode('utf-8')):
+            return None
+    changes = {asin: (old_iva, new_iva) for asin, old_iva, new_iva in modified}
+    positions = {}
+    if changes:
+        for idx, asin in enumerate(base_map):
+            if idx >= base_count:
+                break
+            if asin in changes:
+                positions[asin] = idx
+    if len(positions) != len(changes):
+        return None
+    delim_len = len(delimiter.encode('utf-8'))
+    asin_idx = header_map['asin']
+    iva_idx = header_map['iva']
+    with open(base_path, 'r+b') as f:
+        # Comentario tecnico: valida todas las filas a tocar antes de escribir un solo byte.
+        end = f.seek(0, 2)
+        if end < data_start:
+            return None
+        if end > data_start:
+            f.seek(end - 2)
+            if f.read(2) != b'\r\n':
+                return None
+        patches = []
+        for asin, (old_iva, new_iva) in changes.items():
+            offset = offsets[positions[asin]]
+            expected = (_csv_base_line(asin, old_iva, field_count, header_map, delimiter, trailing_delim)
+                        + '\r\n').encode('utf-8')
+            f.seek(offset)
+            if f.read(len(expected)) != expected:
+                return None
+            iva_offset = offset + iva_idx * delim_len
+            if asin_idx < iva_idx:
+                iva_offset += len(asin.encode('utf-8'))
+            patches.append((iva_offset, new_iva.encode('utf-8')))
+        # Comentario tecnico: sobrescribe solo los bytes del IVA de cada fila modificada.
+        for iva_offset, value in sorted(patches):
+            f.seek(iva_offset)
+            f.write(value)
+        # Comentario tecnico: las filas nuevas se agregan al final y extienden el indice.
+        pos = end
+        lines = []
+        for asin, iva in added:
+            line = (_csv_base_line(asin, iva, field_count, header_map, delimiter, trailing_delim)
+                    + '\r\n').encode('utf-8')
+            offsets.append(pos)
+            pos += len(line)
+            lines.append(line)
+        if lines:
+            f.seek(end)
+            f.write(b''.join(lines))
+    return data_start, offsets
+
+
+# Comentario tecnico: cabecera del archivo de cache de la base parseada.
+_BASE_CACHE_MAGIC = 'IVASINS-BASE-CACHE 1'
+
+
+# Comentario tecnico: la cache de base es opcional (--cache o IVASINS_CACHE=1).
+def _base_cache_enabled(args):
+    if getattr(args, 'cache', False):
+        return True
+    return os.getenv('IVASINS_CACHE', '0').strip().lower() in ('1', 'true', 'yes', 'on', 'si')
+
+
+# Comentario tecnico: ruta del sidecar de cache junto a la base.
+def _base_cache_path(base_path):
+    return base_path + '.ivacache'
+
+
+# Comentario tecnico: huella del archivo (tamano, mtime y hash del contenido).
+def _file_fingerprint(path, with_hash=True):
+    stat = os.stat(path)
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        fingerprint['hash'] = digest.hexdigest()
+    return fingerprint
+
+
+# Comentario tecnico: indica si la metadata de una cache corresponde a la base en su estado actual. Con
+# con_hash=False basta tamano y mtime (cache en memoria escrita por este mismo proceso).
+def _base_cache_vigente(meta, base_path, base_type, sheet_name, con_hash=True):
+    # Comentario tecnico: tamano y mtime descartan rapido; el hash confirma el contenido.
+    current = _file_fingerprint(base_path, with_hash=False)
+    cached = meta.get('fingerprint') or {}
+    if cached.get('size') != current['size'] or cached.get('mtime_ns') != current['mtime_ns']:
+        return False
+    if meta.get('base_type') != base_type:
+        return False
+    if base_type == 'XLSX' and meta.get('sheet_name') != (sheet_name or BASE_SHEET_NAME):
+        return False
+    if not con_hash:
+        return True
+    return cached.get('hash') == _file_fingerprint(base_path)['hash']
+
+
+# Comentario tecnico: ultima cache de base de un proceso persistente (--watch), conservada en memoria entre corridas
+# para no releer el sidecar. Quien la toma se queda con el mapa: si la corrida falla despues de modificarlo, la
+# siguiente vuelve a leer el disco.
+class _BaseCaliente:
+    def __init__(self):
+        self.activa = False
+        self._path = None
+        self._meta = None
+
+    def guardar(self, base_path, meta, base_map, base_duplicates):
+        if not self.activa:
+            return
+        self._path = os.path.normcase(base_path)
+        self._meta = dict(meta, base_map=base_map, base_duplicates=base_duplicates)
+
+    def tomar(self, base_path, base_type, sheet_name):
+        meta = self._meta
+        if meta is None or self._path != os.path.normcase(base_path):
+            return None
+        self.descartar(base_path)
+        try:
+            # Comentario tecnico: la entrada la escribio este proceso; sin releer la base para hashearla.
+            if not _base_cache_vigente(meta, base_path, base_type, sheet_name, con_hash=False):
+                return None
+        except OSError:
+            return None
+        return meta
+
+    def descartar(self, base_path):
+        if self._path == os.path.normcase(base_path):
+            self._path = None
+            self._meta = None
+
+
+_BASE_CALIENTE = _BaseCaliente()
+
+
+# Comentario tecnico: lee la cache si coincide con la huella actual de la base; retorna None si no aplica.
+def _load_base_cache(base_path, base_type, sheet_name):
+    meta = _BASE_CALIENTE.tomar(base_path, base_type, sheet_name)
+    if meta is not None:
+        return meta
+    cache_path = _base_cache_path(base_path)
+    if not os.path.isfile(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8', newline='\n') as f:
+            if f.readline().rstrip('\n') != _BASE_CACHE_MAGIC:
+                return None
+            meta = json.loads(f.readline())
+            if not _base_cache_vigente(meta, base_path, base_type, sheet_name):
+                return None
+            body = f.read()
+    except Exception:
+        return None
+    lines = body.split('\n')
+    if lines and lines[-1] == '':
+        lines.pop()
+    if len(lines) != meta.get('records'):
+        return None
+    base_map = _BaseIva()
+    for line in lines:
+        asin, _, iva = line.partition('\t')
+        base_map[asin] = iva
+    base_duplicates = {asin: count for asin, count in meta.get('duplicates', [])}
+    meta['base_map'] = base_map
+    meta['base_duplicates'] = base_duplicates
+    return meta
+
+
+# Comentario tecnico: escribe la cache de forma atomica (temporal + os.replace) tras escribir la base.
+def _write_base_cache(base_path, meta, base_map, base_duplicates):
+    cache_path = _base_cache_path(base_path)
+    temp_path = cache_path + '.tmp'
+    try:
+        meta = dict(meta)
+        meta['fingerprint'] = _file_fingerprint(base_path)
+        meta['records'] = len(base_map)
+        meta['duplicates'] = [[asin, count] for asin, count in base_duplicates.items()]
+        with open(temp_path, 'w', encoding='utf-8', newline='\n') as f:
+            f.write(_BASE_CACHE_MAGIC + '\n')
+            f.write(json.dumps(meta) + '\n')
+            lines = []
+            for asin, iva in base_map.items():
+                line = asin + '\t' + iva
+                # Comentario tecnico: valores con separadores del formato no se pueden cachear.
+                if '\n' in line or '\r' in line or line.count('\t') != 1:
+                    raise ValueError('valor no cacheable')
+                lines.append(line)
+                if len(lines) >= 65536:
+                    f.write('\n'.join(lines) + '\n')
+                    lines = []
+            if lines:
+                f.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, cache_path)
+        _BASE_CALIENTE.guardar(base_path, meta, base_map, base_duplicates)
+        return True
+    except Exception:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        _remove_base_cache(base_path)
+        return False
+
+
+# Comentario tecnico: elimina una cache que ya no representa la base.
+def _remove_base_cache(base_path):
+    _BASE_CALIENTE.descartar(base_path)
+    try:
+        os.remove(_base_cache_path(base_path))
+    except OSError:
+        pass
+
+
+# Comentario tecnico: extensiones de base SQLite y version del esquema (PRAGMA user_version).
+_SQLITE_EXTENSIONES = ('.sqlite', '.sqlite3', '.db')
+_SQLITE_ESQUEMA = 1
+# Comentario tecnico: ultima fila que admite una hoja XLSX (la primera es el encabezado).
+_XLSX_MAX_FILAS = 1048575
+
+
+# Comentario tecnico: tipo de base segun la extension (CSV por defecto).
+def _base_type(base_path):
+    ext = os.path.splitext(base_path)[1].lower()
+    if ext == '.xlsx':
+        return 'XLSX'
+    if ext in _SQLITE_EXTENSIONES:
+        return 'SQLITE'
+    return 'CSV'
+
+
+# Comentario tecnico: crea el esquema de una base SQLite nueva. El orden de insercion es el rowid (orden) y el
+# indice UNIQUE de asin resuelve las busquedas y los upserts; meta guarda el layout del CSV/XLSX de origen.
+def _crear_sqlite(conn):
+    conn.execute('CREATE TABLE base (orden INTEGER PRIMARY KEY, asin TEXT NOT NULL UNIQUE, iva TEXT NOT NULL)')
+    conn.execute('CREATE TABLE meta (clave TEXT PRIMARY KEY, valor TEXT NOT NULL)')
+    conn.execute('PRAGMA user_version = %d' % _SQLITE_ESQUEMA)
+
+
+# Comentario tecnico: abre una base SQLite del motor; las transacciones se controlan con BEGIN/COMMIT explicitos.
+def _abrir_sqlite(base_path):
+    conn = sqlite3.connect(base_path, isolation_level=None)
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        tablas = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    except sqlite3.DatabaseError as exc:
+        conn.close()
+        raise ValueError('No se pudo abrir la base SQLite ' + base_path + ': ' + str(exc))
+    if version != _SQLITE_ESQUEMA or not {'base', 'meta'} <= tablas:
+        conn.close()
+        raise ValueError('La base SQLite no tiene el formato del motor (usa --export para crearla): ' + base_path)
+    # Comentario tecnico: la tabla temporal del reporte vive en memoria.
+    conn.execute('PRAGMA temp_store = MEMORY')
+    return conn
+
+
+# Comentario tecnico: layout guardado en meta: encabezados, mapa, delimitador, delimitador final, linea de
+# encabezado original y filas actuales.
+def _sqlite_layout(conn):
+    meta = dict(conn.execute('SELECT clave, valor FROM meta'))
+    header_fields = json.loads(meta.get('encabezado', '[]'))
+    header_map = {_normalize_header(h): i for i, h in enumerate(header_fields) if str(h or '').strip() != ''}
+    if 'asin' not in header_map:
+        raise ValueError('No se encontro la columna ASIN en la base SQLite.')
+    if 'iva' not in header_map:
+        raise ValueError('No se encontro la columna IVA en la base SQLite.')
+    return (header_fields, header_map, meta.get('delimitador', ','), meta.get('delimitador_final') == '1',
+            meta.get('linea_encabezado'), int(meta.get('filas', '0')))
+
+
+# Comentario tecnico: version del contenido que cada escritura deja en meta; reemplaza al hash del archivo en el
+# registro de reportes para no releer la base completa.
+def _sqlite_version(base_path):
+    conn = _abrir_sqlite(base_path)
+    try:
+        row = conn.execute("SELECT valor FROM meta WHERE clave = 'version'").fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+# Comentario tecnico: huella de la base para el registro de reportes (en SQLite, la version en lugar del hash).
+def _base_fingerprint(base_path):
+    if _base_type(base_path) != 'SQLITE':
+        return _file_fingerprint(base_path)
+    fingerprint = _file_fingerprint(base_path, with_hash=False)
+    fingerprint['hash'] = _sqlite_version(base_path)
+    return fingerprint
+
+
+# Comentario tecnico: escribe una base SQLite nueva con los pares (ASIN, IVA) en orden (temporal + os.replace).
+def _write_sqlite_base(base_path, header_line, records, header_fields, delimiter, trailing_delim):
+    temp_path = base_path + '.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    conn = sqlite3.connect(temp_path, isolation_level=None)
+    try:
+        conn.execute('BEGIN')
+        _crear_sqlite(conn)
+        conn.executemany('INSERT INTO base (asin, iva) VALUES (?, ?)', records)
+        filas = conn.execute('SELECT COUNT(*) FROM base').fetchone()[0]
+        conn.executemany('INSERT INTO meta (clave, valor) VALUES (?, ?)', [
+            ('encabezado', json.dumps([str(h or '') for h in header_fields], ensure_ascii=False)),
+            ('delimitador', delimiter),
+            ('delimitador_final', '1' if trailing_delim else '0'),
+            ('linea_encabezado', header_line),
+            ('filas', str(filas)),
+            ('version', uuid.uuid4().hex),
+        ])
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.close()
+        os.remove(temp_path)
+        raise
+    conn.close()
+    os.replace(temp_path, base_path)
+    return filas
+
+
+# Comentario tecnico: cabecera del registro de reportes aplicados y cantidad de corridas que conserva.
+_LEDGER_MAGIC = 'IVASINS-LEDGER 1'
+_LEDGER_MAX_ENTRADAS = 200
+
+
+# Comentario tecnico: el registro de reportes aplicados esta activo salvo IVASINS_LEDGER=0.
+def _ledger_enabled():
+    return os.getenv('IVASINS_LEDGER', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+# Comentario tecnico: registro de reportes aplicados junto a la base (<base>.ivaledger): por corrida guarda hash,
+# tamano y mtime de cada reporte y la huella de la base resultante. Si la base sigue en ese estado, volver a aplicar
+# el mismo conjunto de reportes no cambia nada (su IVA consolidado ya quedo escrito), asi que la corrida se omite.
+# Un reporte que entro junto con otros no se puede omitir por separado: con SI gana su valor propio puede no ser el
+# que quedo en la base. Los hashes de los reportes se calculan en un hilo mientras corre el proceso (hashlib libera
+# el GIL).
+class _LedgerReportes:
+    def __init__(self, base_path, reporte_paths):
+        self.path = base_path + '.ivaledger'
+        self.base_path = base_path
+        self.reporte_paths = reporte_paths
+        self.entradas = self._leer()
+        self._hashes = {}
+        self._hilo = None
+        self._detener = threading.Event()
+
+    def _leer(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                if f.readline().rstrip('\n') != _LEDGER_MAGIC:
+                    return []
+                return [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return []
+
+    def _hash(self, path):
+        digest = self._hashes.get(path)
+        if digest is None:
+            hasher = hashlib.blake2b(digest_size=16)
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    if self._detener.is_set():
+                        return None
+                    hasher.update(chunk)
+            digest = self._hashes[path] = hasher.hexdigest()
+        return digest
+
+    # Comentario tecnico: ultima corrida si el pedido es la union de conjuntos completos de reportes aplicados con la
+    # base en su estado actual; None si no. Tamano y mtime iguales a lo registrado evitan releer base y reportes.
+    def aplicado(self):
+        if not self.entradas:
+            return None
+        try:
+            current = _file_fingerprint(self.base_path, with_hash=False)
+        except OSError:
+            return None
+        ultima = self.entradas[-1].get('base', {})
+        if ultima.get('size') != current['size']:
+            return None
+        if ultima.get('mtime_ns') == current['mtime_ns']:
+            base_hash = ultima.get('hash')
+        elif _base_type(self.base_path) == 'SQLITE':
+            base_hash = _sqlite_version(self.base_path)
+        else:
+            base_hash = self._hash(self.base_path)
+        # Comentario tecnico: corridas consecutivas (desde la ultima) que terminaron con la base en este estado.
+        corridas = []
+        conocidos = {}
+        for entrada in reversed(self.entradas):
+            if entrada.get('base', {}).get('hash') != base_hash:
+                break
+            reportes = entrada.get('reportes', [])
+            corridas.append({(reporte.get('size'), reporte.get('hash')) for reporte in reportes})
+            for reporte in reportes:
+                conocidos[(reporte.get('archivo'), reporte.get('size'), reporte.get('mtime_ns'))] = reporte.get('hash')
+        tamanos = {size for corrida in corridas for size, _ in corrida}
+        pedido = set()
+        for reporte_path in self.reporte_paths:
+            stat = os.stat(reporte_path)
+            if stat.st_size not in tamanos:
+                return None
+            digest = conocidos.get((reporte_path, stat.st_size, stat.st_mtime_ns)) or self._hash(reporte_path)
+            self._hashes[reporte_path] = digest
+            pedido.add((stat.st_size, digest))
+        cubiertos = set()
+        for corrida in corridas:
+            if corrida <= pedido:
+                cubiertos |= corrida
+        return self.entradas[-1] if cubiertos == pedido else None
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._hashear_reportes, name='ivasins-ledger', daemon=True)
+        self._hilo.start()
+
+    def _hashear_reportes(self):
+        for reporte_path in self.reporte_paths:
+            try:
+                self._hash(reporte_path)
+            except OSError:
+                return
+
+    def detener(self):
+        self._detener.set()
+
+    # Comentario tecnico: agrega la corrida con la huella de la base ya escrita (se reescribe el archivo completo,
+    # acotado a las ultimas corridas). Guarda tambien el encabezado de la preview para repetirlo si se omite la
+    # proxima corrida.
+    def registrar(self, resumen_data, salida_path=None):
+        if self._hilo is not None:
+            self._hilo.join()
+        reportes = []
+        for reporte_path in self.reporte_paths:
+            digest = self._hash(reporte_path)
+            if digest is None:
+                return False
+            stat = os.stat(reporte_path)
+            reportes.append({'archivo': reporte_path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                             'hash': digest})
+        self._hashes.pop(self.base_path, None)
+        entrada = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'reportes': reportes,
+            'base': _base_fingerprint(self.base_path),
+            'agregados': int(resumen_data.get('agregados', 0)),
+            'modificados': int(resumen_data.get('modificados', 0)),
+            'base_final': int(resumen_data.get('base_final', 0)),
+        }
+        encabezado = _preview_encabezado(salida_path) if salida_path else None
+        if encabezado is not None:
+            entrada['preview_encabezado'] = encabezado
+        entradas = (self.entradas + [entrada])[-_LEDGER_MAX_ENTRADAS:]
+        temp_path = self.path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8', newline='\n') as f:
+                f.write(_LEDGER_MAGIC + '\n')
+                for item in entradas:
+                    f.write(json.dumps(item, ensure_ascii=False) + '\n')
+            os.replace(temp_path, self.path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+        self.entradas = entradas
+        return True
+
+
+# Comentario tecnico: encabezado (primera linea, sin fin de linea) de una preview ya escrita; None si no se lee.
+def _preview_encabezado(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.readline().decode('utf-8').rstrip('\r\n')
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+# Comentario tecnico: reporte detallado de una corrida omitida; reemplaza al de la corrida anterior, que ya no
+# corresponde a esta ejecucion.
+def _write_report_ya_aplicado(report_path, base_path, reporte_paths, entrada):
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    lines = [
+        'REPORTE IVA PROCESS',
+        'Fecha/Hora: %s' % datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        '',
+        'RESUMEN GENERAL',
+        'Base: %s' % base_path,
+        'Tipo base: %s' % _base_type(base_path),
+    ]
+    if len(reporte_paths) == 1:
+        lines.append('Reporte inventario: %s' % reporte_paths[0])
+    else:
+        lines.append('Reportes inventario: %d' % len(reporte_paths))
+    lines.extend([
+        'Reportes ya aplicados a esta base (%s); no se hicieron cambios.' % entrada.get('fecha', ''),
+        'Agregados en esa corrida: %s' % entrada.get('agregados', 0),
+        'Modificados en esa corrida: %s' % entrada.get('modificados', 0),
+        'Total base: %s' % entrada.get('base_final', 0),
+        'Usar --force para reprocesar.',
+    ])
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+
+
+# Comentario tecnico: resumen de una corrida omitida porque los reportes ya estaban aplicados; deja una preview sin
+# filas (con el encabezado guardado en el registro) y un reporte breve para que la interfaz no muestre los de una
+# corrida anterior.
+def _resumen_ya_aplicado(entrada, base_path, reporte_paths, salida_path, reporte_out_path=None):
+    # Comentario tecnico: el encabezado guardado ya tiene delimitadores; se escribe como un unico campo.
+    encabezado = entrada.get('preview_encabezado')
+    _write_preview_csv(salida_path, [encabezado] if encabezado else [], {}, '', False, ())
+    if reporte_out_path:
+        _write_report_ya_aplicado(reporte_out_path, base_path, reporte_paths, entrada)
+    base_final = str(entrada.get('base_final', 0))
+    resumen_data = {
+        'ok': 'true',
+        'ya_aplicado': 'true',
+        'ya_aplicado_fecha': entrada.get('fecha', ''),
+        'mensaje': 'Los reportes ya estaban aplicados a esta base (%s); no se hicieron cambios. Usar --force para '
+                   'reprocesar.' % entrada.get('fecha', ''),
+        'base_original': base_final,
+        'base_final': base_final,
+        'reportes': str(len(reporte_paths)),
+    }
+    for number, reporte_path in enumerate(reporte_paths, 1):
+        resumen_data['reporte_%d_archivo' % number] = reporte_path
+    return resumen_data
+
+
+# Comentario tecnico: modo de memoria acotada (--max-memory o IVASINS_MAX_MEMORY). Base y reportes se vuelcan a
+# corridas ordenadas por ASIN en disco y se combinan con un merge-join; base, preview, contadores y reporte quedan
+# iguales a los del modo en memoria.
+_MAX_MEMORY_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?\s*$', re.I)
+_MAX_MEMORY_UNITS = {'': 1, 'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30, 't': 1 << 40}
+# Comentario tecnico: costo estimado en memoria de un registro (tupla, ASIN y su lugar en la lista).
+_EXTERNO_BYTES_REGISTRO = 200
+# Comentario tecnico: registros por bloque serializado; cada corrida abierta durante un merge retiene un bloque.
+_EXTERNO_BLOQUE = 4096
+# Comentario tecnico: partes del presupuesto (la fusion llena seis salidas mientras lee tres entradas).
+_EXTERNO_PARTES = 8
+_EXTERNO_MIN_REGISTROS = 10000
+_primero = operator.itemgetter(0)
+
+
+# Comentario tecnico: presupuesto de memoria en bytes (512M, 2G, 1.5GB...); None o 0 usa el modo en memoria.
+def _max_memory(args):
+    value = getattr(args, 'max_memory', None)
+    if value is None:
+        value = os.getenv('IVASINS_MAX_MEMORY', '')
+    value = str(value).strip()
+    if not value:
+        return None
+    match = _MAX_MEMORY_RE.match(value)
+    if not match:
+        raise ValueError('Valor invalido para --max-memory: ' + value)
+    return int(float(match.group(1)) * _MAX_MEMORY_UNITS[match.group(2).lower()]) or None
+
+
+# Comentario tecnico: lee una corrida serializada bloque a bloque.
+def _leer_corrida(path):
+    with open(path, 'rb', buffering=1 << 16) as f:
+        while True:
+            try:
+                bloque = pickle.load(f)
+            except EOFError:
+                return
+            yield from bloque
+
+
+# Comentario tecnico: serializa registros en bloques de _EXTERNO_BLOQUE.
+def _escribir_bloques(f, registros):
+    bloque = []
+    for registro in registros:
+        bloque.append(registro)
+        if len(bloque) >= _EXTERNO_BLOQUE:
+            pickle.dump(bloque, f, pickle.HIGHEST_PROTOCOL)
+            bloque = []
+    if bloque:
+        pickle.dump(bloque, f, pickle.HIGHEST_PROTOCOL)
+
+
+# Comentario tecnico: ordenamiento externo de registros (tuplas o textos) por su orden natural.
+# Mientras los registros llegan ordenados se escriben tal cual a una sola corrida, sin ordenar ni combinar (entradas
+# ya ordenadas por ASIN pasan directo). Al primer desorden el resto se acumula hasta la capacidad, se ordena y se
+# vuelca como otra corrida; al leer se combinan a lo sumo fanin corridas a la vez. Si todo cabe, no toca el disco.
+class _Corridas:
+    def __init__(self, carpeta, capacidad, fanin):
+        self._carpeta = carpeta
+        self._capacidad = capacidad
+        self._fanin = fanin
+        self._buffer = []
+        self._archivos = []
+        self._directo = None
+        self._ultimo = None
+        self._en_orden = True
+        self._cerrado = False
+        self.total = 0
+
+    def __len__(self):
+        return self.total
+
+    def _abrir(self):
+        fd, path = tempfile.mkstemp(suffix='.corrida', dir=self._carpeta)
+        return path, os.fdopen(fd, 'wb', buffering=1 << 16)
+
+    def _escribir_directo(self):
+        if self._directo is None:
+            path, self._directo = self._abrir()
+            self._archivos.append(path)
+        pickle.dump(self._buffer, self._directo, pickle.HIGHEST_PROTOCOL)
+        self._buffer = []
+
+    def _volcar(self):
+        self._buffer.sort()
+        path, f = self._abrir()
+        with f:
+            _escribir_bloques(f, self._buffer)
+        self._archivos.append(path)
+        self._buffer = []
+
+    def add(self, registro):
+        self.total += 1
+        if self._en_orden:
+            if self._ultimo is None or not registro < self._ultimo:
+                self._ultimo = registro
+                self._buffer.append(registro)
+                if len(self._buffer) >= _EXTERNO_BLOQUE:
+                    self._escribir_directo()
+                return
+            # Comentario tecnico: primer desorden; lo escrito hasta aqui ya es una corrida valida.
+            self._en_orden = False
+            self._ultimo = None
+            if self._directo is not None:
+                if self._buffer:
+                    self._escribir_directo()
+                self._directo.close()
+                self._directo = None
+        self._buffer.append(registro)
+        if len(self._buffer) >= self._capacidad:
+            self._volcar()
+
+    def _cerrar(self):
+        if self._cerrado:
+            return
+        self._cerrado = True
+        if self._directo is not None:
+            if self._buffer:
+                self._escribir_directo()
+            self._directo.close()
+            self._directo = None
+        elif self._archivos:
+            if self._buffer:
+                self._volcar()
+        elif not self._en_orden:
+            self._buffer.sort()
+        # Comentario tecnico: con mas corridas que fanin se combinan por grupos hasta que entren en un solo merge.
+        while len(self._archivos) > self._fanin:
+            archivos = []
+            for inicio in range(0, len(self._archivos), self._fanin):
+                grupo = self._archivos[inicio:inicio + self._fanin]
+                if len(grupo) == 1:
+                    archivos.extend(grupo)
+                    continue
+                path, f = self._abrir()
+                with f:
+                    _escribir_bloques(f, heapq.merge(*(_leer_corrida(corrida) for corrida in grupo)))
+                for corrida in grupo:
+                    os.remove(corrida)
+                archivos.append(path)
+            self._archivos = archivos
+
+    # Comentario tecnico: registros ordenados; se puede recorrer mas de una vez (ya no admite add).
+    def __iter__(self):
+        self._cerrar()
+        if not self._archivos:
+            return iter(self._buffer)
+        if len(self._archivos) == 1:
+            return _leer_corrida(self._archivos[0])
+        return heapq.merge(*(_leer_corrida(corrida) for corrida in self._archivos))
+
+
+# Comentario tecnico: destino de _load_base_csv en modo externo; vuelca (ASIN, fila, IVA) sin consolidar.
+class _BaseDerrame:
+    def __init__(self, corridas):
+        self._corridas = corridas
+        self._fila = 0
+
+    def consolidar(self, asin, iva):
+        self._fila += 1
+        self._corridas.add((asin, self._fila, iva))
+        return False
+
+
+# Comentario tecnico: destino de _consolidate_reporte_rows en modo externo. get nunca encuentra el ASIN, asi que cada
+# fila valida se vuelca como (ASIN, orden global, numero de reporte, IVA); los duplicados se resuelven al combinar.
+class _ReporteDerrame:
+    def __init__(self, corridas):
+        self._corridas = corridas
+        self._orden = 0
+        self.numero = 0
+
+    def get(self, asin, default=None):
+        return default
+
+    def __setitem__(self, asin, iva):
+        self._orden += 1
+        self._corridas.add((asin, self._orden, self.numero, iva))
+
+
+# Comentario tecnico: consolida las filas de base ordenadas por ASIN como lo hace _BaseIva.consolidar:
+# (fila de la primera aparicion, IVA con SI prioritario, filas eliminadas, fila del primer duplicado).
+def _grupos_base(registros):
+    for asin, grupo in itertools.groupby(registros, key=_primero):
+        _, fila, iva = next(grupo)
+        eliminadas = 0
+        primer_duplicado = None
+        for _, duplicado, iva_duplicado in grupo:
+            if primer_duplicado is None:
+                primer_duplicado = duplicado
+            eliminadas += 1
+            if iva_duplicado == 'SI':
+                iva = 'SI'
+        yield asin, 0, (fila, iva, eliminadas, primer_duplicado)
+
+
+# Comentario tecnico: consolida las filas de reportes ordenadas por ASIN: (orden de primera aparicion, reporte, IVA).
+def _grupos_reporte(registros):
+    for asin, grupo in itertools.groupby(registros, key=_primero):
+        _, orden, numero, iva = next(grupo)
+        if iva != 'SI':
+            for registro in grupo:
+                if registro[3] == 'SI':
+                    iva = 'SI'
+                    break
+        yield asin, 1, (orden, numero, iva)
+
+
+# Comentario tecnico: ASIN cancelados unicos.
+def _grupos_cancelados(registros):
+    for asin, _ in itertools.groupby(registros):
+        yield asin, 2, None
+
+
+# Comentario tecnico: reportes ya leidos a corridas en disco (modo externo). Las corridas cerradas son solo rutas (o un
+# buffer que entra en el presupuesto), asi que el modo de varias bases las pasa a cada proceso sin volver a parsear.
+# En per_report, asin_nuevos guarda las filas validas de cada reporte hasta que se cuentan los ASIN unicos.
+class _ReportesEnCorridas:
+    def __init__(self, report_runs, cancelled_runs, per_report):
+        self.report_runs = report_runs
+        self.cancelled_runs = cancelled_runs
+        self.per_report = per_report
+
+    # Comentario tecnico: combina reporte y cancelados por ASIN: (ASIN, (orden, reporte, IVA) o None, cancelado).
+    def grupos(self):
+        merged = heapq.merge(_grupos_reporte(self.report_runs), _grupos_cancelados(self.cancelled_runs))
+        for asin, grupo in itertools.groupby(merged, key=_primero):
+            report = None
+            cancelled = False
+            for _, origen, datos in grupo:
+                if origen == 1:
+                    report = datos
+                else:
+                    cancelled = True
+            yield asin, report, cancelled
+
+    # Comentario tecnico: copia de per_report con duplicados y asin_nuevos ya separados (nuevos por reporte).
+    def estadisticas(self, nuevos):
+        per_report = []
+        for numero, stats in enumerate(self.per_report):
+            stats = dict(stats)
+            stats['duplicados'] = stats['asin_nuevos'] - nuevos[numero]
+            stats['asin_nuevos'] = nuevos[numero]
+            per_report.append(stats)
+        return per_report
+
+    # Comentario tecnico: contadores del reporte sin armar el mapa: (per_report, ASIN unicos, ASIN solo cancelados).
+    def contadores(self):
+        nuevos = [0] * len(self.per_report)
+        unicos = cancelados = 0
+        for _, report, cancelled in self.grupos():
+            if report is not None:
+                unicos += 1
+                nuevos[report[1]] += 1
+            elif cancelled:
+                cancelados += 1
+        return self.estadisticas(nuevos), unicos, cancelados
+
+    # Comentario tecnico: mismo resultado que _parse_reportes, para las bases que se procesan en memoria.
+    def en_memoria(self):
+        nuevos = [0] * len(self.per_report)
+        entradas = []
+        cancelled_asins = set()
+        for asin, report, cancelled in self.grupos():
+            if report is not None:
+                orden, numero, iva = report
+                entradas.append((orden, asin, iva))
+                nuevos[numero] += 1
+            if cancelled:
+                cancelled_asins.add(asin)
+        entradas.sort()
+        report_map = OrderedDict((asin, iva) for _, asin, iva in entradas)
+        return report_map, cancelled_asins, self.estadisticas(nuevos)
+
+
+# Comentario tecnico: fabrica de corridas en carpeta con capacidad y fanin acordes al presupuesto de memoria.
+def _externo_corridas(carpeta, limite):
+    capacidad = max(_EXTERNO_MIN_REGISTROS, limite // (_EXTERNO_BYTES_REGISTRO * _EXTERNO_PARTES))
+    fanin = max(2, limite // (_EXTERNO_BYTES_REGISTRO * _EXTERNO_BLOQUE * _EXTERNO_PARTES))
+
+    def corridas():
+        return _Corridas(carpeta, capacidad, fanin)
+    return corridas
+
+
+# Comentario tecnico: lee los reportes en serie (tambien comprimidos) a corridas; los contadores por fila salen exactos.
+# Las corridas quedan cerradas para recorrerlas desde otros procesos.
+def _reportes_a_corridas(corridas, reporte_paths, progreso=None):
+    report_runs = corridas()
+    cancelled_runs = corridas()
+    destino = _ReporteDerrame(report_runs)
+    per_report = []
+    sizes = [os.path.getsize(reporte_path) for reporte_path in reporte_paths]
+    for numero, reporte_path in enumerate(reporte_paths):
+        stats = {'archivo': reporte_path, 'total': 0, 'cancelados': 0, 'sin_asin': 0, 'duplicados': 0,
+                 'asin_nuevos': 0}
+        destino.numero = numero
+        _consolidate_reporte_file(reporte_path, destino, cancelled_runs, stats, progreso, sum(sizes[:numero]),
+                                  sum(sizes))
+        per_report.append(stats)
+    report_runs._cerrar()
+    cancelled_runs._cerrar()
+    return _ReportesEnCorridas(report_runs, cancelled_runs, per_report)
+
+
+# Comentario tecnico: proceso completo de una base CSV con memoria acotada; retorna el resumen y las filas por fase.
+# reportes son las corridas de _reportes_a_corridas cuando ya se leyeron (modo de varias bases).
+def _procesar_externo(cronometro, limite, base_path, salida_path, reporte_paths, reporte_out_path, progreso=None,
+                      preview_limit=None, reporte_opciones=None, reportes=None):
+    reporte_opciones = reporte_opciones or {}
+    with tempfile.TemporaryDirectory(prefix='ivasins-externo-') as carpeta:
+        corridas = _externo_corridas(carpeta, limite)
+
+        cronometro.fase('carga_base')
+        base_runs = corridas()
+        (_, header_fields, header_map, base_delim, trailing_delim, base_original_rows, _,
+         header_line) = _load_base_csv(base_path, _BaseDerrame(base_runs), progreso)
+
+        cronometro.fase('parseo_reportes')
+        if reportes is None:
+            reportes = _reportes_a_corridas(corridas, reporte_paths, progreso)
+        report_runs = reportes.report_runs
+        cancelled_runs = reportes.cancelled_runs
+
+        cronometro.fase('fusion')
+        # Comentario tecnico: salidas de la fusion, cada una ordenada por la clave que pide el modo en memoria.
+        base_out = corridas()
+        added = corridas()
+        modified = corridas()
+        removed = corridas()
+        duplicated = corridas()
+        cancelled_only = corridas()
+        nuevos = [0] * len(reporte_paths)
+        base_unicos = unchanged = report_unicos = removed_rows = 0
+        merged = heapq.merge(_grupos_base(base_runs), _grupos_reporte(report_runs), _grupos_cancelados(cancelled_runs))
+        # Comentario tecnico: el avance se cuenta sobre el merge (groupby invalida sus grupos al adelantarse).
+        merged = _con_progreso(progreso, merged)
+        for asin, grupo in itertools.groupby(merged, key=_primero):
+            base = report = None
+            cancelled = False
+            for _, origen, datos in grupo:
+                if origen == 0:
+                    base = datos
+                elif origen == 1:
+                    report = datos
+                else:
+                    cancelled = True
+            if base is not None:
+                fila, iva, eliminadas, primer_duplicado = base
+                base_unicos += 1
+                if eliminadas:
+                    removed.add((primer_duplicado, asin, eliminadas))
+                    duplicated.add(asin)
+                    removed_rows += eliminadas
+            if report is None:
+                if base is not None:
+                    base_out.add((fila, asin, iva))
+                if cancelled:
+                    cancelled_only.add(asin)
+                continue
+            orden, numero, iva_value = report
+            report_unicos += 1
+            nuevos[numero] += 1
+            if base is None:
+                added.add((orden, asin, iva_value))
+            elif iva != iva_value:
+                modified.add((orden, asin, iva, iva_value))
+                base_out.add((fila, asin, iva_value))
+            else:
+                unchanged += 1
+                base_out.add((fila, asin, iva))
+        per_report = reportes.estadisticas(nuevos)
+        base_final = base_unicos + len(added)
+        first_new_index = base_unicos if len(added) else 0
+
+        def base_pairs():
+            return ((asin, iva) for _, asin, iva in base_out)
+
+        def added_pairs():
+            return ((asin, iva) for _, asin, iva in added)
+
+        cronometro.fase('escritura_base')
+        # Comentario tecnico: la base ya se leyo completa a las corridas, asi que se reescribe en su lugar.
+        _write_csv_base(base_path, header_line,
+                        _con_progreso(progreso, itertools.chain(base_pairs(), added_pairs()), base_final),
+                        header_fields, header_map, base_delim, trailing_delim, indice=False)
+        # Comentario tecnico: indice y cache ya no describen la base reescrita.
+        _remove_csv_index(base_path)
+        _remove_base_cache(base_path)
+
+        cronometro.fase('preview')
+        preview_total = base_final - first_new_index
+        preview_filas = _write_preview_csv(salida_path, header_fields, header_map, base_delim, trailing_delim,
+                                           itertools.islice(added_pairs() if len(added) else base_pairs(),
+                                                            preview_limit))
+
+        cronometro.fase('resumen')
+        resumen_data = _resumen_datos(per_report, len(cancelled_only), report_unicos, len(added), len(modified),
+                                      unchanged, len(duplicated), removed_rows, base_original_rows, base_final,
+                                      first_new_index, preview_filas, preview_total)
+
+        cronometro.fase('reporte_detalle')
+        if reporte_out_path:
+            datos_paths = _write_report(
+                reporte_out_path,
+                base_path,
+                'CSV',
+                None,
+                reporte_paths,
+                resumen_data,
+                added_pairs(),
+                ((asin, iva_old, iva_new) for _, asin, iva_old, iva_new in modified),
+                cancelled_only,
+                ((asin, count) for _, asin, count in removed),
+                duplicated,
+                first_new_index,
+                per_report,
+                **reporte_opciones
+            )
+            resumen_data.update(('reporte_datos_' + seccion, path) for seccion, path in datos_paths.items())
+    return resumen_data, {
+        'carga_base': base_original_rows,
+        'parseo_reportes': int(resumen_data['total_reporte']),
+        'escritura_base': base_final,
+    }
+
+
+# Comentario tecnico: procesa una base SQLite. El reporte se carga a una tabla temporal y agregados, modificados y
+# sin cambios salen de consultas por conjuntos contra el indice de asin; la base se actualiza con un upsert por
+# lotes en una sola transaccion, asi que el costo crece con el reporte y no con la base.
+def _procesar_sqlite(cronometro, base_path, salida_path, reporte_paths, reporte_out_path, workers=None, progreso=None,
+                     preview_limit=None, reporte_opciones=None, reportes=None):
+    reporte_opciones = reporte_opciones or {}
+    cronometro.fase('carga_base')
+    conn = _abrir_sqlite(base_path)
+    try:
+        header_fields, header_map, base_delim, trailing_delim, _, base_original_rows = _sqlite_layout(conn)
+
+        cronometro.fase('parseo_reportes')
+        report_map, cancelled_asins, per_report = reportes or _parse_reportes(reporte_paths, workers, progreso)
+
+        cronometro.fase('fusion')
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('CREATE TEMP TABLE reporte (orden INTEGER PRIMARY KEY, asin TEXT NOT NULL UNIQUE, '
+                         'iva TEXT NOT NULL)')
+            conn.executemany('INSERT INTO reporte (asin, iva) VALUES (?, ?)',
+                             _con_progreso(progreso, report_map.items(), len(report_map)))
+            # Comentario tecnico: ambas consultas recorren el reporte y buscan cada ASIN en el indice de la base.
+            added = conn.execute('SELECT r.asin, r.iva FROM reporte r WHERE NOT EXISTS '
+                                 '(SELECT 1 FROM base b WHERE b.asin = r.asin) ORDER BY r.orden').fetchall()
+            modified = conn.execute('SELECT r.asin, b.iva, r.iva FROM reporte r JOIN base b ON b.asin = r.asin '
+                                    'WHERE b.iva <> r.iva ORDER BY r.orden').fetchall()
+            unchanged = len(report_map) - len(added) - len(modified)
+
+            cronometro.fase('escritura_base')
+            ultimo = conn.execute('SELECT COALESCE(MAX(orden), 0) FROM base').fetchone()[0]
+            # Comentario tecnico: los ASIN nuevos toman orden creciente en el orden del reporte; los existentes solo
+            # se reescriben si cambia el IVA.
+            conn.execute('INSERT INTO base (asin, iva) SELECT asin, iva FROM reporte WHERE true ORDER BY orden '
+                         'ON CONFLICT (asin) DO UPDATE SET iva = excluded.iva WHERE base.iva <> excluded.iva')
+            base_final = base_original_rows + len(added)
+            conn.executemany('INSERT OR REPLACE INTO meta (clave, valor) VALUES (?, ?)',
+                             [('filas', str(base_final)), ('version', uuid.uuid4().hex)])
+            conn.execute('DROP TABLE reporte')
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        first_new_index = base_original_rows if added else 0
+
+        cronometro.fase('preview')
+        preview_total = base_final - first_new_index
+        consulta = 'SELECT asin, iva FROM base WHERE orden > ? ORDER BY orden'
+        parametros = (ultimo if added else 0,)
+        if preview_limit is not None:
+            consulta += ' LIMIT ?'
+            parametros += (preview_limit,)
+        preview_filas = _write_preview_csv(
+            salida_path, header_fields, header_map, base_delim, trailing_delim,
+            _con_progreso(progreso, conn.execute(consulta, parametros),
+                          preview_total if preview_limit is None else min(preview_total, preview_limit)))
+    finally:
+        conn.close()
+
+    cronometro.fase('resumen')
+    cancelled_only = sorted(asin for asin in cancelled_asins if asin not in report_map)
+    # Comentario tecnico: el indice UNIQUE impide duplicados, asi que no hay filas que consolidar.
+    resumen_data = _resumen_datos(per_report, len(cancelled_only), len(report_map), len(added), len(modified),
+                                  unchanged, 0, 0, base_original_rows, base_final, first_new_index, preview_filas,
+                                  preview_total)
+
+    cronometro.fase('reporte_detalle')
+    if reporte_out_path:
+        datos_paths = _write_report(
+            reporte_out_path,
+            base_path,
+            'SQLITE',
+            None,
+            reporte_paths,
+            resumen_data,
+            added,
+            modified,
+            cancelled_only,
+            (),
+            (),
+            first_new_index,
+            per_report,
+            **reporte_opciones
+        )
+        resumen_data.update(('reporte_datos_' + seccion, path) for seccion, path in datos_paths.items())
+    return resumen_data, {
+        'carga_base': base_original_rows,
+        'parseo_reportes': int(resumen_data['total_reporte']),
+        'escritura_base': len(report_map),
+    }
+
+
+# Comentario tecnico: convierte la base a otro formato segun la extension del destino (--export). La base SQLite
+# guarda el layout del CSV/XLSX de origen y lo reproduce al exportar; retorna la cantidad de filas escritas.
+def _exportar_base(args):
+    base_path = _resolve_base(args)
+    destino = os.path.abspath(args.export)
+    if os.path.normcase(destino) == os.path.normcase(base_path):
+        raise ValueError('El destino de --export debe ser distinto de la base: ' + destino)
+    base_type = _base_type(base_path)
+    destino_type = _base_type(destino)
+    conn = None
+    header_line = None
+    try:
+        if base_type == 'SQLITE':
+            conn = _abrir_sqlite(base_path)
+            header_fields, header_map, delimiter, trailing_delim, header_line, filas = _sqlite_layout(conn)
+            records = conn.execute('SELECT asin, iva FROM base ORDER BY orden')
+        elif base_type == 'CSV':
+            (base_map, header_fields, header_map, delimiter, trailing_delim, _, _,
+             header_line) = _load_base_csv(base_path)
+            filas = len(base_map)
+            records = base_map.items()
+        else:
+            (_, base_map, header_fields, header_map, _, _, max_col) = _load_base_xlsx_stream(base_path, args.sheet)
+            header_fields = list(header_fields)[:max_col]
+            delimiter = ';'
+            trailing_delim = False
+            filas = len(base_map)
+            records = base_map.items()
+        header_fields = [str(h or '') for h in header_fields]
+        if header_line is None:
+            header_line = delimiter.join(header_fields)
+            if trailing_delim and (not header_fields or header_fields[-1] != ''):
+                header_line += delimiter
+
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        if destino_type == 'SQLITE':
+            return _write_sqlite_base(destino, header_line, records, header_fields, delimiter, trailing_delim)
+        temp_path = destino + '.tmp'
+        if destino_type == 'CSV':
+            _write_csv_base(temp_path, header_line, records, header_fields, header_map, delimiter, trailing_delim,
+                            indice=False)
+        else:
+            if filas > _XLSX_MAX_FILAS:
+                raise ValueError('La base tiene %d filas y una hoja XLSX admite hasta %d; exporta a CSV.'
+                                 % (filas, _XLSX_MAX_FILAS))
+            openpyxl = _load_openpyxl()
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet(BASE_SHEET_NAME)
+            ws.append(header_fields)
+            asin_idx = header_map['asin']
+            iva_idx = header_map['iva']
+            for asin, iva in records:
+                row = [None] * len(header_fields)
+                row[asin_idx] = asin
+                row[iva_idx] = iva
+                ws.append(row)
+            wb.save(temp_path)
+        os.replace(temp_path, destino)
+    finally:
+        if conn is not None:
+            conn.close()
+    # Comentario tecnico: indice y cache de un archivo anterior con el mismo nombre ya no lo describen.
+    _remove_csv_index(destino)
+    _remove_base_cache(destino)
+    return filas
+
+
+# Comentario tecnico: genera un CSV de previsualizacion con los pares (ASIN, IVA) recibidos (desde el primer agregado).
+def _write_preview_csv(path, header_fields, header_map, delimiter, trailing_delim, records):
+    # Comentario tecnico: asegura directorio de salida para el archivo preview.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Comentario tecnico: normaliza encabezados a string para escritura segura.
+    header_fields = [str(h or '') for h in header_fields]
+    # Comentario tecnico: construye linea de encabezado con el delimitador original.
+    header_line = delimiter.join(header_fields)
+    # Comentario tecnico: preserva delimitador final si existia en el CSV base.
+    if trailing_delim and (not header_fields or header_fields[-1] != ''):
+        header_line += delimiter
+
+    field_count = len(header_fields)
+    # Comentario tecnico: offset del inicio de cada pagina, para que la interfaz salte a una pagina sin leer las previas.
+    paginas = array('Q')
+    filas = 0
+    with open(path, 'wb') as f:
+        # Comentario tecnico: escribe encabezado en formato CRLF.
+        head = (header_line + '\r\n').encode('utf-8')
+        f.write(head)
+        pos = len(head)
+        lines = []
+        # Comentario tecnico: itera registros desde el primer agregado (el llamador ya salto los previos y aplico el tope).
+        for asin, iva in records:
+            if not filas % _PREVIEW_PAGINA:
+                paginas.append(pos)
+            line = (_csv_base_line(asin, iva, field_count, header_map, delimiter,
+                                   trailing_delim) + '\r\n').encode('utf-8')
+            pos += len(line)
+            lines.append(line)
+            filas += 1
+            if len(lines) >= 65536:
+                f.write(b''.join(lines))
+                lines = []
+        if lines:
+            f.write(b''.join(lines))
+    _write_preview_index(path, pos, filas, paginas)
+    return filas
+
+
+# Comentario tecnico: indice de paginas de la preview (cabecera fija + offset uint64 del inicio de cada pagina).
+_PREVIEW_INDEX_HEADER = struct.Struct('<8sQQQQ')
+_PREVIEW_INDEX_MAGIC = b'IVAPAG01'
+# Comentario tecnico: filas por pagina del indice (las que muestra la interfaz por vez).
+_PREVIEW_PAGINA = 100
+
+
+# Comentario tecnico: tope de filas de la preview (--preview-limit o IVASINS_PREVIEW_LIMIT); None = sin tope.
+def _preview_limit(args):
+    value = getattr(args, 'preview_limit', None)
+    if value is None:
+        value = os.getenv('IVASINS_PREVIEW_LIMIT', '').strip() or '0'
+    try:
+        limite = int(value)
+    except ValueError:
+        raise ValueError('Valor invalido para --preview-limit: ' + str(value))
+    return limite if limite > 0 else None
+
+
+# Comentario tecnico: ruta del sidecar con el indice de paginas junto a la preview.
+def _preview_index_path(path):
+    return path + '.ivapag'
+
+
+# Comentario tecnico: guarda el indice de paginas con el tamano de la preview que describe (la interfaz lo valida).
+def _write_preview_index(path, size, filas, paginas):
+    index_path = _preview_index_path(path)
+    temp_path = index_path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(_PREVIEW_INDEX_HEADER.pack(_PREVIEW_INDEX_MAGIC, size, _PREVIEW_PAGINA, filas, len(paginas)))
+            paginas.tofile(f)
+        os.replace(temp_path, index_path)
+        return True
+    except Exception:
+        for stale in (temp_path, index_path):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+        return False
+
+
+# Comentario tecnico: secciones del reporte detallado con sus columnas y como se arma cada linea de texto (join
+# directo cuando todos los campos son texto); el nombre de la seccion tambien nombra su archivo de datos
+# (<reporte>.<seccion>.<formato>).
+_REPORT_SECCIONES = OrderedDict([
+    ('agregados', (('asin', 'iva'), ','.join)),
+    ('modificados', (('asin', 'iva_anterior', 'iva_nuevo'), ','.join)),
+    ('no_procesados', (('asin', 'motivo'), ','.join)),
+    ('eliminados', (('asin', 'eliminados'), '%s,%s'.__mod__)),
+    ('duplicados', (('asin',), ','.join)),
+])
+_REPORT_DATOS_FORMATOS = ('jsonl', 'csv', 'jsonl.gz', 'csv.gz')
+
+
+# Comentario tecnico: opciones del reporte detallado: tope de filas por seccion (--reporte-max-filas o
+# IVASINS_REPORT_MAX_ROWS) y formato de los archivos de datos (--reporte-datos o IVASINS_REPORT_DATA).
+def _report_opciones(args):
+    max_filas = getattr(args, 'reporte_max_filas', None)
+    if max_filas is None:
+        value = os.getenv('IVASINS_REPORT_MAX_ROWS', '').strip() or '0'
+        try:
+            max_filas = int(value)
+        except ValueError:
+            raise ValueError('Valor invalido para --reporte-max-filas: ' + value)
+    formato = getattr(args, 'reporte_datos', None)
+    if formato is None:
+        formato = os.getenv('IVASINS_REPORT_DATA', '')
+    formato = formato.strip().lower()
+    if formato and formato not in _REPORT_DATOS_FORMATOS:
+        raise ValueError('Formato invalido para --reporte-datos: %s (usar %s)'
+                         % (formato, ', '.join(_REPORT_DATOS_FORMATOS)))
+    return {'max_filas': max_filas if max_filas > 0 else None, 'formato_datos': formato or None}
+
+
+# Comentario tecnico: archivo de datos de una seccion del reporte (JSONL o CSV con encabezado, opcionalmente gzip).
+class _ReportDatos:
+    def __init__(self, path, campos, formato):
+        self.path = path
+        self.campos = campos
+        if formato.endswith('.gz'):
+            self._f = gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=6)
+        else:
+            self._f = open(path, 'w', encoding='utf-8', newline='')
+        self._csv = None
+        if formato.startswith('csv'):
+            self._csv = csv.writer(self._f, lineterminator='\n')
+            self._csv.writerow(campos)
+
+    def write(self, row):
+        if self._csv is not None:
+            self._csv.writerow(row)
+        else:
+            self._f.write(json.dumps(dict(zip(self.campos, row)), ensure_ascii=False) + '\n')
+
+    def close(self):
+        self._f.close()
+
+
+# Comentario tecnico: lineas de una seccion; con tope se conservan las primeras y se informa cuantas se omitieron,
+# pero todas las filas pasan al archivo de datos.
+def _report_section(rows, formato, max_filas=None, datos=None):
+    if max_filas is None and datos is None:
+        for row in rows:
+            yield formato(row)
+        return
+    count = 0
+    for row in rows:
+        if datos is not None:
+            datos.write(row)
+        if max_filas is None or count < max_filas:
+            yield formato(row)
+        count += 1
+    if max_filas is not None and count > max_filas:
+        detalle = '; detalle completo en ' + os.path.basename(datos.path) if datos is not None else ''
+        yield f'... {count - max_filas} filas omitidas (total seccion: {count}){detalle}'
+
+
+# Comentario tecnico: lineas del reporte detallado; los listados se consumen como iterables (pueden venir de disco).
+# cancelled_only y duplicated llegan ya ordenados; removed son pares (ASIN, filas eliminadas) en orden de aparicion.
+def _report_lines(base_path, base_type, sheet_name, reporte_paths, resumen, added, modified, cancelled_only, removed,
+                  duplicated, preview_start_index, per_report=None, max_filas=None, datos=None):
+    datos = datos or {}
+    # Comentario tecnico: timestamp para trazabilidad del proceso.
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    # Comentario tecnico: encabezado general del reporte.
+    yield 'REPORTE IVA PROCESS'
+    yield f'Fecha/Hora: {now}'
+    yield ''
     # Comentario tecnico: inicia bloque de resumen global con metadatos del proceso.
-    lines.append('RESUMEN GENERAL')
-    lines.append(f'Base: {base_path}')
-    lines.append(f'Tipo base: {base_type}')
+    yield 'RESUMEN GENERAL'
+    yield f'Base: {base_path}'
+    yield f'Tipo base: {base_type}'
     # Comentario tecnico: agrega nombre de hoja solo cuando la base es XLSX.
     if base_type == 'XLSX':
-        lines.append(f'Hoja usada: {sheet_name}')
-    lines.append(f'Reporte inventario: {reporte_path}')
-    lines.append(f'Total filas en reporte: {resumen["total_reporte"]}')
-    lines.append(f'Filas canceladas: {resumen["cancelados_filas"]} (ASIN unicos: {resumen["cancelados_asins"]})')
-    lines.append(f'Filas sin ASIN: {resumen["sin_asin_filas"]}')
-    lines.append(f'Filas duplicadas en reporte: {resumen["duplicados_filas"]}')
-    lines.append(f'ASIN unicos procesados: {resumen["asin_unicos_reporte"]}')
-    lines.append(f'Agregados nuevos: {resumen["agregados"]}')
-    lines.append(f'Modificados (IVA cambiado): {resumen["modificados"]}')
-    lines.append(f'Sin cambios (IVA igual): {resumen["sin_cambios"]}')
-    lines.append(f'Duplicados en base consolidados: {resumen["consolidados_base"]}')
-    lines.append(f'Eliminados de base (filas): {resumen["eliminados_base"]}')
-    lines.append(f'Total base antes: {resumen["base_original"]}')
-    lines.append(f'Total base despues: {resumen["base_final"]}')
-    lines.append(f'Vista previa inicia en fila (sin encabezado): {preview_start_index + 1}')
-    lines.append('')
+        yield f'Hoja usada: {sheet_name}'
+    if len(reporte_paths) == 1:
+        yield f'Reporte inventario: {reporte_paths[0]}'
+    else:
+        yield f'Reportes inventario: {len(reporte_paths)}'
+    yield f'Total filas en reporte: {resumen["total_reporte"]}'
+    yield f'Filas canceladas: {resumen["cancelados_filas"]} (ASIN unicos: {resumen["cancelados_asins"]})'
+    yield f'Filas sin ASIN: {resumen["sin_asin_filas"]}'
+    yield f'Filas duplicadas en reporte: {resumen["duplicados_filas"]}'
+    yield f'ASIN unicos procesados: {resumen["asin_unicos_reporte"]}'
+    yield f'Agregados nuevos: {resumen["agregados"]}'
+    yield f'Modificados (IVA cambiado): {resumen["modificados"]}'
+    yield f'Sin cambios (IVA igual): {resumen["sin_cambios"]}'
+    yield f'Duplicados en base consolidados: {resumen["consolidados_base"]}'
+    yield f'Eliminados de base (filas): {resumen["eliminados_base"]}'
+    yield f'Total base antes: {resumen["base_original"]}'
+    yield f'Total base despues: {resumen["base_final"]}'
+    yield f'Vista previa inicia en fila (sin encabezado): {preview_start_index + 1}'
+    yield ''
+
+    # Comentario tecnico: detalle por reporte cuando se aplicaron varios en la misma ejecucion.
+    if per_report and len(per_report) > 1:
+        yield 'REPORTES PROCESADOS (ORDEN,ARCHIVO,FILAS,CANCELADAS,SIN_ASIN,DUPLICADAS,ASIN_NUEVOS)'
+        yield 'ORDEN,ARCHIVO,FILAS,CANCELADAS,SIN_ASIN,DUPLICADAS,ASIN_NUEVOS'
+        for number, stats in enumerate(per_report, 1):
+            yield (f'{number},{stats["archivo"]},{stats["total"]},{stats["cancelados"]},{stats["sin_asin"]},'
+                   f'{stats["duplicados"]},{stats["asin_nuevos"]}')
+        yield ''
 
     # Comentario tecnico: listado de ASIN agregados con su IVA.
-    lines.append('PRODUCTOS AGREGADOS (ASIN,IVA)')
+    yield 'PRODUCTOS AGREGADOS (ASIN,IVA)'
     # Comentario tecnico: cabecera de columnas para el listado de agregados.
-    lines.append('ASIN,IVA')
+    yield 'ASIN,IVA'
     # Comentario tecnico: agrega cada ASIN nuevo al listado.
-    for asin, iva in added:
-        lines.append(f'{asin},{iva}')
-    lines.append('')
+    yield from _report_section(added, _REPORT_SECCIONES['agregados'][1], max_filas, datos.get('agregados'))
+    yield ''
 
     # Comentario tecnico: listado de ASIN modificados y su delta de IVA.
-    lines.append('PRODUCTOS MODIFICADOS (ASIN,IVA_ANTERIOR,IVA_NUEVO)')
+    yield 'PRODUCTOS MODIFICADOS (ASIN,IVA_ANTERIOR,IVA_NUEVO)'
     # Comentario tecnico: cabecera de columnas para el listado de modificados.
-    lines.append('ASIN,IVA_ANTERIOR,IVA_NUEVO')
+    yield 'ASIN,IVA_ANTERIOR,IVA_NUEVO'
     # Comentario tecnico: agrega cada ASIN modificado con valores previo y nuevo.
-    for asin, iva_old, iva_new in modified:
-        lines.append(f'{asin},{iva_old},{iva_new}')
-    lines.append('')
+    yield from _report_section(modified, _REPORT_SECCIONES['modificados'][1], max_filas, datos.get('modificados'))
+    yield ''
 
     # Comentario tecnico: listado de ASIN omitidos por cancelacion o falta de ASIN.
-    lines.append('PRODUCTOS NO PROCESADOS (ASIN,MOTIVO)')
+    yield 'PRODUCTOS NO PROCESADOS (ASIN,MOTIVO)'
     # Comentario tecnico: cabecera de columnas para el listado de no procesados.
-    lines.append('ASIN,MOTIVO')
+    yield 'ASIN,MOTIVO'
     # Comentario tecnico: agrega ASIN cancelados que no fueron procesados.
-    for asin in sorted(cancelled_only):
-        lines.append(f'{asin},CANCELADO')
+    yield from _report_section(((asin, 'CANCELADO') for asin in cancelled_only), _REPORT_SECCIONES['no_procesados'][1],
+                               max_filas, datos.get('no_procesados'))
     # Comentario tecnico: agrega indicador de filas sin ASIN si aplica.
     if int(resumen['sin_asin_filas']) > 0:
-        lines.append(f',SIN_ASIN (filas={resumen["sin_asin_filas"]})')
-    lines.append('')
+        yield f',SIN_ASIN (filas={resumen["sin_asin_filas"]})'
+    yield ''
 
     # Comentario tecnico: listado de filas eliminadas por duplicados en base.
-    lines.append('PRODUCTOS ELIMINADOS DE LA BASE (ASIN,ELIMINADOS)')
+    yield 'PRODUCTOS ELIMINADOS DE LA BASE (ASIN,ELIMINADOS)'
     # Comentario tecnico: cabecera de columnas para el listado de eliminados.
-    lines.append('ASIN,ELIMINADOS')
+    yield 'ASIN,ELIMINADOS'
     # Comentario tecnico: agrega conteo de eliminaciones por ASIN duplicado.
-    for asin, count in removed_counts.items():
-        lines.append(f'{asin},{count}')
-    lines.append('')
+    yield from _report_section(removed, _REPORT_SECCIONES['eliminados'][1], max_filas, datos.get('eliminados'))
+    yield ''
 
     # Comentario tecnico: seccion opcional con ASIN duplicados detectados.
     # Comentario tecnico: incluye seccion de duplicados si hubo consolidacion.
-    if base_duplicates:
-        lines.append('DUPLICADOS EN BASE CONSOLIDADOS (ASIN)')
+    if int(resumen['consolidados_base']) > 0:
+        yield 'DUPLICADOS EN BASE CONSOLIDADOS (ASIN)'
         # Comentario tecnico: cabecera de columnas para duplicados unicos.
-        lines.append('ASIN')
+        yield 'ASIN'
         # Comentario tecnico: lista ASIN duplicados unicos en orden alfabetico.
-        for asin in sorted(set(base_duplicates)):
-            lines.append(asin)
-        lines.append('')
+        yield from _report_section(((asin,) for asin in duplicated), _REPORT_SECCIONES['duplicados'][1], max_filas,
+                                   datos.get('duplicados'))
+        yield ''
+
 
+# Comentario tecnico: escribe el reporte detallado por bloques de lineas, sin armarlo completo en memoria. Con
+# formato_datos cada seccion se escribe tambien completa en su archivo de datos; retorna seccion -> ruta.
+def _write_report(report_path, base_path, base_type, sheet_name, reporte_paths, resumen, added, modified, cancelled_only,
+                  removed, duplicated, preview_start_index, per_report=None, max_filas=None, formato_datos=None):
     # Comentario tecnico: asegura directorio destino y escribe el reporte a disco.
     os.makedirs(os.path.dirname(report_path), exist_ok=True)
-    with open(report_path, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(lines))
+    datos = OrderedDict()
+    try:
+        if formato_datos:
+            root = os.path.splitext(report_path)[0]
+            for seccion, (campos, _) in _REPORT_SECCIONES.items():
+                datos[seccion] = _ReportDatos('%s.%s.%s' % (root, seccion, formato_datos), campos, formato_datos)
+        lines = _report_lines(base_path, base_type, sheet_name, reporte_paths, resumen, added, modified,
+                              cancelled_only, removed, duplicated, preview_start_index, per_report, max_filas, datos)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            # Comentario tecnico: equivale a '\n'.join de todas las lineas (sin salto final extra).
+            separator = ''
+            while True:
+                block = list(itertools.islice(lines, 65536))
+                if not block:
+                    break
+                f.write(separator + '\n'.join(block))
+                separator = '\n'
+    finally:
+        for sink in datos.values():
+            sink.close()
+    return OrderedDict((seccion, sink.path) for seccion, sink in datos.items())
 
 
-# Comentario tecnico: orquesta la ejecucion del motor desde la CLI.
-def main():
-    # Comentario tecnico: define argumentos de entrada y salida del proceso.
+# Comentario tecnico: define argumentos de entrada y salida del proceso.
+# Comentario tecnico: --base acepta una o varias bases (repitiendo la opcion o con varios valores); args.base queda
+# con la primera y args.bases con todas.
+class _BasesAction(argparse.Action):
+    def __call__(self, parser, namespace, values, option_string=None):
+        namespace.bases = list(getattr(namespace, 'bases', None) or []) + list(values)
+        setattr(namespace, self.dest, namespace.bases[0])
+
+
+def _build_parser():
     parser = argparse.ArgumentParser(description='Formatear IVA')
-    parser.add_argument('--base', required=True, help='CSV/XLSX base con ASIN, IVA')
-    parser.add_argument('--reporte', help='Reporte Amazon .txt')
+    parser.add_argument('--base', nargs='+', action=_BasesAction,
+                        help='Base CSV/XLSX/SQLite con ASIN, IVA; con varias, el reporte se parsea una vez y se aplica '
+                             'a cada base en paralelo')
+    parser.add_argument('--reporte', nargs='+', action='extend',
+                        help='Reportes Amazon .txt (tambien .gz, .bz2, .xz o .zip); uno o varios archivos, carpetas '
+                             'o patrones glob')
     parser.add_argument('--salida', help='CSV de previsualizacion')
     parser.add_argument('--resumen', help='Archivo resumen (properties)')
     parser.add_argument('--reporte-out', help='Reporte detallado .txt')
     parser.add_argument('--sheet', help='Nombre de hoja para XLSX')
+    parser.add_argument('--workers', type=int,
+                        help='Procesos para parsear reportes (1 = serie, 0 = automatico segun tamano)')
     parser.add_argument('--list-sheets', action='store_true', help='Listar hojas de un XLSX')
-    # Comentario tecnico: parsea argumentos CLI a un namespace.
-    args = parser.parse_args()
+    parser.add_argument('--cache', action='store_true',
+                        help='Usa/actualiza una cache de la base parseada junto al archivo (<base>.ivacache)')
+    parser.add_argument('--patch', action='store_true',
+                        help='CSV: agrega filas nuevas y parchea IVAs en su lugar usando un indice (<base>.ivaidx)')
+    parser.add_argument('--max-memory',
+                        help='Presupuesto de memoria (ej. 512M o 2G): la base CSV y los reportes se ordenan por ASIN '
+                             'en disco y se combinan sin cargarlos completos')
+    parser.add_argument('--preview-limit', type=int,
+                        help='Maximo de filas de la previsualizacion (0 = todas); se indexa por paginas en '
+                             '<salida>.ivapag')
+    parser.add_argument('--reporte-max-filas', type=int,
+                        help='Maximo de filas por seccion en el reporte detallado (0 = todas); los totales se '
+                             'mantienen')
+    parser.add_argument('--reporte-datos', choices=_REPORT_DATOS_FORMATOS,
+                        help='Escribe cada seccion del reporte completa en <reporte>.<seccion>.<formato>')
+    parser.add_argument('--force', action='store_true',
+                        help='Procesa aunque los reportes ya figuren como aplicados a la base (<base>.ivaledger)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Genera Reporte_Iva_Profile.txt (cProfile y tracemalloc) junto al reporte detallado')
+    parser.add_argument('--progress', action='store_true',
+                        help='Emite lineas "PROGRESO {json}" por stdout con fase, filas, filas/s, porcentaje y ETA')
+    parser.add_argument('--cancel-file',
+                        help='Si este archivo aparece durante el proceso, se cancela antes de escribir la base')
+    parser.add_argument('--serve', action='store_true',
+                        help='Proceso persistente: lee pedidos JSON por linea en stdin y responde en stdout')
+    parser.add_argument('--export',
+                        help='Convierte la base al formato del destino (.csv, .xlsx o .sqlite) y termina')
+    parser.add_argument('--watch',
+                        help='Vigila esta carpeta y aplica a --base, por lotes, los reportes que llegan (los mueve a '
+                             'procesados/ o fallidos/ con su resumen)')
+    parser.add_argument('--watch-window', type=float,
+                        help='Segundos sin cambios en la carpeta vigilada antes de procesar un lote (por defecto 5)')
+    parser.set_defaults(bases=[])
+    return parser
+
+
+# Comentario tecnico: memoria residente actual y pico del proceso en Windows (WorkingSetSize, PeakWorkingSetSize).
+def _memoria_windows():
+    import ctypes
+    from ctypes import wintypes
+
+    class _Contadores(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    kernel32 = ctypes.WinDLL('kernel32')
+    psapi = ctypes.WinDLL('psapi')
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(_Contadores), wintypes.DWORD]
+    contadores = _Contadores()
+    contadores.cb = ctypes.sizeof(contadores)
+    if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(contadores), contadores.cb):
+        return None, None
+    return contadores.WorkingSetSize, contadores.PeakWorkingSetSize
+
+
+# Comentario tecnico: memoria residente actual (VmRSS) y pico (VmHWM) del proceso en Linux.
+def _memoria_linux():
+    valores = {}
+    with open('/proc/self/status', 'rb') as f:
+        for line in f:
+            if line.startswith((b'VmRSS:', b'VmHWM:')):
+                valores[line[:5]] = int(line.split()[1]) * 1024
+    return valores.get(b'VmRSS'), valores.get(b'VmHWM')
+
+
+# Comentario tecnico: memoria residente actual y pico del proceso en bytes; None en lo que la plataforma no informa.
+def _memoria():
+    try:
+        if os.name == 'nt':
+            return _memoria_windows()
+        if sys.platform.startswith('linux'):
+            actual, pico = _memoria_linux()
+            if pico is not None:
+                return actual, pico
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except Exception:
+        return None, None
+    # Comentario tecnico: ru_maxrss viene en KB en Linux y en bytes en macOS.
+    return None, pico if sys.platform == 'darwin' else pico * 1024
+
+
+# Comentario tecnico: en Linux el pico del proceso (VmHWM) se puede reiniciar a la memoria actual; True si se pudo.
+def _memoria_reiniciar_pico():
+    if not sys.platform.startswith('linux'):
+        return False
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return True
+
+
+# Comentario tecnico: pico de memoria residente de una fase. Si el pico del proceso se reinicio al empezarla, el pico
+# al cerrarla es el de la fase. Si no, y la fase supero el pico previo del proceso, ese nuevo pico es el suyo; en otro
+# caso se toma la mayor memoria residente al empezar y al terminar (None si la plataforma no la informa).
+class _MemoriaFase:
+    def __init__(self):
+        self._reiniciado = _memoria_reiniciar_pico()
+        self._actual, self._pico = _memoria()
+
+    def pico(self):
+        actual, pico = _memoria()
+        if pico is not None and (self._reiniciado or self._pico is None or pico > self._pico):
+            return pico
+        actuales = [valor for valor in (self._actual, actual) if valor is not None]
+        return max(actuales) if actuales else None
+
+
+# Comentario tecnico: cronometro de fases consecutivas del proceso; una fase termina cuando empieza la siguiente.
+# Al cerrar cada fase registra el pico de memoria residente de la fase y, con trazar_memoria, el pico de tracemalloc.
+class _Cronometro:
+    def __init__(self, trazar_memoria=False):
+        self.fases = OrderedDict()
+        self.memoria = OrderedDict()
+        self.memoria_python = OrderedDict()
+        self.snapshot = None
+        # Comentario tecnico: seguimiento de progreso/cancelacion notificado en cada cambio de fase (opcional).
+        self.progreso = None
+        self._trazar = trazar_memoria
+        self._fase = None
+        self._inicio = None
+        self._memoria = None
+
+    def fase(self, nombre):
+        ahora = time.perf_counter()
+        trazando = self._trazar and tracemalloc.is_tracing()
+        if self._fase is not None:
+            self.fases[self._fase] = self.fases.get(self._fase, 0.0) + (ahora - self._inicio)
+            pico = self._memoria.pico()
+            if pico is not None:
+                self.memoria[self._fase] = max(self.memoria.get(self._fase, 0), pico)
+            if trazando:
+                self.memoria_python[self._fase] = max(self.memoria_python.get(self._fase, 0),
+                                                      tracemalloc.get_traced_memory()[1])
+        # Comentario tecnico: reinicia el pico de tracemalloc para que refleje solo la fase que empieza.
+        if trazando and nombre is not None and hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        self._fase = nombre
+        self._memoria = _MemoriaFase() if nombre is not None else None
+        self._inicio = time.perf_counter()
+        if self.progreso is not None:
+            self.progreso.fase(nombre)
+
+    def terminar(self):
+        self.fase(None)
+        # Comentario tecnico: la foto de tracemalloc se toma con las estructuras del proceso aun vivas.
+        if self._trazar and tracemalloc.is_tracing():
+            self.snapshot = tracemalloc.take_snapshot()
+
+
+# Comentario tecnico: intervalo minimo (segundos) entre lineas de progreso y entre revisiones de cancelacion.
+_PROGRESO_INTERVALO = 0.5
+# Comentario tecnico: elementos por bloque al recorrer con progreso; el reloj se consulta una vez por bloque.
+_PROGRESO_BLOQUE = 8192
+# Comentario tecnico: fases en las que la base todavia no se toco; solo en ellas se atiende una cancelacion. En
+# destinos (varias bases) el pedido se reenvia a cada base, que lo atiende en estas mismas fases.
+_FASES_CANCELABLES = ('ledger', 'carga_base', 'parseo_reportes', 'fusion', 'destinos')
+
+
+# Comentario tecnico: cancelacion cooperativa; se lanza en un punto seguro, antes de escribir la base.
+class _Cancelado(Exception):
+    def __init__(self, fase):
+        super().__init__('Proceso cancelado durante %s; la base no se modifico.' % (fase or 'el inicio'))
+        self.fase = fase
+        # Comentario tecnico: resumen parcial escrito por _procesar antes de propagar la excepcion.
+        self.resumen = None
+
+
+# Comentario tecnico: progreso del proceso y cancelacion cooperativa.
+# emitir recibe un dict por actualizacion (a lo sumo cada _PROGRESO_INTERVALO segundos, mas una al iniciar cada
+# fase). La cancelacion llega por archivo centinela o por cancelar() (senales) y se revisa con la misma frecuencia;
+# desde que empieza escritura_base ya no se atiende y el proceso termina normalmente.
+class _Progreso:
+    def __init__(self, emitir=None, cancel_file=None, intervalo=_PROGRESO_INTERVALO):
+        self._emitir = emitir
+        self._cancel_file = cancel_file
+        self._intervalo = intervalo
+        self.cancelado = False
+        self.cancelable = True
+        # Comentario tecnico: filas recorridas por fase (se informan como estadistica parcial al cancelar).
+        self.filas = OrderedDict()
+        self._fase = None
+        self._inicio = time.monotonic()
+        self._siguiente = 0.0
+
+    def cancelar(self, *_):
+        # Comentario tecnico: un segundo pedido interrumpe de inmediato, como sin seguimiento.
+        if self.cancelado:
+            raise KeyboardInterrupt
+        self.cancelado = True
+        if not self.cancelable:
+            sys.stderr.write('WARN: la base ya se esta escribiendo; el proceso termina normalmente '
+                             '(repetir para interrumpir).\n')
+
+    def contador(self):
+        return self.filas.get(self._fase, 0)
+
+    def _revisar(self):
+        if not self.cancelable:
+            return
+        if not self.cancelado and self._cancel_file and os.path.exists(self._cancel_file):
+            self.cancelado = True
+        if self.cancelado:
+            raise _Cancelado(self._fase)
+
+    def fase(self, nombre):
+        if nombre is None:
+            return
+        # Comentario tecnico: el cambio de fase es el ultimo punto seguro antes de escribir la base.
+        self._revisar()
+        if nombre not in _FASES_CANCELABLES:
+            self.cancelable = False
+        self._fase = nombre
+        self._inicio = time.monotonic()
+        self._siguiente = self._inicio + self._intervalo
+        self._informar(self.contador(), None, self._inicio)
+
+    # Comentario tecnico: registra el avance de la fase; fraccion puede ser un numero o una funcion (se evalua
+    # solo cuando toca informar).
+    def paso(self, filas, fraccion=None):
+        self.filas[self._fase] = filas
+        ahora = time.monotonic()
+        if ahora < self._siguiente:
+            return
+        self._siguiente = ahora + self._intervalo
+        self._revisar()
+        if callable(fraccion):
+            fraccion = fraccion()
+        self._informar(filas, fraccion, ahora)
+
+    def _informar(self, filas, fraccion, ahora):
+        if self._emitir is None:
+            return
+        transcurrido = ahora - self._inicio
+        velocidad = filas / transcurrido if transcurrido > 0 else 0.0
+        eta = None
+        if fraccion is not None:
+            fraccion = min(max(fraccion, 0.0), 1.0)
+            if fraccion > 0:
+                eta = round(transcurrido * (1.0 - fraccion) / fraccion, 1)
+        self._emitir({
+            'fase': self._fase,
+            'filas': filas,
+            'filas_seg': int(velocidad),
+            'pct': None if fraccion is None else round(fraccion * 100.0, 1),
+            'eta_s': eta,
+            'transcurrido_s': round(transcurrido, 1),
+        })
+
+    # Comentario tecnico: recorre un iterable por bloques; el avance (y la cancelacion) se revisa entre bloques.
+    # El porcentaje sale de total (elementos) o de posicion()/tamano (bytes, con desde bytes previos).
+    def _bloques(self, iterable, total, posicion, tamano, desde):
+        filas = inicio = self.contador()
+        iterator = iter(iterable)
+        while True:
+            bloque = list(itertools.islice(iterator, _PROGRESO_BLOQUE))
+            if not bloque:
+                return
+            yield bloque
+            filas += len(bloque)
+            if total:
+                fraccion = (filas - inicio) / total
+            elif posicion is not None and tamano:
+                fraccion = lambda: (desde + posicion()) / tamano
+            else:
+                fraccion = None
+            self.paso(filas, fraccion)
 
-    # Comentario tecnico: resuelve ruta absoluta de la base para validacion.
+    def iterar(self, iterable, total=None, posicion=None, tamano=None, desde=0):
+        # Comentario tecnico: chain.from_iterable entrega los elementos en C; el costo extra es por bloque, no por fila.
+        return itertools.chain.from_iterable(self._bloques(iterable, total, posicion, tamano, desde))
+
+
+# Comentario tecnico: recorre iterable informando avance solo si hay seguimiento de progreso.
+# No sirve para iteradores que reutilizan sus elementos (groupby, filas de iterparse): se leen por bloques.
+def _con_progreso(progreso, iterable, total=None, posicion=None, tamano=None, desde=0):
+    if progreso is None:
+        return iterable
+    return progreso.iterar(iterable, total, posicion, tamano, desde)
+
+
+# Comentario tecnico: las lineas de progreso son opcionales (--progress o IVASINS_PROGRESS=1).
+def _progress_enabled(args):
+    if getattr(args, 'progress', False):
+        return True
+    return os.getenv('IVASINS_PROGRESS', '0').strip().lower() in ('1', 'true', 'yes', 'on', 'si')
+
+
+# Comentario tecnico: emite una linea de progreso por stdout (prefijo PROGRESO y un objeto JSON).
+def _emitir_progreso(datos):
+    sys.stdout.write('PROGRESO ' + json.dumps(datos) + '\n')
+    sys.stdout.flush()
+
+
+# Comentario tecnico: seguimiento segun los argumentos; None si no se pidio progreso ni archivo de cancelacion.
+def _progreso_desde_args(args, emitir=_emitir_progreso):
+    progress = _progress_enabled(args)
+    cancel_file = getattr(args, 'cancel_file', None)
+    if not progress and not cancel_file:
+        return None
+    return _Progreso(emitir if progress else None, os.path.abspath(cancel_file) if cancel_file else None)
+
+
+# Comentario tecnico: SIGINT/SIGTERM (y SIGBREAK en Windows) piden una cancelacion cooperativa mientras se procesa.
+def _instalar_senales(progreso):
+    previos = {}
+    for nombre in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+        senal = getattr(signal, nombre, None)
+        if senal is None:
+            continue
+        try:
+            previos[senal] = signal.signal(senal, progreso.cancelar)
+        except (OSError, ValueError):
+            pass
+    return previos
+
+
+def _restaurar_senales(previos):
+    for senal, handler in previos.items():
+        try:
+            signal.signal(senal, handler)
+        except (OSError, ValueError):
+            pass
+
+
+# Comentario tecnico: claves de tiempo (ms), memoria (MB) y filas por segundo por fase para el .resumen.
+def _metricas_resumen(cronometro, filas_por_fase):
+    metricas = OrderedDict()
+    metricas['fases'] = ','.join(cronometro.fases)
+    for fase, segundos in cronometro.fases.items():
+        metricas['t_%s_ms' % fase] = str(int(round(segundos * 1000)))
+    metricas['t_total_ms'] = str(int(round(sum(cronometro.fases.values()) * 1000)))
+    for fase, pico in cronometro.memoria.items():
+        metricas['mem_pico_%s_mb' % fase] = '%.1f' % (pico / 1048576.0)
+    if cronometro.memoria:
+        metricas['mem_pico_mb'] = '%.1f' % (max(cronometro.memoria.values()) / 1048576.0)
+    for fase, pico in cronometro.memoria_python.items():
+        metricas['mem_py_%s_mb' % fase] = '%.1f' % (pico / 1048576.0)
+    for fase, filas in filas_por_fase.items():
+        segundos = cronometro.fases.get(fase)
+        if segundos:
+            metricas['filas_seg_%s' % fase] = str(int(filas / segundos))
+    return metricas
+
+
+# Comentario tecnico: el perfil se activa con --profile o con IVASINS_PROFILE=1.
+def _profile_enabled(args):
+    if getattr(args, 'profile', False):
+        return True
+    return os.getenv('IVASINS_PROFILE', '0').strip().lower() in ('1', 'true', 'yes', 'on', 'si')
+
+
+# Comentario tecnico: escribe el perfil de la corrida (fases, cProfile y asignaciones de tracemalloc).
+def _write_profile(path, cronometro, profiler):
+    lines = []
+    lines.append('PERFIL FormatearIva')
+    lines.append('Fecha: ' + datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    lines.append('')
+    lines.append('FASES')
+    lines.append('%-18s %12s %16s %16s' % ('fase', 'tiempo ms', 'pico RSS MB', 'pico python MB'))
+    for fase, segundos in cronometro.fases.items():
+        pico = cronometro.memoria.get(fase)
+        pico_py = cronometro.memoria_python.get(fase)
+        lines.append('%-18s %12d %16s %16s' % (
+            fase, round(segundos * 1000),
+            '%.1f' % (pico / 1048576.0) if pico is not None else 'n/a',
+            '%.1f' % (pico_py / 1048576.0) if pico_py is not None else 'n/a'))
+    lines.append('Los procesos del pool de reportes (--workers) no se incluyen en el perfil.')
+    for titulo, orden, limite in (('CPROFILE (tiempo acumulado)', 'cumulative', 40),
+                                  ('CPROFILE (tiempo propio)', 'tottime', 25)):
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats(orden).print_stats(limite)
+        lines.append('')
+        lines.append(titulo)
+        lines.append(stream.getvalue().strip('\n'))
+    if cronometro.snapshot is not None:
+        lines.append('')
+        lines.append('TRACEMALLOC (memoria viva al terminar, por linea)')
+        for stat in cronometro.snapshot.statistics('lineno')[:25]:
+            lines.append(str(stat))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+# Comentario tecnico: resuelve y valida la ruta de la base recibida por CLI.
+def _resolve_base(args):
+    if not args.base:
+        raise ValueError('Falta --base')
     base_path = os.path.abspath(args.base)
-    # Comentario tecnico: valida que la base exista antes de continuar.
     if not os.path.isfile(base_path):
         raise FileNotFoundError('No existe la base: ' + base_path)
+    return base_path
+
+
+# Comentario tecnico: modo auxiliar para listar hojas de un XLSX con su dimension y encabezado.
+def _list_sheets(base_path):
+    # Comentario tecnico: evita listar hojas si la base no es XLSX.
+    if os.path.splitext(base_path)[1].lower() != '.xlsx':
+        raise ValueError('El archivo base no es XLSX.')
+    try:
+        return _xlsx_sheet_info(base_path)
+    except Exception:
+        pass
+    # Comentario tecnico: si el zip no se puede leer directamente, recurre a openpyxl en modo solo lectura.
+    openpyxl = _load_openpyxl()
+    wb = openpyxl.load_workbook(base_path, read_only=True)
+    try:
+        # Comentario tecnico: sin lectura directa el encabezado queda desconocido (None) y la interfaz no lo valida.
+        return [{'name': name, 'dimension': '', 'header': None} for name in wb.sheetnames]
+    finally:
+        wb.close()
+
+
+# Comentario tecnico: ejecuta el proceso completo y retorna el resumen escrito en disco.
+# reportes es el resultado de _parse_reportes (o de _reportes_a_corridas con --max-memory) cuando ya se parsearon
+# (modo de varias bases).
+def _procesar(args, cronometro=None, progreso=None, reportes=None):
+    # Comentario tecnico: el cronometro registra duracion y memoria de cada fase (tambien lo usan los benchmarks).
+    profile = _profile_enabled(args)
+    if cronometro is None:
+        cronometro = _Cronometro(trazar_memoria=profile)
+    # Comentario tecnico: sin seguimiento explicito se arma segun --progress/--cancel-file (o ninguno).
+    if progreso is None:
+        progreso = _progreso_desde_args(args)
+    # Comentario tecnico: con varias --base el reporte se parsea una vez y cada base se procesa en otro proceso.
+    if len(getattr(args, 'bases', None) or ()) > 1:
+        return _procesar_destinos(args, cronometro, progreso)
+    cronometro.progreso = progreso
+    try:
+        if not profile:
+            return _procesar_fases(args, cronometro, None, progreso, reportes)
+        # Comentario tecnico: con --profile toda la corrida se mide con cProfile y tracemalloc.
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        try:
+            profiler.enable()
+            try:
+                return _procesar_fases(args, cronometro, profiler, progreso, reportes)
+            finally:
+                profiler.disable()
+        finally:
+            tracemalloc.stop()
+    except _Cancelado as exc:
+        exc.resumen = _cerrar_cancelado(args, cronometro, progreso, exc)
+        raise
+    finally:
+        cronometro.progreso = None
+
+
+# Comentario tecnico: ruta del resumen (por defecto <salida>.resumen).
+def _resumen_path(args):
+    return os.path.abspath(args.resumen) if args.resumen else os.path.abspath(args.salida) + '.resumen'
+
+
+# Comentario tecnico: resumen de una corrida cancelada: ok=false, fase del corte y filas recorridas por fase.
+def _cerrar_cancelado(args, cronometro, progreso, exc):
+    cronometro.progreso = None
+    resumen_data = {'ok': 'false', 'cancelado': 'true', 'cancelado_fase': exc.fase or '', 'mensaje': str(exc)}
+    for fase, filas in progreso.filas.items():
+        resumen_data['filas_' + fase] = str(filas)
+    return _cerrar_proceso(cronometro, None, resumen_data, progreso.filas, _resumen_path(args), None)
+
+
+# Comentario tecnico: reportes ya parseados que recibe cada proceso del modo de varias bases (por el inicializador
+# del pool, una vez por proceso y no por base).
+_DESTINO_REPORTES = None
+
+
+def _iniciar_destino(reportes):
+    global _DESTINO_REPORTES
+    _DESTINO_REPORTES = reportes
+    # Comentario tecnico: Ctrl+C llega a todo el grupo de procesos; la cancelacion la decide el proceso principal.
+    try:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    except (OSError, ValueError):
+        pass
+
+
+# Comentario tecnico: procesa una base con los reportes del inicializador; una base cancelada retorna su resumen.
+def _procesar_destino(args):
+    try:
+        return _procesar(args, progreso=_progreso_desde_args(args), reportes=_DESTINO_REPORTES)
+    except _Cancelado as exc:
+        return exc.resumen
 
-    # Comentario tecnico: modo auxiliar para listar hojas de un XLSX.
-    if args.list_sheets:
-        # Comentario tecnico: extrae extension para validar tipo de archivo.
-        ext = os.path.splitext(base_path)[1].lower()
-        # Comentario tecnico: evita listar hojas si la base no es XLSX.
-        if ext != '.xlsx':
-            raise ValueError('El archivo base no es XLSX.')
-        # Comentario tecnico: carga openpyxl para lectura en modo solo lectura.
-        openpyxl = _load_openpyxl()
-        # Comentario tecnico: abre el workbook sin modificarlo.
-        wb = openpyxl.load_workbook(base_path, read_only=True)
-        # Comentario tecnico: imprime cada nombre de hoja disponible.
-        for name in wb.sheetnames:
-            print(name)
-        # Comentario tecnico: retorna codigo de salida exitoso sin continuar el flujo.
-        return 0
+
+# Comentario tecnico: argumentos de cada base: salida y reporte detallado en una subcarpeta con el nombre de la base
+# junto a --salida/--reporte-out; el .resumen de cada base queda junto a su preview.
+def _destinos_args(args, bases, cancel_file):
+    destinos = []
+    etiquetas = set()
+    for base_path in bases:
+        etiqueta = base = os.path.splitext(os.path.basename(base_path))[0]
+        numero = 1
+        while etiqueta.lower() in etiquetas:
+            numero += 1
+            etiqueta = '%s-%d' % (base, numero)
+        etiquetas.add(etiqueta.lower())
+        destino = argparse.Namespace(**vars(args))
+        destino.base = base_path
+        destino.bases = [base_path]
+        salida_path = os.path.abspath(args.salida)
+        destino.salida = os.path.join(os.path.dirname(salida_path), etiqueta, os.path.basename(salida_path))
+        # Comentario tecnico: la carpeta existe desde el inicio para el .resumen de una base cancelada o con error.
+        os.makedirs(os.path.dirname(destino.salida), exist_ok=True)
+        destino.resumen = None
+        if args.reporte_out:
+            reporte_out_path = os.path.abspath(args.reporte_out)
+            destino.reporte_out = os.path.join(os.path.dirname(reporte_out_path), etiqueta,
+                                               os.path.basename(reporte_out_path))
+        destino.progress = False
+        destino.cancel_file = cancel_file
+        destinos.append((etiqueta, destino))
+    return destinos
+
+
+# Comentario tecnico: modo de varias bases. Los reportes se parsean una vez y cada base se procesa en un proceso del
+# pool (hasta un proceso por nucleo) con su propia preview, .resumen y reporte detallado; el .resumen de --resumen (o
+# <salida>.resumen) agrega los contadores de todas. Una cancelacion se reenvia a las bases por un archivo centinela:
+# las que ya empezaron a escribir terminan y el resto no se modifica.
+def _procesar_destinos(args, cronometro, progreso):
+    progreso = progreso or _Progreso()
+    bases = []
+    for base_path in args.bases:
+        base_path = os.path.abspath(base_path)
+        if not os.path.isfile(base_path):
+            raise FileNotFoundError('No existe la base: ' + base_path)
+        if any(os.path.normcase(base_path) == os.path.normcase(previa) for previa in bases):
+            raise ValueError('La base figura mas de una vez en --base: ' + base_path)
+        bases.append(base_path)
+    if not args.reporte:
+        raise ValueError('Falta --reporte')
+    if not args.salida:
+        raise ValueError('Falta --salida')
+    resumen_path = _resumen_path(args)
+    reporte_paths = _resolve_reportes(args.reporte)
+
+    resultados = {}
+    cancelado = False
+    with tempfile.TemporaryDirectory(prefix='ivasins-destinos-') as carpeta:
+        cronometro.progreso = progreso
+        try:
+            cronometro.fase('parseo_reportes')
+            # Comentario tecnico: con --max-memory los reportes quedan en corridas dentro de la carpeta temporal y
+            # cada proceso las combina con su base sin volver a leerlos ni cargarlos enteros en memoria.
+            limite = _max_memory(args)
+            if limite:
+                reportes = _reportes_a_corridas(_externo_corridas(carpeta, limite), reporte_paths, progreso)
+            else:
+                reportes = _parse_reportes(reporte_paths, args.workers, progreso)
+            cronometro.fase('destinos')
+        except _Cancelado as exc:
+            exc.resumen = _cerrar_cancelado(args, cronometro, progreso, exc)
+            raise
+        finally:
+            cronometro.progreso = None
+
+        cancel_file = os.path.join(carpeta, 'cancelar')
+        destinos = _destinos_args(args, bases, cancel_file)
+        procesos = min(len(destinos), os.cpu_count() or 1)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_destino,
+                                                    initargs=(reportes,)) as executor:
+            futures = {executor.submit(_procesar_destino, destino): numero
+                       for numero, (_, destino) in enumerate(destinos)}
+            pendientes = set(futures)
+            while pendientes:
+                listos, pendientes = concurrent.futures.wait(pendientes, timeout=_PROGRESO_INTERVALO)
+                for future in listos:
+                    numero = futures[future]
+                    try:
+                        resultados[numero] = future.result()
+                    except Exception as exc:
+                        resultados[numero] = {'ok': 'false', 'mensaje': str(exc)}
+                        _write_properties(_resumen_path(destinos[numero][1]), resultados[numero])
+                if cancelado:
+                    continue
+                try:
+                    progreso.paso(len(resultados), len(resultados) / len(destinos))
+                except _Cancelado:
+                    cancelado = True
+                    with open(cancel_file, 'w'):
+                        pass
+
+        # Comentario tecnico: contadores del reporte (iguales para todas las bases).
+        if isinstance(reportes, _ReportesEnCorridas):
+            per_report, report_unicos, cancelados_solos = reportes.contadores()
+        else:
+            report_map, cancelled_asins, per_report = reportes
+            report_unicos = len(report_map)
+            cancelados_solos = sum(1 for asin in cancelled_asins if asin not in report_map)
+
+    cronometro.fase('resumen')
+    resumen_data = OrderedDict([('ok', 'true'), ('destinos', str(len(destinos)))])
+    estados = {'OK': 0, 'YA_APLICADO': 0, 'CANCELADO': 0, 'ERROR': 0}
+    totales = OrderedDict((clave, 0) for clave in ('agregados', 'modificados', 'sin_cambios', 'base_original',
+                                                   'base_final'))
+    for numero, (etiqueta, destino) in enumerate(destinos):
+        resultado = resultados[numero]
+        if resultado.get('cancelado') == 'true':
+            estado = 'CANCELADO'
+        elif resultado.get('ok') != 'true':
+            estado = 'ERROR'
+        elif resultado.get('ya_aplicado') == 'true':
+            estado = 'YA_APLICADO'
+        else:
+            estado = 'OK'
+        estados[estado] += 1
+        prefix = 'destino_%d_' % (numero + 1)
+        resumen_data[prefix + 'base'] = destino.base
+        resumen_data[prefix + 'estado'] = estado
+        resumen_data[prefix + 'resumen'] = _resumen_path(destino)
+        if estado in ('OK', 'YA_APLICADO'):
+            for clave in totales:
+                valor = int(resultado.get(clave, 0))
+                totales[clave] += valor
+                resumen_data[prefix + clave] = str(valor)
+        else:
+            resumen_data[prefix + 'mensaje'] = resultado.get('mensaje', '')
+        if estado == 'OK':
+            print('DESTINO %s OK agregados=%s modificados=%s' % (etiqueta, resultado['agregados'],
+                                                                 resultado['modificados']), flush=True)
+        else:
+            print('DESTINO %s %s %s' % (etiqueta, estado, resultado.get('mensaje', '')), flush=True)
+    for estado, cantidad in estados.items():
+        resumen_data['destinos_' + estado.lower()] = str(cantidad)
+    resumen_data.update((clave, str(valor)) for clave, valor in totales.items())
+    reporte_data = _resumen_datos(per_report, cancelados_solos, report_unicos, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+    for clave, valor in reporte_data.items():
+        if clave in ('total_reporte', 'duplicados_filas', 'cancelados_filas', 'cancelados_asins', 'sin_asin_filas',
+                     'asin_unicos_reporte', 'reportes') or clave.startswith('reporte_'):
+            resumen_data[clave] = valor
+    if estados['ERROR']:
+        resumen_data['ok'] = 'false'
+        resumen_data['mensaje'] = 'Fallaron %d de %d bases; ver destino_<n>_mensaje en %s.' % (
+            estados['ERROR'], len(destinos), resumen_path)
+    if cancelado or estados['CANCELADO']:
+        resumen_data['ok'] = 'false'
+        resumen_data['cancelado'] = 'true'
+        resumen_data.setdefault('mensaje', 'Proceso cancelado; %d de %d bases no se modificaron.' % (
+            estados['CANCELADO'], len(destinos)))
+    resumen_data = _cerrar_proceso(cronometro, None, resumen_data, {
+        'parseo_reportes': int(resumen_data['total_reporte']),
+        'destinos': len(destinos),
+    }, resumen_path, None)
+    if resumen_data.get('cancelado') == 'true':
+        exc = _Cancelado('destinos')
+        exc.args = (resumen_data['mensaje'],)
+        exc.resumen = resumen_data
+        raise exc
+    return resumen_data
+
+
+# Comentario tecnico: cuerpo del proceso, dividido en fases medidas por el cronometro.
+def _procesar_fases(args, cronometro, profiler=None, progreso=None, reportes=None):
+    # Comentario tecnico: resuelve ruta absoluta de la base y valida que exista.
+    base_path = _resolve_base(args)
 
     # Comentario tecnico: valida presencia de argumentos requeridos en modo normal.
     if not args.reporte:
@@ -1089,225 +4567,700 @@ def main():
         raise ValueError('Falta --salida')
 
     # Comentario tecnico: resuelve rutas absolutas de entrada y salida.
-    reporte_path = os.path.abspath(args.reporte)
     salida_path = os.path.abspath(args.salida)
     # Comentario tecnico: define ruta de resumen y reporte detallado con defaults.
-    resumen_path = os.path.abspath(args.resumen) if args.resumen else salida_path + '.resumen'
+    resumen_path = _resumen_path(args)
     reporte_out_path = os.path.abspath(args.reporte_out) if args.reporte_out else None
 
-    # Comentario tecnico: valida existencia del reporte antes de procesarlo.
-    if not os.path.isfile(reporte_path):
-        raise FileNotFoundError('No existe el reporte: ' + reporte_path)
+    # Comentario tecnico: valida existencia de los reportes y los ordena cronologicamente.
+    reporte_paths = _resolve_reportes(args.reporte)
 
     # Comentario tecnico: determina el tipo de base por la extension.
-    ext = os.path.splitext(base_path)[1].lower()
-    base_type = 'XLSX' if ext == '.xlsx' else 'CSV'
-
-    # Comentario tecnico: carga la base y obtiene metadata segun tipo.
-    if base_type == 'CSV':
-        (base_map, header_fields, header_map, base_delim, trailing_delim,
-         base_original_rows, base_duplicates, header_line) = _load_base_csv(base_path)
-        # Comentario tecnico: placeholders para el flujo cuando no hay XLSX.
-        wb = None
-        ws = None
-        sheet_name = None
-    else:
-        wb, ws, sheet_name, base_map, header_fields, header_map, base_original_rows, base_duplicates = _load_base_xlsx(
-            base_path, args.sheet)
-        # Comentario tecnico: delimitador fijo solo para preview cuando base es XLSX.
-        base_delim = ';'
-        # Comentario tecnico: no se usa delimitador trailing en XLSX.
-        trailing_delim = False
+    base_type = _base_type(base_path)
 
-    # Comentario tecnico: mapa del reporte con ASIN unicos y su IVA inferido.
-    report_map = OrderedDict()
-    # Comentario tecnico: contadores y sets para el resumen final.
-    duplicate_rows = 0
-    total_rows = 0
-    cancelled_rows = 0
-    cancelled_asins = set()
-    no_asin_rows = 0
+    # Comentario tecnico: con presupuesto de memoria la base CSV se procesa con corridas en disco.
+    limite = _max_memory(args)
+    preview_limit = _preview_limit(args)
+    reporte_opciones = _report_opciones(args)
+    if limite and base_type == 'XLSX':
+        sys.stderr.write('WARN: --max-memory solo aplica a bases CSV; la hoja XLSX (limitada a 1.048.576 filas) '
+                         'se procesa en memoria.\n')
+        limite = None
+    elif limite and base_type == 'SQLITE':
+        sys.stderr.write('WARN: --max-memory no aplica a bases SQLite; la base no se carga en memoria.\n')
+        limite = None
 
-    # Comentario tecnico: procesa cada fila del reporte y consolida por ASIN.
-    for row in _load_reporte_rows(reporte_path):
-        # Comentario tecnico: incrementa contador de filas totales del reporte.
-        total_rows += 1
-        # Comentario tecnico: obtiene el estado de la orden para filtrar cancelaciones.
-        status = row['order-status']
-        # Comentario tecnico: omite pedidos cancelados y acumula ASIN cancelados.
-        if _is_cancelled(status):
-            # Comentario tecnico: incrementa contador de filas canceladas.
-            cancelled_rows += 1
-            # Comentario tecnico: normaliza ASIN de filas canceladas si existe.
-            asin_cancel = row['asin'].strip().upper()
-            # Comentario tecnico: agrega el ASIN cancelado solo si no esta vacio.
-            if asin_cancel:
-                cancelled_asins.add(asin_cancel)
-            continue
+    # Comentario tecnico: si los reportes ya se aplicaron a la base en su estado actual, la corrida se omite.
+    ledger = None
+    if _ledger_enabled():
+        cronometro.fase('ledger')
+        ledger = _LedgerReportes(base_path, reporte_paths)
+        entrada = None if args.force else ledger.aplicado()
+        if entrada is not None:
+            resumen_data = _resumen_ya_aplicado(entrada, base_path, reporte_paths, salida_path, reporte_out_path)
+            return _cerrar_proceso(cronometro, profiler, resumen_data, {}, resumen_path, reporte_out_path or base_path)
+        ledger.iniciar()
 
-        # Comentario tecnico: valida ASIN presente en la fila.
-        asin = row['asin']
-        # Comentario tecnico: contabiliza filas sin ASIN util.
-        if not asin:
-            no_asin_rows += 1
-            continue
-        # Comentario tecnico: normaliza ASIN a mayusculas para clave canonica.
-        asin_norm = asin.upper()
+    # Comentario tecnico: ante una cancelacion o un error, el hilo que hashea los reportes deja de leerlos.
+    try:
+        # Comentario tecnico: los reportes en corridas (varias bases con --max-memory) van directo a la fusion
+        # externa; una base XLSX o SQLite los necesita como mapa en memoria.
+        if isinstance(reportes, _ReportesEnCorridas) and not limite:
+            reportes = reportes.en_memoria()
+        if base_type == 'SQLITE':
+            resumen_data, filas_por_fase = _procesar_sqlite(cronometro, base_path, salida_path, reporte_paths,
+                                                            reporte_out_path, args.workers, progreso, preview_limit,
+                                                            reporte_opciones, reportes)
+            if ledger is not None:
+                cronometro.fase('ledger')
+                ledger.registrar(resumen_data, salida_path)
+            return _cerrar_proceso(cronometro, profiler, resumen_data, filas_por_fase, resumen_path,
+                                   reporte_out_path or base_path)
 
-        # Comentario tecnico: determina IVA segun el monto de item-tax.
-        iva_value = 'SI' if _has_tax(row['item-tax']) else 'NO'
-
-        # Comentario tecnico: consolida duplicados en el reporte priorizando SI.
-        if asin_norm in report_map:
-            # Comentario tecnico: cuenta filas duplicadas en el reporte.
-            duplicate_rows += 1
-            # Comentario tecnico: si aparece IVA positivo, eleva el valor consolidado.
-            if report_map[asin_norm] == 'NO' and iva_value == 'SI':
-                report_map[asin_norm] = 'SI'
-            continue
+        if limite:
+            resumen_data, filas_por_fase = _procesar_externo(cronometro, limite, base_path, salida_path, reporte_paths,
+                                                             reporte_out_path, progreso, preview_limit,
+                                                             reporte_opciones, reportes)
+            if ledger is not None:
+                cronometro.fase('ledger')
+                ledger.registrar(resumen_data, salida_path)
+            return _cerrar_proceso(cronometro, profiler, resumen_data, filas_por_fase, resumen_path,
+                                   reporte_out_path or base_path)
+
+        # Comentario tecnico: los reportes se parsean en otros procesos mientras se carga la base.
+        parseo = _ParseoReportes(reporte_paths, args.workers, reportes, os.path.getsize(base_path))
+        parseo.iniciar()
+        try:
+            cronometro.fase('carga_base')
+            # Comentario tecnico: con cache habilitada, una base sin cambios no se vuelve a parsear.
+            use_cache = _base_cache_enabled(args)
+            use_patch = base_type == 'CSV' and _csv_patch_enabled(args)
+            cached = _load_base_cache(base_path, base_type, args.sheet) if use_cache else None
+            wb = None
+            ws = None
+            header_line = None
+            max_col = None
+            sheet_name = None
 
-        # Comentario tecnico: registra el ASIN con su IVA inferido.
-        report_map[asin_norm] = iva_value
-
-    # Comentario tecnico: listas de cambios para el reporte detallado.
-    added = []
-    modified = []
-    # Comentario tecnico: contador de ASIN sin cambios de IVA.
-    unchanged = 0
-    # Comentario tecnico: indice del primer agregado para preview.
-    first_new_index = None
-
-    # Comentario tecnico: aplica el reporte sobre la base en memoria.
-    for asin_norm, iva_value in report_map.items():
-        if asin_norm in base_map:
-            # Comentario tecnico: lee el IVA actual de la base para comparar.
-            old_iva = base_map[asin_norm]['IVA']
-            # Comentario tecnico: actualiza solo si hay diferencia de IVA.
-            if old_iva != iva_value:
-                base_map[asin_norm]['IVA'] = iva_value
-                modified.append((asin_norm, old_iva, iva_value))
+            # Comentario tecnico: carga la base y obtiene metadata segun tipo.
+            if cached is not None:
+                base_map = cached['base_map']
+                base_duplicates = cached['base_duplicates']
+                header_fields = cached['header_fields']
+                header_map = cached['header_map']
+                base_delim = cached['delimiter']
+                trailing_delim = cached['trailing_delim']
+                base_original_rows = cached['total_rows']
+                header_line = cached.get('header_line')
+                sheet_name = cached.get('sheet_name')
+                max_col = cached.get('max_col')
+            elif base_type == 'CSV':
+                (base_map, header_fields, header_map, base_delim, trailing_delim,
+                 base_original_rows, base_duplicates, header_line) = _load_base_csv(base_path, progreso=progreso)
             else:
-                unchanged += 1
+                try:
+                    # Comentario tecnico: lectura en streaming de la hoja proyectando solo ASIN/IVA.
+                    (sheet_name, base_map, header_fields, header_map, base_original_rows, base_duplicates,
+                     max_col) = _load_base_xlsx_stream(base_path, args.sheet, progreso)
+                except ValueError:
+                    raise
+                except Exception:
+                    # Comentario tecnico: si el XML no se puede leer en streaming, usa el modelo completo de openpyxl.
+                    (wb, ws, sheet_name, base_map, header_fields, header_map, base_original_rows,
+                     base_duplicates) = _load_base_xlsx(base_path, args.sheet)
+                    max_col = ws.max_column
+                # Comentario tecnico: delimitador fijo solo para preview cuando base es XLSX.
+                base_delim = ';'
+                # Comentario tecnico: no se usa delimitador trailing en XLSX.
+                trailing_delim = False
+
+            cronometro.fase('parseo_reportes')
+            # Comentario tecnico: consolida todos los reportes en un unico mapa antes de tocar la base (con solape, solo
+            # espera lo que falte del parseo lanzado antes de la carga).
+            report_map, cancelled_asins, per_report = parseo.resultado(progreso)
+        finally:
+            parseo.cerrar()
+
+        cronometro.fase('fusion')
+        # Comentario tecnico: listas de cambios para el reporte detallado.
+        added = []
+        modified = []
+        # Comentario tecnico: contador de ASIN sin cambios de IVA.
+        unchanged = 0
+        # Comentario tecnico: indice del primer agregado para preview.
+        first_new_index = None
+
+        # Comentario tecnico: aplica el reporte sobre la base en memoria.
+        for asin_norm, iva_value in _con_progreso(progreso, report_map.items(), len(report_map)):
+            # Comentario tecnico: asigna el IVA del reporte y obtiene el actual para comparar (None si el ASIN es
+            # nuevo); con el mismo IVA la asignacion no cambia nada.
+            old_iva = base_map.reemplazar(asin_norm, iva_value)
+            if old_iva is not None:
+                if old_iva != iva_value:
+                    modified.append((asin_norm, old_iva, iva_value))
+                else:
+                    unchanged += 1
+            else:
+                # Comentario tecnico: define el primer indice de agregado (el ASIN nuevo ya quedo al final).
+                if first_new_index is None:
+                    first_new_index = len(base_map) - 1
+                added.append((asin_norm, iva_value))
+
+        # Comentario tecnico: si no hubo agregados, el indice inicial es cero.
+        if first_new_index is None:
+            first_new_index = 0
+
+        cronometro.fase('escritura_base')
+        # Comentario tecnico: persiste la base con el formato correspondiente.
+        if base_type == 'CSV':
+            patched = None
+            if use_patch and not base_duplicates:
+                # Comentario tecnico: con indice valido se parchean IVAs y se agregan filas sin reescribir la base.
+                csv_index = _read_csv_index(base_path)
+                if csv_index is not None:
+                    base_count = len(base_map) - len(added)
+                    patched = _patch_csv_base(base_path, csv_index, header_line, base_map, base_count, modified, added,
+                                              header_fields, header_map, base_delim, trailing_delim)
+                    if patched is not None:
+                        _append_csv_index(base_path, patched[0], patched[1], base_count)
+            if patched is None:
+                # Comentario tecnico: reescritura completa (duplicados a consolidar, cambio de ancho o sin indice).
+                data_start, offsets = _write_csv_base(base_path, header_line,
+                                                      _con_progreso(progreso, base_map.items(), len(base_map)),
+                                                      header_fields, header_map, base_delim, trailing_delim)
+                if use_patch:
+                    _write_csv_index(base_path, data_start, offsets)
+                else:
+                    _remove_csv_index(base_path)
+            # Comentario tecnico: la cache refleja la base recien escrita (ya consolidada, sin duplicados).
+            if use_cache:
+                _write_base_cache(base_path, {
+                    'base_type': base_type,
+                    'header_fields': header_fields,
+                    'header_map': header_map,
+                    'delimiter': base_delim,
+                    'trailing_delim': trailing_delim,
+                    'header_line': header_line,
+                    'total_rows': len(base_map),
+                }, base_map, {})
         else:
-            # Comentario tecnico: define el primer indice de agregado.
-            if first_new_index is None:
-                first_new_index = len(base_map)
-            # Comentario tecnico: agrega nuevo ASIN a la base consolidada.
-            base_map[asin_norm] = {'ASIN': asin_norm, 'IVA': iva_value}
-            added.append((asin_norm, iva_value))
-
-    # Comentario tecnico: si no hubo agregados, el indice inicial es cero.
-    if first_new_index is None:
-        first_new_index = 0
-
-    # Comentario tecnico: persiste la base con el formato correspondiente.
-    if base_type == 'CSV':
-        os.makedirs(os.path.dirname(base_path), exist_ok=True)
-        with open(base_path, 'w', encoding='utf-8', newline='') as f:
-            f.write(header_line + '\r\n')
-            # Comentario tecnico: reescribe la base en el orden consolidado.
-            for record in base_map.values():
-                row_out = [''] * len(header_fields)
-                row_out[header_map['asin']] = record['ASIN']
-                row_out[header_map['iva']] = record['IVA']
-                # Comentario tecnico: serializa la fila con el delimitador detectado.
-                line = base_delim.join(row_out)
-                # Comentario tecnico: conserva delimitador trailing si corresponde.
-                if trailing_delim and (not row_out or row_out[-1] != ''):
-                    line += base_delim
-                f.write(line + '\r\n')
-    else:
-        asin_col = header_map['asin'] + 1
-        iva_col = header_map['iva'] + 1
-        max_col = ws.max_column
-        excel_written = _write_xlsx_with_excel(
-            base_path,
-            sheet_name,
-            asin_col,
-            iva_col,
-            max_col,
-            base_map.values(),
-        )
-        if not excel_written:
-            # Comentario tecnico: limpia celdas antiguas y reescribe solo ASIN/IVA.
-            max_row = ws.max_row
-            # Comentario tecnico: borra celdas de datos preservando encabezados.
-            for row_idx in range(2, max_row + 1):
-                for col in range(1, max_col + 1):
-                    ws.cell(row=row_idx, column=col, value=None)
-            # Comentario tecnico: reinicia el indice de fila para escritura.
-            row_idx = 2
-            # Comentario tecnico: escribe registros consolidados en la hoja.
-            for record in base_map.values():
-                ws.cell(row=row_idx, column=asin_col, value=record['ASIN'])
-                ws.cell(row=row_idx, column=iva_col, value=record['IVA'])
-                row_idx += 1
-            try:
-                wb.active = wb.sheetnames.index(sheet_name)
-            except Exception:
-                pass
-            wb.calculation.fullCalcOnLoad = True
-            # Comentario tecnico: guarda en temporal y reemplaza para invalidar cache de Excel.
-            temp_path = base_path + '.tmp'
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            wb.save(temp_path)
-            # Comentario tecnico: limpieza conservadora de caches y conexiones.
-            _sanitize_xlsx_file(temp_path)
-            os.replace(temp_path, base_path)
-            _excel_resave(base_path)
-        expected_rows = len(base_map) + 1
-        actual_rows = _verify_xlsx_with_excel(base_path, sheet_name, asin_col, expected_rows)
-        if actual_rows is not None and actual_rows != expected_rows:
-            sys.stderr.write(
-                "WARN: Excel muestra %d filas en la columna ASIN, esperado %d. "
-                "Revisa consultas/macros. Log: %s\n"
-                % (actual_rows, expected_rows, (_LAST_EXCEL_VERIFY_LOG or 'n/a'))
+            asin_col = header_map['asin'] + 1
+            iva_col = header_map['iva'] + 1
+            cronometro.fase('excel')
+            excel_written = _write_xlsx_with_excel(
+                base_path,
+                sheet_name,
+                asin_col,
+                iva_col,
+                max_col,
+                _con_progreso(progreso, base_map.items(), len(base_map)),
+            )
+            cronometro.fase('escritura_base')
+            stream_written = False
+            # Comentario tecnico: huella de las filas que escribe el streaming, para la verificacion.
+            huella = hashlib.blake2b(digest_size=16)
+            if not excel_written:
+                temp_path = base_path + '.tmp'
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                # Comentario tecnico: sin Excel, reescribe solo la parte XML de la hoja dentro del zip.
+                stream_written = _write_xlsx_stream(
+                    base_path,
+                    temp_path,
+                    sheet_name,
+                    asin_col,
+                    iva_col,
+                    max_col,
+                    _con_progreso(progreso, base_map.items(), len(base_map)),
+                    len(base_map),
+                    huella,
+                )
+                if stream_written:
+                    _sanitize_xlsx_file(temp_path)
+                    os.replace(temp_path, base_path)
+            if not excel_written and not stream_written:
+                # Comentario tecnico: carga el modelo completo solo cuando se necesita escribir con openpyxl.
+                if wb is None:
+                    wb, ws = _open_xlsx_sheet(base_path, sheet_name)
+                # Comentario tecnico: limpia celdas antiguas y reescribe solo ASIN/IVA.
+                max_row = ws.max_row
+                # Comentario tecnico: borra celdas de datos preservando encabezados.
+                for row_idx in range(2, max_row + 1):
+                    for col in range(1, max_col + 1):
+                        ws.cell(row=row_idx, column=col, value=None)
+                # Comentario tecnico: reinicia el indice de fila para escritura.
+                row_idx = 2
+                # Comentario tecnico: escribe registros consolidados en la hoja.
+                for asin, iva in base_map.items():
+                    ws.cell(row=row_idx, column=asin_col, value=asin)
+                    ws.cell(row=row_idx, column=iva_col, value=iva)
+                    row_idx += 1
+                try:
+                    wb.active = wb.sheetnames.index(sheet_name)
+                except Exception:
+                    pass
+                wb.calculation.fullCalcOnLoad = True
+                # Comentario tecnico: guarda en temporal y reemplaza para invalidar cache de Excel.
+                temp_path = base_path + '.tmp'
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                wb.save(temp_path)
+                # Comentario tecnico: limpieza conservadora de caches y conexiones.
+                _sanitize_xlsx_file(temp_path)
+                os.replace(temp_path, base_path)
+                cronometro.fase('excel')
+                _excel_resave(base_path)
+            cronometro.fase('verificacion')
+            # Comentario tecnico: verifica la hoja escrita leyendo el XML del zip (sin Excel).
+            verificacion = _verify_xlsx_native(
+                base_path,
+                sheet_name,
+                asin_col,
+                iva_col,
+                base_map.items,
+                huella.digest() if stream_written else None,
             )
+            expected_rows = len(base_map) + 1
+            if verificacion is not None:
+                if verificacion['diferencias']:
+                    sys.stderr.write(
+                        "WARN: la hoja escrita tiene %d diferencias contra la base (primera en fila %d); "
+                        "ultima fila con ASIN %d, esperado %d.\n"
+                        % (verificacion['diferencias'], verificacion['primer_error'], verificacion['filas'],
+                           expected_rows)
+                    )
+            else:
+                # Comentario tecnico: si la lectura nativa no es posible, recurre a la verificacion con Excel.
+                actual_rows = _verify_xlsx_with_excel(base_path, sheet_name, asin_col, expected_rows)
+                if actual_rows is not None and actual_rows != expected_rows:
+                    sys.stderr.write(
+                        "WARN: Excel muestra %d filas en la columna ASIN, esperado %d. "
+                        "Revisa consultas/macros. Log: %s\n"
+                        % (actual_rows, expected_rows, (_LAST_EXCEL_VERIFY_LOG or 'n/a'))
+                    )
+            cronometro.fase('escritura_base')
+            if use_cache:
+                # Comentario tecnico: solo la escritura directa deja una hoja predecible; otras vias invalidan la cache.
+                if stream_written and (verificacion is None or not verificacion['diferencias']):
+                    with zipfile.ZipFile(base_path, 'r') as zf:
+                        header_values, header_last = _xlsx_header_row(zf, _xlsx_sheet_part(zf, sheet_name))
+                    data_col = max(asin_col if base_map else 0,
+                                   iva_col if any(iva for _, iva in base_map.items()) else 0)
+                    cache_max_col = max(header_last, data_col)
+                    _write_base_cache(base_path, {
+                        'base_type': base_type,
+                        'sheet_name': sheet_name,
+                        'header_fields': [header_values.get(col) for col in range(1, cache_max_col + 1)],
+                        'header_map': header_map,
+                        'delimiter': base_delim,
+                        'trailing_delim': trailing_delim,
+                        'total_rows': len(base_map),
+                        'max_col': cache_max_col,
+                    }, base_map, {})
+                else:
+                    _remove_base_cache(base_path)
+
+        cronometro.fase('preview')
+        # Comentario tecnico: genera previsualizacion desde el primer agregado, hasta el tope de filas si hay uno.
+        preview_total = len(base_map) - first_new_index
+        preview_hasta = None if preview_limit is None else first_new_index + preview_limit
+        preview_filas = _write_preview_csv(
+            salida_path, header_fields, header_map, base_delim, trailing_delim,
+            _con_progreso(progreso, base_map.items(first_new_index, preview_hasta),
+                          preview_total if preview_limit is None else min(preview_total, preview_limit)))
+
+        cronometro.fase('resumen')
+        # Comentario tecnico: calcula ASIN cancelados que no entraron al mapa final (sin copiar las claves del reporte).
+        cancelled_only = {asin for asin in cancelled_asins if asin not in report_map}
+
+        # Comentario tecnico: arma el resumen final para integraciones aguas abajo.
+        resumen_data = _resumen_datos(per_report, len(cancelled_only), len(report_map), len(added), len(modified),
+                                      unchanged, len(base_duplicates), sum(base_duplicates.values()),
+                                      base_original_rows, len(base_map), first_new_index, preview_filas, preview_total)
+        # Comentario tecnico: resultado de la verificacion de la hoja escrita (solo XLSX).
+        if base_type == 'XLSX':
+            if verificacion is None:
+                resumen_data['verificacion'] = 'NO_DISPONIBLE'
+            else:
+                resumen_data['verificacion'] = 'DIFERENCIAS' if verificacion['diferencias'] else 'OK'
+                resumen_data['verificacion_filas'] = str(verificacion['filas'])
+                resumen_data['verificacion_esperado'] = str(len(base_map) + 1)
+                resumen_data['verificacion_diferencias'] = str(verificacion['diferencias'])
+                resumen_data['verificacion_primer_error'] = str(verificacion['primer_error'])
+        cronometro.fase('reporte_detalle')
+        # Comentario tecnico: genera reporte detallado solo si se especifico ruta.
+        if reporte_out_path:
+            datos_paths = _write_report(
+                reporte_out_path,
+                base_path,
+                base_type,
+                sheet_name,
+                reporte_paths,
+                resumen_data,
+                added,
+                modified,
+                sorted(cancelled_only),
+                base_duplicates.items(),
+                sorted(base_duplicates),
+                first_new_index,
+                per_report,
+                **reporte_opciones
+            )
+            resumen_data.update(('reporte_datos_' + seccion, path) for seccion, path in datos_paths.items())
 
-    # Comentario tecnico: genera previsualizacion desde el primer agregado.
-    _write_preview_csv(salida_path, header_fields, header_map, base_delim, trailing_delim, base_map, first_new_index)
+        if ledger is not None:
+            cronometro.fase('ledger')
+            ledger.registrar(resumen_data, salida_path)
 
-    # Comentario tecnico: calcula ASIN cancelados que no entraron al mapa final.
-    cancelled_only = cancelled_asins - set(report_map.keys())
+        return _cerrar_proceso(cronometro, profiler, resumen_data, {
+            'carga_base': base_original_rows,
+            'parseo_reportes': int(resumen_data['total_reporte']),
+            'escritura_base': len(base_map),
+        }, resumen_path, reporte_out_path or base_path)
+    except BaseException:
+        if ledger is not None:
+            ledger.detener()
+        raise
 
-    # Comentario tecnico: arma el resumen final para integraciones aguas abajo.
+
+# Comentario tecnico: arma el resumen del proceso; los totales de filas se suman desde los contadores por reporte.
+def _resumen_datos(per_report, cancelados_asins, asin_unicos, agregados, modificados, sin_cambios, consolidados_base,
+                   eliminados_base, base_original, base_final, preview_inicio, preview_filas, preview_total):
     resumen_data = {
         'ok': 'true',
-        'total_reporte': str(total_rows),
-        'duplicados_filas': str(duplicate_rows),
-        'cancelados_filas': str(cancelled_rows),
-        'cancelados_asins': str(len(cancelled_only)),
-        'sin_asin_filas': str(no_asin_rows),
-        'asin_unicos_reporte': str(len(report_map)),
-        'agregados': str(len(added)),
-        'modificados': str(len(modified)),
-        'sin_cambios': str(unchanged),
-        'consolidados_base': str(len(set(base_duplicates))),
-        'eliminados_base': str(len(base_duplicates)),
-        'base_original': str(base_original_rows),
-        'base_final': str(len(base_map)),
-        'preview_inicio': str(first_new_index),
+        'total_reporte': str(sum(stats['total'] for stats in per_report)),
+        'duplicados_filas': str(sum(stats['duplicados'] for stats in per_report)),
+        'cancelados_filas': str(sum(stats['cancelados'] for stats in per_report)),
+        'cancelados_asins': str(cancelados_asins),
+        'sin_asin_filas': str(sum(stats['sin_asin'] for stats in per_report)),
+        'asin_unicos_reporte': str(asin_unicos),
+        'agregados': str(agregados),
+        'modificados': str(modificados),
+        'sin_cambios': str(sin_cambios),
+        'consolidados_base': str(consolidados_base),
+        'eliminados_base': str(eliminados_base),
+        'base_original': str(base_original),
+        'base_final': str(base_final),
+        'preview_inicio': str(preview_inicio),
+        'preview_filas': str(preview_filas),
+        'preview_total': str(preview_total),
     }
-    # Comentario tecnico: persiste el resumen en disco.
+    # Comentario tecnico: contadores por reporte en orden de aplicacion.
+    resumen_data['reportes'] = str(len(per_report))
+    for number, stats in enumerate(per_report, 1):
+        prefix = 'reporte_%d_' % number
+        resumen_data[prefix + 'archivo'] = stats['archivo']
+        for key in ('total', 'cancelados', 'sin_asin', 'duplicados', 'asin_nuevos'):
+            resumen_data[prefix + key] = str(stats[key])
+    return resumen_data
+
+
+# Comentario tecnico: cierra el cronometro, escribe el perfil (con --profile) y persiste el resumen con sus metricas.
+def _cerrar_proceso(cronometro, profiler, resumen_data, filas_por_fase, resumen_path, perfil_junto_a):
+    cronometro.terminar()
+    if profiler is not None:
+        profiler.disable()
+        perfil_path = os.path.join(os.path.dirname(perfil_junto_a), 'Reporte_Iva_Profile.txt')
+        _write_profile(perfil_path, cronometro, profiler)
+        resumen_data['perfil'] = perfil_path
+    # Comentario tecnico: agrega tiempos, memoria y filas por segundo de cada fase.
+    resumen_data.update(_metricas_resumen(cronometro, filas_por_fase))
+    # Comentario tecnico: persiste el resumen en disco (al final, para incluir todas las fases).
     _write_properties(resumen_path, resumen_data)
+    return resumen_data
+
+
+# Comentario tecnico: convierte un pedido JSON en argumentos CLI equivalentes.
+def _serve_argv(request):
+    argv = []
+    for key, value in request.items():
+        if key in ('id', 'cmd') or value is None or value is False:
+            continue
+        option = '--' + str(key).replace('_', '-')
+        if value is True:
+            argv.append(option)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                argv.extend([option, str(item)])
+        else:
+            argv.extend([option, str(value)])
+    return argv
+
+
+# Comentario tecnico: atiende un pedido del modo --serve y arma la respuesta.
+def _serve_request(parser, request, emitir=None):
+    cmd = str(request.get('cmd') or 'process').strip().lower()
+    if cmd == 'ping':
+        return {'ok': True}
+    argv = _serve_argv(request)
+    if cmd == 'list-sheets':
+        argv.append('--list-sheets')
+    elif cmd != 'process':
+        raise ValueError('Comando desconocido: ' + cmd)
+    args = parser.parse_args(argv)
+    if args.list_sheets:
+        info = _list_sheets(_resolve_base(args))
+        return {'ok': True, 'sheets': [sheet['name'] for sheet in info], 'info': info}
+    try:
+        return {'ok': True, 'resumen': _procesar(args, progreso=_progreso_desde_args(args, emitir))}
+    except _Cancelado as exc:
+        return {'ok': False, 'cancelado': True, 'error': str(exc), 'resumen': exc.resumen}
+
+
+# Comentario tecnico: proceso persistente; un pedido JSON por linea en stdin y una respuesta por linea en stdout.
+def _serve(parser):
+    # Comentario tecnico: el protocolo usa UTF-8 en ambos sentidos sin depender de la consola.
+    reader = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', errors='replace')
+    out = sys.stdout.buffer
+    real_stdout = sys.stdout
+    for line in reader:
+        line = line.strip()
+        if not line:
+            continue
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('Pedido invalido: se esperaba un objeto JSON.')
+            request_id = request.get('id')
+            if str(request.get('cmd') or '').strip().lower() in ('exit', 'shutdown'):
+                response = {'ok': True}
+                stop = True
+            else:
+                stop = False
+
+                # Comentario tecnico: el progreso viaja como lineas {"progreso": {...}, "id": n} antes de la respuesta.
+                def emitir(datos, request_id=request_id):
+                    out.write(json.dumps({'progreso': datos, 'id': request_id}).encode('utf-8') + b'\n')
+                    out.flush()
+
+                # Comentario tecnico: cualquier print accidental va a stderr para no romper el protocolo.
+                sys.stdout = sys.stderr
+                try:
+                    response = _serve_request(parser, request, emitir)
+                finally:
+                    sys.stdout = real_stdout
+        except SystemExit as exc:
+            # Comentario tecnico: argparse termina con SystemExit ante argumentos invalidos.
+            response = {'ok': False, 'error': 'Argumentos invalidos (codigo %s)' % (exc.code,)}
+            stop = False
+        except Exception as exc:
+            response = {'ok': False, 'error': str(exc)}
+            stop = False
+        response['id'] = request_id
+        out.write(json.dumps(response).encode('utf-8') + b'\n')
+        out.flush()
+        if stop:
+            break
+    return 0
+
+
+# Comentario tecnico: subcarpetas de la bandeja del modo --watch y pausa entre revisiones.
+_WATCH_PROCESANDO = 'procesando'
+_WATCH_PROCESADOS = 'procesados'
+_WATCH_FALLIDOS = 'fallidos'
+_WATCH_INTERVALO = 0.5
+# Comentario tecnico: con llegadas continuas, un lote sale igual cuando su primer reporte espero estas ventanas.
+_WATCH_MAX_VENTANAS = 6
+
+
+# Comentario tecnico: segundos sin cambios en la bandeja antes de armar un lote (--watch-window o IVASINS_WATCH_WINDOW).
+def _watch_window(args):
+    value = getattr(args, 'watch_window', None)
+    if value is None:
+        value = os.getenv('IVASINS_WATCH_WINDOW', '').strip() or '5'
+    try:
+        ventana = float(value)
+    except ValueError:
+        raise ValueError('Valor invalido para --watch-window: ' + str(value))
+    if ventana < 0:
+        raise ValueError('Valor invalido para --watch-window: ' + str(value))
+    return ventana
 
-    # Comentario tecnico: genera reporte detallado solo si se especifico ruta.
-    if reporte_out_path:
-        _write_report(
-            reporte_out_path,
-            base_path,
-            base_type,
-            sheet_name,
-            reporte_path,
-            resumen_data,
-            added,
-            modified,
-            cancelled_only,
-            base_duplicates,
-            first_new_index,
-        )
 
+# Comentario tecnico: mueve un archivo o carpeta a un destino libre (agrega -2, -3... si el nombre ya existe).
+def _watch_mover(path, carpeta):
+    nombre, ext = os.path.splitext(os.path.basename(path))
+    destino = os.path.join(carpeta, nombre + ext)
+    numero = 1
+    while os.path.exists(destino):
+        numero += 1
+        destino = os.path.join(carpeta, '%s-%d%s' % (nombre, numero, ext))
+    os.replace(path, destino)
+    return destino
+
+
+# Comentario tecnico: procesa un lote de reportes de la bandeja en una sola corrida (una carga y una escritura de la
+# base). El lote vive en procesando/<lote> y al terminar pasa completo a procesados/ o fallidos/.
+def _watch_lote(args, bandeja, paths):
+    lote = datetime.now().strftime('%Y%m%d-%H%M%S')
+    lote_dir = os.path.join(bandeja, _WATCH_PROCESANDO, lote)
+    numero = 1
+    while os.path.exists(lote_dir):
+        numero += 1
+        lote_dir = os.path.join(bandeja, _WATCH_PROCESANDO, '%s-%d' % (lote, numero))
+    os.makedirs(lote_dir)
+    movidos = []
+    for path in paths:
+        try:
+            movidos.append(_watch_mover(path, lote_dir))
+        except OSError:
+            # Comentario tecnico: un archivo que otro proceso mantiene abierto queda para el siguiente lote.
+            pass
+    if not movidos:
+        os.rmdir(lote_dir)
+        return
+    lote_args = argparse.Namespace(**vars(args))
+    lote_args.reporte = movidos
+    lote_args.salida = os.path.join(lote_dir, 'preview.csv')
+    lote_args.resumen = None
+    lote_args.reporte_out = os.path.join(lote_dir, 'Reporte_Iva_Process.txt')
+    # Comentario tecnico: la cache mantiene la base parseada entre lotes (en memoria y en <base>.ivacache).
+    lote_args.cache = True
+    progreso = _progreso_desde_args(lote_args) or _Progreso()
+    previos = _instalar_senales(progreso)
+    try:
+        resumen = _procesar(lote_args, progreso=progreso)
+    except _Cancelado:
+        # Comentario tecnico: la base no se modifico; los reportes vuelven a la bandeja para la proxima ejecucion.
+        for path in movidos:
+            _watch_mover(path, bandeja)
+        shutil.rmtree(lote_dir, ignore_errors=True)
+        raise
+    except Exception as exc:
+        _write_properties(_resumen_path(lote_args), {'ok': 'false', 'mensaje': str(exc)})
+        destino = _watch_mover(lote_dir, os.path.join(bandeja, _WATCH_FALLIDOS))
+        print('LOTE %s ERROR %s' % (os.path.basename(destino), exc), flush=True)
+        return
+    finally:
+        _restaurar_senales(previos)
+    destino = _watch_mover(lote_dir, os.path.join(bandeja, _WATCH_PROCESADOS))
+    if resumen.get('ya_aplicado') == 'true':
+        print('LOTE %s OK %s' % (os.path.basename(destino), resumen['mensaje']), flush=True)
+    else:
+        print('LOTE %s OK reportes=%d agregados=%s modificados=%s' % (
+            os.path.basename(destino), len(movidos), resumen['agregados'], resumen['modificados']), flush=True)
+
+
+# Comentario tecnico: modo --watch: revisa la bandeja cada medio segundo y arma un lote con los reportes que llevan
+# una ventana sin cambiar de tamano ni fecha (los que aun se copian esperan). El proceso sigue hasta Ctrl+C/SIGTERM.
+def _watch(args):
+    bandeja = os.path.abspath(args.watch)
+    if not os.path.isdir(bandeja):
+        raise FileNotFoundError('No existe la carpeta a vigilar: ' + bandeja)
+    ventana = _watch_window(args)
+    for carpeta in (_WATCH_PROCESANDO, _WATCH_PROCESADOS, _WATCH_FALLIDOS):
+        os.makedirs(os.path.join(bandeja, carpeta), exist_ok=True)
+    # Comentario tecnico: lotes que quedaron a medias (proceso interrumpido) devuelven sus reportes a la bandeja; el
+    # registro de reportes aplicados evita aplicarlos dos veces si la base ya se habia escrito.
+    procesando = os.path.join(bandeja, _WATCH_PROCESANDO)
+    for nombre in sorted(os.listdir(procesando)):
+        lote_dir = os.path.join(procesando, nombre)
+        if os.path.isdir(lote_dir):
+            for archivo in sorted(os.listdir(lote_dir)):
+                if _is_reporte_name(archivo):
+                    _watch_mover(os.path.join(lote_dir, archivo), bandeja)
+            shutil.rmtree(lote_dir, ignore_errors=True)
+    _BASE_CALIENTE.activa = True
+    print('VIGILANDO %s' % bandeja, flush=True)
+    # Comentario tecnico: por archivo pendiente: huella (tamano, mtime), ultimo cambio y primera vez que se vio.
+    pendientes = {}
+    espera = _Progreso()
+    previos = _instalar_senales(espera)
+    try:
+        while not espera.cancelado:
+            ahora = time.monotonic()
+            vistos = set()
+            for nombre in os.listdir(bandeja):
+                path = os.path.join(bandeja, nombre)
+                if not _is_reporte_name(nombre) or not os.path.isfile(path):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                vistos.add(path)
+                huella = (stat.st_size, stat.st_mtime_ns)
+                previo = pendientes.get(path)
+                if previo is None:
+                    pendientes[path] = (huella, ahora, ahora)
+                elif previo[0] != huella:
+                    pendientes[path] = (huella, ahora, previo[2])
+            for path in set(pendientes) - vistos:
+                del pendientes[path]
+            # Comentario tecnico: sale un lote cuando la bandeja lleva una ventana quieta, o con llegadas continuas
+            # cuando el primero espero demasiado (solo con los reportes ya estables).
+            listos = [path for path, (_, cambio, _) in pendientes.items() if ahora - cambio >= ventana]
+            if listos and (len(listos) == len(pendientes) or ahora - min(
+                    primero for _, _, primero in pendientes.values()) >= ventana * _WATCH_MAX_VENTANAS):
+                _restaurar_senales(previos)
+                try:
+                    _watch_lote(args, bandeja, listos)
+                except _Cancelado as exc:
+                    sys.stderr.write(str(exc) + '\n')
+                    return 3
+                finally:
+                    previos = _instalar_senales(espera)
+                for path in listos:
+                    pendientes.pop(path, None)
+                continue
+            time.sleep(_WATCH_INTERVALO)
+    finally:
+        _restaurar_senales(previos)
+        _BASE_CALIENTE.activa = False
+    return 0
+
+
+# Comentario tecnico: orquesta la ejecucion del motor desde la CLI.
+def main(argv=None):
+    parser = _build_parser()
+    # Comentario tecnico: parsea argumentos CLI a un namespace.
+    args = parser.parse_args(argv)
+
+    # Comentario tecnico: modo servidor para integraciones que reutilizan el proceso.
+    if args.serve:
+        return _serve(parser)
+
+    # Comentario tecnico: la base es obligatoria fuera del modo servidor.
+    if not args.base:
+        parser.error('the following arguments are required: --base')
+
+    if len(args.bases) > 1 and (args.watch or args.export or args.list_sheets):
+        parser.error('--watch, --export y --list-sheets admiten una sola --base')
+
+    # Comentario tecnico: modo bandeja; procesa lotes hasta que se interrumpa el proceso.
+    if args.watch:
+        return _watch(args)
+
+    # Comentario tecnico: exportacion de la base a otro formato, sin procesar reportes.
+    if args.export:
+        print('EXPORTADO %d filas' % _exportar_base(args))
+        return 0
+
+    if args.list_sheets:
+        # Comentario tecnico: imprime cada nombre de hoja disponible.
+        for sheet in _list_sheets(_resolve_base(args)):
+            print(sheet['name'])
+        # Comentario tecnico: retorna codigo de salida exitoso sin continuar el flujo.
+        return 0
+
+    # Comentario tecnico: las senales de interrupcion piden una cancelacion cooperativa (antes de escribir la base).
+    progreso = _progreso_desde_args(args) or _Progreso()
+    previos = _instalar_senales(progreso)
+    try:
+        resumen = _procesar(args, progreso=progreso)
+    except _Cancelado as exc:
+        sys.stderr.write(str(exc) + '\n')
+        print('CANCELADO')
+        return 3
+    finally:
+        _restaurar_senales(previos)
+    if resumen.get('ya_aplicado') == 'true':
+        print(resumen['mensaje'])
+    # Comentario tecnico: con varias bases, una que fallo deja el resumen agregado en ok=false.
+    if resumen.get('ok') == 'false':
+        sys.stderr.write('ERROR: ' + resumen['mensaje'] + '\n')
+        return 1
     # Comentario tecnico: imprime estado OK para integracion CLI.
     print('OK')
     # Comentario tecnico: retorna codigo de salida exitoso.
@@ -1315,6 +5268,8 @@ def main():
 
 
 if __name__ == '__main__':
+    # Comentario tecnico: requerido por el pool de procesos en el ejecutable congelado de Windows.
+    multiprocessing.freeze_support()
     # Comentario tecnico: bloque de entrada cuando se ejecuta como script standalone.
     try:
         # Comentario tecnico: ejecuta main y propaga su codigo de salida al sistema.
@@ -0,0 +1,9 @@
+"""
+Benchmarks del motor FormatearIva.
+Genera bases y reportes sinteticos reproducibles (semilla fija), mide cada fase de
+_procesar y guarda resultados JSON comparables entre commits.
+
+Uso (desde motores/FormatearIva):
+    python -m benchmarks --filas 10000 100000 --salida resultados.json
+    python -m benchmarks --comparar resultados.json --umbral 0.10
+"""
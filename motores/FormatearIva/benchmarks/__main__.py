@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+# Comentario tecnico: punto de entrada de `python -m benchmarks`.
+import sys
+
+from .ejecutar import main
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Ejecuta los benchmarks del motor: genera datos (cacheados por parametros), procesa cada
+caso varias veces, guarda la mediana por fase en JSON y compara contra un resultado previo.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+from . import generadores
+
+# Comentario tecnico: el motor vive en la carpeta padre (motores/FormatearIva).
+_MOTOR_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _MOTOR_DIR not in sys.path:
+    sys.path.insert(0, _MOTOR_DIR)
+import FormatearIva  # noqa: E402
+
+# Comentario tecnico: version del formato JSON de resultados.
+FORMATO = 1
+# Comentario tecnico: fases de _procesar en orden; 'total' es la suma medida por caso.
+FASES = ['ledger', 'carga_base', 'parseo_reportes', 'fusion', 'escritura_base', 'excel', 'verificacion', 'preview', 'resumen',
+         'reporte_detalle']
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks de FormatearIva')
+    parser.add_argument('--filas', type=int, nargs='+', default=[10000, 100000, 1000000, 5000000],
+                        help='Filas de base y reporte por caso (por defecto 10k, 100k, 1M y 5M)')
+    parser.add_argument('--tipos', nargs='+', choices=['csv', 'xlsx'], default=['csv', 'xlsx'],
+                        help='Tipos de base a medir (XLSX se omite por encima del limite de filas de Excel)')
+    parser.add_argument('--duplicados', type=float, default=0.2, help='Proporcion de filas duplicadas en el reporte')
+    parser.add_argument('--duplicados-base', type=float, default=0.01, help='Proporcion de filas duplicadas en la base')
+    parser.add_argument('--cancelados', type=float, default=0.1, help='Proporcion de filas canceladas en el reporte')
+    parser.add_argument('--solape', type=float, default=0.5,
+                        help='Proporcion de ASIN del reporte que ya existen en la base')
+    parser.add_argument('--columnas-extra', type=int, default=0, help='Columnas adicionales en base y reporte')
+    parser.add_argument('--encoding', default='utf-8', help='Codificacion de los archivos generados')
+    parser.add_argument('--semilla', type=int, default=1, help='Semilla de los generadores')
+    parser.add_argument('--repeticiones', type=int, default=3, help='Ejecuciones por caso (se reporta la mediana)')
+    parser.add_argument('--datos', help='Carpeta donde se generan y reutilizan los datos sinteticos')
+    parser.add_argument('--salida', help='Archivo JSON de resultados')
+    parser.add_argument('--comparar', help='Resultado JSON previo contra el cual detectar regresiones')
+    parser.add_argument('--umbral', type=float, default=0.10,
+                        help='Regresion tolerada por fase como proporcion (0.10 = 10%% mas lento)')
+    parser.add_argument('--umbral-fase', action='append', default=[], metavar='FASE=PROPORCION',
+                        help='Umbral especifico de una fase (se puede repetir)')
+    parser.add_argument('--minimo', type=float, default=0.05,
+                        help='Diferencia minima en segundos para considerar una regresion (filtra ruido)')
+    return parser
+
+
+# Comentario tecnico: commit actual del repositorio si git esta disponible.
+def _commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=_MOTOR_DIR, capture_output=True,
+                             text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+# Comentario tecnico: genera un archivo solo si no existe; el nombre incluye un hash de los parametros.
+def _dato(carpeta, prefijo, extension, parametros, generar):
+    clave = hashlib.blake2b(json.dumps(parametros, sort_keys=True).encode('utf-8'), digest_size=6).hexdigest()
+    path = os.path.join(carpeta, '%s-%d-%s%s' % (prefijo, parametros['filas'], clave, extension))
+    if not os.path.exists(path):
+        temp_path = path + '.tmp'
+        generar(temp_path)
+        os.replace(temp_path, path)
+    return path
+
+
+# Comentario tecnico: prepara base y reporte de un caso; retorna rutas y parametros efectivos.
+def _preparar_caso(args, tipo, filas, carpeta):
+    parametros_base = {'filas': filas, 'semilla': args.semilla + 1, 'duplicados': args.duplicados_base,
+                       'columnas_extra': args.columnas_extra}
+    if tipo == 'csv':
+        parametros_base['encoding'] = args.encoding
+        base = _dato(carpeta, 'base', '.csv', parametros_base,
+                     lambda path: generadores.generar_base_csv(path, **parametros_base))
+    else:
+        base = _dato(carpeta, 'base', '.xlsx', parametros_base,
+                     lambda path: generadores.generar_base_xlsx(path, **parametros_base))
+    parametros_reporte = {'filas': filas, 'semilla': args.semilla, 'duplicados': args.duplicados,
+                          'cancelados': args.cancelados, 'columnas_extra': args.columnas_extra,
+                          'encoding': args.encoding, 'base_filas': filas, 'solape': args.solape}
+    reporte = _dato(carpeta, 'reporte', '.txt', parametros_reporte,
+                    lambda path: generadores.generar_reporte(path, **parametros_reporte))
+    return base, reporte, {'base': parametros_base, 'reporte': parametros_reporte}
+
+
+# Comentario tecnico: procesa una copia fresca de la base y retorna los segundos por fase y el pico de memoria.
+def _medir(base, reporte, trabajo):
+    copia = os.path.join(trabajo, os.path.basename(base))
+    shutil.copyfile(base, copia)
+    argv = ['--base', copia, '--reporte', reporte, '--salida', os.path.join(trabajo, 'preview.csv'),
+            '--reporte-out', os.path.join(trabajo, 'Reporte_Iva_Process.txt')]
+    args = FormatearIva._build_parser().parse_args(argv)
+    cronometro = FormatearIva._Cronometro()
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        FormatearIva._procesar(args, cronometro)
+    fases = dict(cronometro.fases)
+    fases['total'] = sum(fases.values())
+    memoria = max(cronometro.memoria.values()) if cronometro.memoria else None
+    return fases, memoria
+
+
+def ejecutar(args):
+    carpeta = args.datos or os.path.join(tempfile.gettempdir(), 'ivasins-benchmarks')
+    os.makedirs(carpeta, exist_ok=True)
+    resultado = {
+        'formato': FORMATO,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'casos': {},
+    }
+    for filas in args.filas:
+        for tipo in args.tipos:
+            caso = '%s-%d' % (tipo, filas)
+            if tipo == 'xlsx' and filas > generadores.XLSX_MAX_FILAS:
+                print('%-14s omitido (XLSX admite hasta %d filas)' % (caso, generadores.XLSX_MAX_FILAS))
+                continue
+            base, reporte, parametros = _preparar_caso(args, tipo, filas, carpeta)
+            muestras = []
+            memoria = None
+            for _ in range(max(1, args.repeticiones)):
+                with tempfile.TemporaryDirectory(prefix='ivasins-bench-') as trabajo:
+                    muestra, pico = _medir(base, reporte, trabajo)
+                muestras.append(muestra)
+                if pico is not None:
+                    memoria = max(memoria or 0, pico)
+            fases = {fase: statistics.median(muestra.get(fase, 0.0) for muestra in muestras)
+                     for fase in FASES + ['total']}
+            # Comentario tecnico: pico de memoria residente del proceso de benchmark durante las fases del caso.
+            resultado['casos'][caso] = {'tipo': tipo, 'filas': filas, 'parametros': parametros,
+                                        'repeticiones': len(muestras), 'fases': fases, 'muestras': muestras,
+                                        'memoria_pico_mb': round(memoria / 1048576.0, 1) if memoria else None}
+            print('%-14s total %8.3fs  ' % (caso, fases['total'])
+                  + '  '.join('%s %.3f' % (fase, fases[fase]) for fase in FASES), flush=True)
+    return resultado
+
+
+# Comentario tecnico: interpreta los --umbral-fase FASE=PROPORCION.
+def _umbrales(valores):
+    umbrales = {}
+    for valor in valores:
+        fase, sep, proporcion = valor.partition('=')
+        if not sep or fase not in FASES + ['total']:
+            raise ValueError('Umbral de fase invalido: ' + valor)
+        umbrales[fase] = float(proporcion)
+    return umbrales
+
+
+def comparar(actual, previo, umbral=0.10, umbrales_fase=None, minimo=0.05):
+    """Retorna las regresiones (caso, fase, antes, ahora, proporcion) de actual respecto de previo.
+
+    Solo se comparan casos con los mismos parametros; una fase regresa si es mas lenta que
+    antes * (1 + umbral) y ademas la diferencia supera `minimo` segundos.
+    """
+    umbrales_fase = umbrales_fase or {}
+    regresiones = []
+    for caso, datos in actual['casos'].items():
+        anterior = previo.get('casos', {}).get(caso)
+        if anterior is None or anterior.get('parametros') != datos['parametros']:
+            continue
+        for fase in FASES + ['total']:
+            antes = anterior['fases'].get(fase)
+            ahora = datos['fases'].get(fase)
+            if antes is None or ahora is None:
+                continue
+            limite = antes * (1.0 + umbrales_fase.get(fase, umbral))
+            if ahora > limite and ahora - antes > minimo:
+                regresiones.append((caso, fase, antes, ahora, ahora / antes if antes else float('inf')))
+    return regresiones
+
+
+def main(argv=None):
+    args = _build_parser().parse_args(argv)
+    try:
+        umbrales_fase = _umbrales(args.umbral_fase)
+    except ValueError as exc:
+        sys.stderr.write('ERROR: %s\n' % exc)
+        return 2
+    resultado = ejecutar(args)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if not args.comparar:
+        return 0
+    with open(args.comparar, 'r', encoding='utf-8') as f:
+        previo = json.load(f)
+    regresiones = comparar(resultado, previo, args.umbral, umbrales_fase, args.minimo)
+    print('Comparado contra %s (commit %s)' % (args.comparar, previo.get('commit') or 'n/a'))
+    for caso, fase, antes, ahora, proporcion in regresiones:
+        print('REGRESION %-14s %-16s %.3fs -> %.3fs (x%.2f)' % (caso, fase, antes, ahora, proporcion))
+    if regresiones:
+        return 1
+    print('Sin regresiones.')
+    return 0
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Generadores reproducibles de reportes Amazon y bases IVA (CSV/XLSX) para benchmarks.
+La misma semilla y los mismos parametros producen siempre los mismos bytes.
+"""
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+# Comentario tecnico: columnas del reporte "All Orders" de Amazon, en su orden real.
+REPORTE_COLUMNAS = [
+    'amazon-order-id', 'merchant-order-id', 'purchase-date', 'last-updated-date', 'order-status',
+    'fulfillment-channel', 'sales-channel', 'order-channel', 'url', 'ship-service-level', 'product-name', 'sku',
+    'asin', 'item-status', 'quantity', 'currency', 'item-price', 'item-tax', 'shipping-price', 'shipping-tax',
+    'gift-wrap-price', 'gift-wrap-tax', 'item-promotion-discount', 'ship-promotion-discount', 'ship-city',
+    'ship-state', 'ship-postal-code', 'ship-country', 'promotion-ids', 'is-business-order', 'purchase-order-number',
+    'price-designation', 'is-iba', 'signature-confirmation-recommended',
+]
+# Comentario tecnico: estados no cancelados y montos de item-tax (vacios, cero y positivos) que se repiten.
+ESTADOS = ['Shipped', 'Shipped', 'Shipped - Delivered to Buyer', 'Pending', 'Shipping']
+IMPUESTOS = ['0.00', '0.00', '16.00', '24.80', '', '3.52', '0.00', '41.44', '1,024.00']
+# Comentario tecnico: limite de filas de una hoja de Excel (incluye el encabezado).
+XLSX_MAX_FILAS = 1048575
+# Comentario tecnico: filas por escritura en disco.
+_LOTE = 4096
+
+
+# Comentario tecnico: ASIN sintetico deterministico (10 caracteres como los reales).
+def asin(numero):
+    return 'B0%08X' % numero
+
+
+# Comentario tecnico: paso coprimo con n para recorrer la base en un orden disperso sin repetir.
+def _paso_disperso(n):
+    paso = 7919
+    while n > 1 and _mcd(paso, n) != 1:
+        paso += 2
+    return paso
+
+
+def _mcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+
+# Comentario tecnico: valida una proporcion entre 0 y 1.
+def _proporcion(nombre, valor):
+    if not 0.0 <= valor <= 1.0:
+        raise ValueError('%s debe estar entre 0 y 1: %r' % (nombre, valor))
+    return valor
+
+
+def generar_reporte(path, filas, semilla=1, duplicados=0.2, cancelados=0.1, columnas_extra=0, encoding='utf-8',
+                    base_filas=0, solape=0.5, sin_asin=0.005):
+    """Escribe un reporte Amazon separado por tabs.
+
+    duplicados: proporcion de filas que repiten un ASIN ya visto en el reporte.
+    cancelados: proporcion de filas con order-status Cancelled.
+    solape: proporcion de ASIN nuevos del reporte que ya existen en una base de base_filas filas.
+    """
+    _proporcion('duplicados', duplicados)
+    _proporcion('cancelados', cancelados)
+    _proporcion('solape', solape)
+    _proporcion('sin_asin', sin_asin)
+    rnd = random.Random(semilla)
+    paso = _paso_disperso(base_filas)
+    usados = []
+    en_base = 0
+    nuevos = 0
+    encabezado = REPORTE_COLUMNAS + ['extra-%d' % (k + 1) for k in range(columnas_extra)]
+    extras = ['Dato adicional número %d' % (k + 1) for k in range(columnas_extra)]
+    with open(path, 'w', encoding=encoding, newline='') as f:
+        f.write('\t'.join(encabezado) + '\r\n')
+        lote = []
+        for i in range(filas):
+            r = rnd.random()
+            if r < sin_asin:
+                valor_asin = ''
+            elif usados and r < sin_asin + duplicados:
+                valor_asin = usados[rnd.randrange(len(usados))]
+            else:
+                if en_base < base_filas and rnd.random() < solape:
+                    valor_asin = asin((en_base * paso) % base_filas)
+                    en_base += 1
+                else:
+                    valor_asin = asin(base_filas + nuevos)
+                    nuevos += 1
+                usados.append(valor_asin)
+            estado = 'Cancelled' if rnd.random() < cancelados else ESTADOS[i % len(ESTADOS)]
+            impuesto = IMPUESTOS[rnd.randrange(len(IMPUESTOS))]
+            dia = 1 + i % 28
+            fila = [
+                '701-%07d-%07d' % (i % 10000000, (i * 7) % 10000000), '',
+                '2026-10-%02dT10:%02d:00+00:00' % (dia, i % 60), '2026-10-%02dT12:00:00+00:00' % dia, estado,
+                'Amazon', 'Amazon.com.mx', '', '', 'Expedited', 'Artículo de prueba número %d' % (i % 9000),
+                'SKU-%06d' % (i % 90000), valor_asin, 'Shipped', '1', 'MXN', '%d.00' % (100 + i % 900), impuesto,
+                '0.00', '0.00', '', '', '-0.00', '-0.00', 'CIUDAD DE MÉXICO', 'CDMX', '%05d' % (i % 99999), 'MX', '',
+                'false', '', '', 'false', 'false',
+            ]
+            lote.append('\t'.join(fila + extras) + '\r\n')
+            if len(lote) >= _LOTE:
+                f.write(''.join(lote))
+                lote = []
+        f.write(''.join(lote))
+
+
+# Comentario tecnico: produce (ASIN, IVA, extras) de la base; los duplicados repiten un ASIN anterior.
+def _filas_base(filas, semilla, duplicados, columnas_extra):
+    _proporcion('duplicados', duplicados)
+    rnd = random.Random(semilla)
+    unicos = 0
+    for i in range(filas):
+        if unicos and rnd.random() < duplicados:
+            valor_asin = asin(rnd.randrange(unicos))
+        else:
+            valor_asin = asin(unicos)
+            unicos += 1
+        r = rnd.random()
+        iva = 'SI' if r < 0.45 else ('NO' if r < 0.95 else '')
+        yield valor_asin, iva, ['Descripción %d-%d' % (k + 1, i % 5000) for k in range(columnas_extra)]
+
+
+def generar_base_csv(path, filas, semilla=2, duplicados=0.01, columnas_extra=0, encoding='utf-8', delimitador=','):
+    """Escribe una base CSV con columnas ASIN, IVA y columnas_extra adicionales."""
+    encabezado = ['ASIN', 'IVA'] + ['Columna %d' % (k + 1) for k in range(columnas_extra)]
+    with open(path, 'w', encoding=encoding, newline='') as f:
+        f.write(delimitador.join(encabezado) + '\r\n')
+        lote = []
+        for valor_asin, iva, extras in _filas_base(filas, semilla, duplicados, columnas_extra):
+            lote.append(delimitador.join([valor_asin, iva] + extras) + '\r\n')
+            if len(lote) >= _LOTE:
+                f.write(''.join(lote))
+                lote = []
+        f.write(''.join(lote))
+
+
+# Comentario tecnico: entrada zip con fecha fija para que el XLSX generado sea identico entre corridas.
+def _entrada(nombre):
+    info = zipfile.ZipInfo(nombre, date_time=(2026, 1, 1, 0, 0, 0))
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def _letra(columna):
+    letras = ''
+    while columna:
+        columna, resto = divmod(columna - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/sharedStrings.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" '
+    'Target="sharedStrings.xml"/>'
+    '<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/></Relationships>'
+)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+    '<borders count="1"><border/></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def generar_base_xlsx(path, filas, semilla=2, duplicados=0.01, columnas_extra=0,
+                      hoja="IVA's Base de Datos"):
+    """Escribe una base XLSX con strings compartidos (como Excel) en la hoja indicada."""
+    if filas > XLSX_MAX_FILAS:
+        raise ValueError('Una hoja XLSX admite como maximo %d filas de datos: %d' % (XLSX_MAX_FILAS, filas))
+    encabezado = ['ASIN', 'IVA'] + ['Columna %d' % (k + 1) for k in range(columnas_extra)]
+    letras = [_letra(c + 1) for c in range(len(encabezado))]
+    indices = {}
+    textos = []
+    total_refs = 0
+
+    def indice(texto):
+        try:
+            return indices[texto]
+        except KeyError:
+            indices[texto] = len(textos)
+            textos.append(texto)
+            return indices[texto]
+
+    ultima = '%s%d' % (letras[-1], filas + 1)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        zf.writestr(_entrada('[Content_Types].xml'), _CONTENT_TYPES)
+        zf.writestr(_entrada('_rels/.rels'), _RELS)
+        zf.writestr(_entrada('xl/workbook.xml'), (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets><sheet name="%s" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ) % escape(hoja, {'"': '&quot;', "'": '&apos;'}))
+        zf.writestr(_entrada('xl/_rels/workbook.xml.rels'), _WORKBOOK_RELS)
+        zf.writestr(_entrada('xl/styles.xml'), _STYLES)
+        with zf.open(_entrada('xl/worksheets/sheet1.xml'), 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<dimension ref="A1:%s"/><sheetData>' % ultima
+            ).encode('utf-8'))
+            lote = ['<row r="1">'] + ['<c r="%s1" t="s"><v>%d</v></c>' % (letras[c], indice(texto))
+                                      for c, texto in enumerate(encabezado)] + ['</row>']
+            total_refs += len(encabezado)
+            fila = 1
+            for valor_asin, iva, extras in _filas_base(filas, semilla, duplicados, columnas_extra):
+                fila += 1
+                lote.append('<row r="%d">' % fila)
+                for c, valor in enumerate([valor_asin, iva] + extras):
+                    # Comentario tecnico: las celdas vacias no se escriben, como hace Excel.
+                    if valor:
+                        lote.append('<c r="%s%d" t="s"><v>%d</v></c>' % (letras[c], fila, indice(valor)))
+                        total_refs += 1
+                lote.append('</row>')
+                if len(lote) >= _LOTE:
+                    sheet.write(''.join(lote).encode('utf-8'))
+                    lote = []
+            lote.append('</sheetData></worksheet>')
+            sheet.write(''.join(lote).encode('utf-8'))
+        with zf.open(_entrada('xl/sharedStrings.xml'), 'w', force_zip64=True) as sst:
+            sst.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" count="%d" uniqueCount="%d">'
+                % (total_refs, len(textos))
+            ).encode('utf-8'))
+            for inicio in range(0, len(textos), _LOTE):
+                sst.write(''.join('<si><t>%s</t></si>' % escape(texto)
+                                  for texto in textos[inicio:inicio + _LOTE]).encode('utf-8'))
+            sst.write(b'</sst>')
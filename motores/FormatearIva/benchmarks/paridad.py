@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de paridad del motor sobre datos sinteticos de generadores: los distintos caminos de
+proceso deben dejar la misma base, preview, contadores del .resumen y cuerpo del reporte.
+
+Uso (desde motores/FormatearIva):
+    python -m unittest benchmarks.paridad
+"""
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from . import generadores
+from .ejecutar import FormatearIva
+
+# Comentario tecnico: claves del .resumen que dependen de la corrida (tiempos, memoria, rutas) y no del resultado.
+_CLAVES_CORRIDA = ('fases', 't_', 'mem_', 'filas_seg_', 'reporte_datos_')
+# Comentario tecnico: lineas del reporte detallado con la fecha o la ruta de la base.
+_LINEAS_CORRIDA = ('Fecha/Hora:', 'Base:')
+
+
+# Comentario tecnico: columnas del reporte que se reescriben en las filas armadas a mano.
+_PRODUCTO = generadores.REPORTE_COLUMNAS.index('product-name')
+_ESTADO = generadores.REPORTE_COLUMNAS.index('order-status')
+_ASIN = generadores.REPORTE_COLUMNAS.index('asin')
+_IMPUESTO = generadores.REPORTE_COLUMNAS.index('item-tax')
+
+
+def _leer(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# Comentario tecnico: contadores del .resumen sin las claves propias de cada corrida.
+def _contadores(path):
+    contadores = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for linea in f:
+            clave, _, valor = linea.rstrip('\n').partition('=')
+            if not clave.startswith(_CLAVES_CORRIDA):
+                contadores[clave] = valor
+    return contadores
+
+
+# Comentario tecnico: cuerpo del reporte detallado sin fecha ni ruta de la base.
+def _cuerpo_reporte(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [linea for linea in f if not linea.startswith(_LINEAS_CORRIDA)]
+
+
+# Comentario tecnico: reescribe filas de un reporte generado: {linea: (ASIN, estado, item-tax[, product-name])}, con
+# la linea 1 como primera fila de datos y negativos contados desde el final.
+def _reescribir_reporte(path, cambios):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        lineas = f.read().split('\r\n')[:-1]
+    for numero, cambio in cambios.items():
+        campos = lineas[numero].split('\t')
+        campos[_ASIN], campos[_ESTADO], campos[_IMPUESTO] = cambio[:3]
+        if len(cambio) > 3:
+            campos[_PRODUCTO] = cambio[3]
+        lineas[numero] = '\t'.join(campos)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('\r\n'.join(lineas) + '\r\n')
+
+
+# Comentario tecnico: ejecuta el motor con argumentos de CLI; la salida por stdout (DESTINO ...) se descarta.
+def _procesar(argv):
+    args = FormatearIva._build_parser().parse_args(argv)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return FormatearIva._procesar(args)
+
+
+class ParidadTest(unittest.TestCase):
+    def setUp(self):
+        self.carpeta = tempfile.mkdtemp(prefix='ivasins-paridad-')
+        self.addCleanup(shutil.rmtree, self.carpeta, True)
+        self.datos = os.path.join(self.carpeta, 'datos')
+        os.makedirs(self.datos)
+        self.reportes = [os.path.join(self.datos, 'reporte-1.txt'), os.path.join(self.datos, 'reporte-2.txt')]
+        generadores.generar_reporte(self.reportes[0], 4000, semilla=1, base_filas=3000)
+        generadores.generar_reporte(self.reportes[1], 2500, semilla=5, base_filas=3000)
+        # Comentario tecnico: ASIN repetidos y cancelados al principio, al medio y al final del reporte, asi quedan en
+        # rangos distintos del parseo en paralelo; el SI de la ultima fila debe ganar en todos los caminos.
+        repetido = generadores.asin(900000)
+        cancelado = generadores.asin(900001)
+        en_base = generadores.asin(5)
+        _reescribir_reporte(self.reportes[0], {
+            1: (repetido, 'Shipped', '0.00'),
+            2: (cancelado, 'Cancelled', '16.00'),
+            3: (en_base, 'Shipped', '16.00'),
+            2000: (repetido, 'Cancelled', '0.00'),
+            2001: (cancelado, 'Cancelled', '0.00'),
+            -2: (en_base, 'Shipped', '0.00'),
+            -1: (repetido, 'Shipped', '24.80'),
+        })
+        # Comentario tecnico: una fila con un product-name entre comillas que ocupa dos lineas.
+        _reescribir_reporte(self.reportes[1], {
+            1250: (generadores.asin(900002), 'Shipped', '16.00', '"Artículo ""doble""\r\ncon salto"'),
+        })
+        self.bases = {'ES': (3000, 2), 'FR': (2000, 3)}
+        for nombre, (filas, semilla) in self.bases.items():
+            generadores.generar_base_csv(os.path.join(self.datos, nombre + '.csv'), filas, semilla=semilla,
+                                         duplicados=0.05)
+
+    # Comentario tecnico: copia las bases a una carpeta propia de la corrida (el motor las reescribe).
+    def _copiar_bases(self, corrida, nombres):
+        carpeta = os.path.join(self.carpeta, corrida)
+        os.makedirs(carpeta)
+        bases = []
+        for nombre in nombres:
+            bases.append(os.path.join(carpeta, nombre + '.csv'))
+            shutil.copyfile(os.path.join(self.datos, nombre + '.csv'), bases[-1])
+        return carpeta, bases
+
+    # Comentario tecnico: base, preview, contadores y cuerpo del reporte de una base ya procesada.
+    def _resultado(self, base_path, salida_path, reporte_out_path):
+        return {
+            'base': _leer(base_path),
+            'preview': _leer(salida_path),
+            'resumen': _contadores(salida_path + '.resumen'),
+            'reporte': _cuerpo_reporte(reporte_out_path),
+        }
+
+    # Comentario tecnico: procesa una copia de la base ES por un camino y retorna su resultado.
+    def _camino(self, nombre, opciones):
+        carpeta, (base_path,) = self._copiar_bases(nombre, ['ES'])
+        salida_path = os.path.join(carpeta, 'Preview.csv')
+        reporte_out_path = os.path.join(carpeta, 'Reporte.txt')
+        _procesar(['--base', base_path, '--reporte'] + self.reportes + [
+            '--salida', salida_path, '--reporte-out', reporte_out_path] + opciones)
+        return self._resultado(base_path, salida_path, reporte_out_path)
+
+    def test_caminos_misma_salida(self):
+        volcar = mock.patch.object(FormatearIva._Corridas, '_volcar', autospec=True,
+                                   side_effect=FormatearIva._Corridas._volcar)
+        unir = mock.patch.object(FormatearIva, '_merge_reporte_partial',
+                                 side_effect=FormatearIva._merge_reporte_partial)
+        with mock.patch.dict(os.environ, {'IVASINS_OVERLAP': '0'}):
+            memoria = self._camino('memoria', ['--workers', '1'])
+            # Comentario tecnico: con una capacidad minima chica las corridas se vuelcan a disco y se combinan.
+            with mock.patch.object(FormatearIva, '_EXTERNO_MIN_REGISTROS', 100), volcar as volcadas:
+                externo = self._camino('externo', ['--max-memory', '1M'])
+            with unir as unidos:
+                paralelo = self._camino('paralelo', ['--workers', '4'])
+        self.assertTrue(volcadas.called)
+        self.assertTrue(unidos.called)
+        # Comentario tecnico: el solape necesita dos nucleos y reportes y base por encima de los umbrales.
+        with mock.patch.dict(os.environ, {'IVASINS_OVERLAP': '1'}), \
+                mock.patch('os.cpu_count', return_value=4), \
+                mock.patch.object(FormatearIva, '_SOLAPE_MIN_BYTES', 0), \
+                mock.patch.object(FormatearIva, '_SOLAPE_MIN_BASE_BYTES', 0), unir as unidos:
+            solape = self._camino('solape', ['--workers', '4'])
+        self.assertTrue(unidos.called)
+
+        self.assertEqual(memoria['resumen']['ok'], 'true')
+        for nombre, resultado in (('externo', externo), ('paralelo', paralelo), ('solape', solape)):
+            with self.subTest(camino=nombre):
+                self.assertEqual(resultado, memoria)
+        # Comentario tecnico: las filas armadas a mano llegan a la base con el IVA esperado.
+        base = memoria['base'].decode('utf-8')
+        self.assertIn('\r\n%s,SI\r\n' % generadores.asin(900000), base)
+        self.assertIn('\r\n%s,SI\r\n' % generadores.asin(900002), base)
+        self.assertNotIn(generadores.asin(900001), base)
+
+    def test_varias_bases_max_memory_parsea_una_vez(self):
+        # Comentario tecnico: cada lectura de un reporte deja una linea; los procesos del pool heredan el parche.
+        lecturas = os.path.join(self.carpeta, 'lecturas')
+        consolidar = FormatearIva._consolidate_reporte_file
+
+        def contar(reporte_path, *args, **kwargs):
+            with open(lecturas, 'a', encoding='utf-8') as f:
+                f.write(reporte_path + '\n')
+            return consolidar(reporte_path, *args, **kwargs)
+
+        carpeta, bases = self._copiar_bases('varias', self.bases)
+        with mock.patch.object(FormatearIva, '_consolidate_reporte_file', contar):
+            _procesar(['--base'] + bases + ['--reporte'] + self.reportes + [
+                '--salida', os.path.join(carpeta, 'Preview.csv'),
+                '--reporte-out', os.path.join(carpeta, 'Reporte.txt'), '--max-memory', '1M'])
+        with open(lecturas, 'r', encoding='utf-8') as f:
+            self.assertEqual(sorted(f.read().split()), sorted(self.reportes))
+
+        # Comentario tecnico: cada base queda igual que procesada sola con --max-memory.
+        for nombre, base_path in zip(self.bases, bases):
+            sola, (sola_base,) = self._copiar_bases('sola-' + nombre, [nombre])
+            _procesar(['--base', sola_base, '--reporte'] + self.reportes + [
+                '--salida', os.path.join(sola, 'Preview.csv'), '--reporte-out', os.path.join(sola, 'Reporte.txt'),
+                '--max-memory', '1M'])
+            self.assertEqual(
+                self._resultado(base_path, os.path.join(carpeta, nombre, 'Preview.csv'),
+                                os.path.join(carpeta, nombre, 'Reporte.txt')),
+                self._resultado(sola_base, os.path.join(sola, 'Preview.csv'), os.path.join(sola, 'Reporte.txt')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,16 +1,21 @@
 package control;
 
 import java.io.BufferedReader;
+import java.io.BufferedWriter;
 import java.io.File;
 import java.io.FileNotFoundException;
 import java.io.IOException;
+import java.io.InputStream;
 import java.io.InputStreamReader;
+import java.io.OutputStreamWriter;
 import java.nio.charset.StandardCharsets;
 import java.nio.file.Files;
 import java.nio.file.Path;
 import java.nio.file.Paths;
 import java.util.ArrayList;
+import java.util.LinkedHashMap;
 import java.util.List;
+import java.util.Map;
 import java.util.Properties;
 import java.util.stream.Stream;
 
@@ -33,15 +38,149 @@ public class MotorIvaRunner {
         public int baseOriginal;
         public int baseFinal;
         public int previewInicio;
+        public String verificacion;
+        public int verificacionDiferencias;
+        public int verificacionPrimerError;
+        /** Duracion de cada fase del motor en ms, en el orden en que se ejecutaron. */
+        public Map<String, Long> tiemposMs = new LinkedHashMap<>();
+        /** Pico de memoria del proceso (MB) al terminar cada fase. */
+        public Map<String, Double> memoriaPicoMb = new LinkedHashMap<>();
+        /** Filas por segundo de las fases con volumen conocido (carga_base, parseo_reportes, escritura_base). */
+        public Map<String, Long> filasPorSegundo = new LinkedHashMap<>();
+        public long tiempoTotalMs;
+        public double memoriaMaximaMb;
+        /** Reporte de perfil (solo con --profile). */
+        public File perfil;
         public File preview;
         public File resumen;
         public File reporte;
         public String stdout;
+        /** true si el proceso se cancelo antes de escribir la base (la base queda sin cambios). */
+        public boolean cancelado;
+        /** Fase en la que se atendio la cancelacion. */
+        public String canceladoFase;
+        /** true si los reportes ya estaban aplicados a la base y el motor no hizo cambios (ver --force). */
+        public boolean yaAplicado;
+        /** Fecha de la corrida que aplico los reportes. */
+        public String yaAplicadoFecha;
     }
 
+    /**
+     * Avance informado por el motor (--progress): fase actual, filas recorridas y estimaciones.
+     */
+    public static class Progreso {
+        public String fase;
+        public long filas;
+        public long filasPorSegundo;
+        /** Porcentaje de la fase (0-100) o -1 si no se conoce el total. */
+        public double porcentaje = -1;
+        /** Segundos estimados para terminar la fase o -1 si no se conocen. */
+        public double etaSegundos = -1;
+        public double transcurridoSegundos;
+    }
+
+    public interface ProgresoListener {
+        void progreso(Progreso progreso);
+    }
+
+    private MotorServidor servidor;
+    private boolean servidorDeshabilitado;
+    private long siguienteId = 1;
+    private boolean hookRegistrado;
+    private volatile File cancelFile;
+
     public Resultado ejecutar(File baseFile, File reporteTxt, File previewCsv, File resumenFile, File reporteOutFile,
             String sheetName)
             throws IOException, InterruptedException {
+        return ejecutar(baseFile, reporteTxt, previewCsv, resumenFile, reporteOutFile, sheetName, null);
+    }
+
+    /**
+     * Igual que {@link #ejecutar(File, File, File, File, File, String)} informando el avance al listener (desde el
+     * hilo que ejecuta el motor). El proceso se puede cancelar con {@link #cancelar()} hasta que empieza a escribir
+     * la base.
+     */
+    public Resultado ejecutar(File baseFile, File reporteTxt, File previewCsv, File resumenFile, File reporteOutFile,
+            String sheetName, ProgresoListener listener)
+            throws IOException, InterruptedException {
+        return ejecutar(baseFile, reporteTxt, previewCsv, resumenFile, reporteOutFile, sheetName, listener, false);
+    }
+
+    /**
+     * Con {@code forzar} el motor procesa aunque los reportes ya figuren como aplicados a la base (--force).
+     */
+    public Resultado ejecutar(File baseFile, File reporteTxt, File previewCsv, File resumenFile, File reporteOutFile,
+            String sheetName, ProgresoListener listener, boolean forzar)
+            throws IOException, InterruptedException {
+        // El motor revisa este archivo centinela; se borra antes de cada corrida junto con un resumen previo.
+        File cancel = new File(resumenFile.getAbsolutePath() + ".cancel");
+        Files.deleteIfExists(cancel.toPath());
+        Files.deleteIfExists(resumenFile.toPath());
+        cancelFile = cancel;
+        try {
+            return ejecutarMotor(baseFile, reporteTxt, previewCsv, resumenFile, reporteOutFile, sheetName, listener,
+                    cancel, forzar);
+        } finally {
+            cancelFile = null;
+            Files.deleteIfExists(cancel.toPath());
+        }
+    }
+
+    /**
+     * Pide al motor que cancele el proceso en curso. Es cooperativo: el motor se detiene en el siguiente punto
+     * seguro y no cancela si ya esta escribiendo la base.
+     */
+    public void cancelar() throws IOException {
+        File cancel = cancelFile;
+        if (cancel != null && !cancel.exists()) {
+            Files.createFile(cancel.toPath());
+        }
+    }
+
+    private Resultado ejecutarMotor(File baseFile, File reporteTxt, File previewCsv, File resumenFile,
+            File reporteOutFile, String sheetName, ProgresoListener listener, File cancel, boolean forzar)
+            throws IOException, InterruptedException {
+        if (servidorHabilitado()) {
+            Map<String, Object> pedido = new LinkedHashMap<>();
+            pedido.put("cmd", "process");
+            pedido.put("base", baseFile.getAbsolutePath());
+            pedido.put("reporte", reporteTxt.getAbsolutePath());
+            pedido.put("salida", previewCsv.getAbsolutePath());
+            pedido.put("resumen", resumenFile.getAbsolutePath());
+            if (reporteOutFile != null) {
+                pedido.put("reporte_out", reporteOutFile.getAbsolutePath());
+            }
+            if (sheetName != null && !sheetName.trim().isEmpty()) {
+                pedido.put("sheet", sheetName.trim());
+            }
+            pedido.put("cancel_file", cancel.getAbsolutePath());
+            if (forzar) {
+                pedido.put("force", Boolean.TRUE);
+            }
+            if (listener != null) {
+                pedido.put("progress", Boolean.TRUE);
+            }
+            Map<String, Object> respuesta = enviarAlServidor(pedido, listener);
+            if (respuesta != null) {
+                Resultado resultado = new Resultado();
+                resultado.preview = previewCsv;
+                resultado.resumen = resumenFile;
+                resultado.reporte = reporteOutFile;
+                if (Boolean.TRUE.equals(respuesta.get("cancelado"))) {
+                    resultado.stdout = String.valueOf(respuesta.get("error"));
+                    return leerResumen(resultado, resumenFile);
+                }
+                if (!Boolean.TRUE.equals(respuesta.get("ok"))) {
+                    resultado.stdout = "ERROR: " + respuesta.get("error");
+                    resultado.ok = false;
+                    resultado.mensaje = resultado.stdout;
+                    return resultado;
+                }
+                resultado.stdout = "OK";
+                return leerResumen(resultado, resumenFile);
+            }
+        }
+
         Path motoresDir = findMotoresDir();
         if (motoresDir == null) {
             throw new FileNotFoundException("No se encontró la carpeta 'motores'. "
@@ -73,6 +212,14 @@ public class MotorIvaRunner {
             cmd.add("--sheet");
             cmd.add(sheetName.trim());
         }
+        cmd.add("--cancel-file");
+        cmd.add(cancel.getAbsolutePath());
+        if (forzar) {
+            cmd.add("--force");
+        }
+        if (listener != null) {
+            cmd.add("--progress");
+        }
 
         ProcessBuilder pb = new ProcessBuilder(cmd);
         pb.redirectErrorStream(true);
@@ -83,6 +230,11 @@ public class MotorIvaRunner {
                 new InputStreamReader(process.getInputStream(), StandardCharsets.UTF_8))) {
             String line;
             while ((line = reader.readLine()) != null) {
+                // Las lineas de avance no forman parte de la salida que se muestra al usuario.
+                if (listener != null && line.startsWith(PREFIJO_PROGRESO)) {
+                    notificar(listener, Json.leerSeguro(line.substring(PREFIJO_PROGRESO.length())));
+                    continue;
+                }
                 output.append(line).append(System.lineSeparator());
             }
         }
@@ -94,12 +246,42 @@ public class MotorIvaRunner {
         resultado.resumen = resumenFile;
         resultado.reporte = reporteOutFile;
 
+        if (exitCode == SALIDA_CANCELADO) {
+            return leerResumen(resultado, resumenFile);
+        }
         if (exitCode != 0) {
             resultado.ok = false;
             resultado.mensaje = resultado.stdout.isEmpty() ? "Error al ejecutar el motor." : resultado.stdout;
             return resultado;
         }
 
+        return leerResumen(resultado, resumenFile);
+    }
+
+    private static final String PREFIJO_PROGRESO = "PROGRESO ";
+    /** Codigo de salida del motor cuando el proceso se cancelo. */
+    private static final int SALIDA_CANCELADO = 3;
+
+    private void notificar(ProgresoListener listener, Object datos) {
+        if (listener == null || !(datos instanceof Map)) {
+            return;
+        }
+        Map<?, ?> mapa = (Map<?, ?>) datos;
+        Progreso progreso = new Progreso();
+        progreso.fase = mapa.get("fase") == null ? "" : String.valueOf(mapa.get("fase"));
+        progreso.filas = numero(mapa.get("filas"), 0).longValue();
+        progreso.filasPorSegundo = numero(mapa.get("filas_seg"), 0).longValue();
+        progreso.porcentaje = numero(mapa.get("pct"), -1).doubleValue();
+        progreso.etaSegundos = numero(mapa.get("eta_s"), -1).doubleValue();
+        progreso.transcurridoSegundos = numero(mapa.get("transcurrido_s"), 0).doubleValue();
+        listener.progreso(progreso);
+    }
+
+    private static Number numero(Object valor, Number defecto) {
+        return valor instanceof Number ? (Number) valor : defecto;
+    }
+
+    private Resultado leerResumen(Resultado resultado, File resumenFile) throws IOException {
         if (!resumenFile.exists()) {
             resultado.ok = false;
             resultado.mensaje = "No se generó el resumen del proceso.";
@@ -112,6 +294,10 @@ public class MotorIvaRunner {
         }
 
         resultado.ok = Boolean.parseBoolean(props.getProperty("ok", "true"));
+        resultado.cancelado = Boolean.parseBoolean(props.getProperty("cancelado", "false"));
+        resultado.canceladoFase = props.getProperty("cancelado_fase", "");
+        resultado.yaAplicado = Boolean.parseBoolean(props.getProperty("ya_aplicado", "false"));
+        resultado.yaAplicadoFecha = props.getProperty("ya_aplicado_fecha", "");
         resultado.totalReporte = parseInt(props.getProperty("total_reporte", "0"));
         resultado.duplicadosFilas = parseInt(props.getProperty("duplicados_filas", "0"));
         resultado.canceladosFilas = parseInt(props.getProperty("cancelados_filas", "0"));
@@ -126,7 +312,29 @@ public class MotorIvaRunner {
         resultado.baseOriginal = parseInt(props.getProperty("base_original", "0"));
         resultado.baseFinal = parseInt(props.getProperty("base_final", "0"));
         resultado.previewInicio = parseInt(props.getProperty("preview_inicio", "0"));
-        resultado.mensaje = "OK";
+        resultado.verificacion = props.getProperty("verificacion", "");
+        resultado.verificacionDiferencias = parseInt(props.getProperty("verificacion_diferencias", "0"));
+        resultado.verificacionPrimerError = parseInt(props.getProperty("verificacion_primer_error", "0"));
+        for (String fase : props.getProperty("fases", "").split(",")) {
+            fase = fase.trim();
+            if (fase.isEmpty()) {
+                continue;
+            }
+            resultado.tiemposMs.put(fase, parseLong(props.getProperty("t_" + fase + "_ms", "0")));
+            String memoria = props.getProperty("mem_pico_" + fase + "_mb");
+            if (memoria != null) {
+                resultado.memoriaPicoMb.put(fase, parseDouble(memoria));
+            }
+            String filas = props.getProperty("filas_seg_" + fase);
+            if (filas != null) {
+                resultado.filasPorSegundo.put(fase, parseLong(filas));
+            }
+        }
+        resultado.tiempoTotalMs = parseLong(props.getProperty("t_total_ms", "0"));
+        resultado.memoriaMaximaMb = parseDouble(props.getProperty("mem_pico_mb", "0"));
+        String perfil = props.getProperty("perfil");
+        resultado.perfil = perfil == null || perfil.isEmpty() ? null : new File(perfil);
+        resultado.mensaje = resultado.cancelado ? props.getProperty("mensaje", "Proceso cancelado.") : "OK";
         return resultado;
     }
 
@@ -138,7 +346,105 @@ public class MotorIvaRunner {
         }
     }
 
+    private long parseLong(String value) {
+        try {
+            return Long.parseLong(value.trim());
+        } catch (Exception ex) {
+            return 0L;
+        }
+    }
+
+    private double parseDouble(String value) {
+        try {
+            return Double.parseDouble(value.trim());
+        } catch (Exception ex) {
+            return 0.0;
+        }
+    }
+
+    public static class HojaInfo {
+        public String nombre;
+        public String dimension;
+        /** Encabezados de la fila 1; null si el motor no informo la metadata de la hoja. */
+        public List<String> encabezados;
+
+        public boolean tieneColumna(String columna) {
+            if (encabezados == null) {
+                return true;
+            }
+            for (String encabezado : encabezados) {
+                String norm = encabezado.trim().toLowerCase().replace(' ', '-').replace('_', '-');
+                if (norm.equals(columna)) {
+                    return true;
+                }
+            }
+            return false;
+        }
+
+        @Override
+        public String toString() {
+            return nombre;
+        }
+    }
+
+    /**
+     * Lista las hojas de un XLSX con su dimension y encabezado (si el motor lo informa).
+     */
+    public List<HojaInfo> describirHojas(File baseXlsx) throws IOException, InterruptedException {
+        if (servidorHabilitado()) {
+            Map<String, Object> pedido = new LinkedHashMap<>();
+            pedido.put("cmd", "list-sheets");
+            pedido.put("base", baseXlsx.getAbsolutePath());
+            Map<String, Object> respuesta = enviarAlServidor(pedido, null);
+            if (respuesta != null) {
+                if (!Boolean.TRUE.equals(respuesta.get("ok"))) {
+                    throw new IOException("ERROR: " + respuesta.get("error"));
+                }
+                List<HojaInfo> hojas = new ArrayList<>();
+                Object lista = respuesta.get("info");
+                if (lista instanceof List) {
+                    for (Object item : (List<?>) lista) {
+                        if (!(item instanceof Map)) {
+                            continue;
+                        }
+                        Map<?, ?> datos = (Map<?, ?>) item;
+                        HojaInfo hoja = new HojaInfo();
+                        hoja.nombre = String.valueOf(datos.get("name")).trim();
+                        hoja.dimension = datos.get("dimension") == null ? "" : String.valueOf(datos.get("dimension"));
+                        Object header = datos.get("header");
+                        if (header instanceof List) {
+                            hoja.encabezados = new ArrayList<>();
+                            for (Object valor : (List<?>) header) {
+                                hoja.encabezados.add(valor == null ? "" : String.valueOf(valor));
+                            }
+                        }
+                        if (!hoja.nombre.isEmpty()) {
+                            hojas.add(hoja);
+                        }
+                    }
+                    return hojas;
+                }
+            }
+        }
+        List<HojaInfo> hojas = new ArrayList<>();
+        for (String nombre : listarHojasProceso(baseXlsx)) {
+            HojaInfo hoja = new HojaInfo();
+            hoja.nombre = nombre;
+            hoja.dimension = "";
+            hojas.add(hoja);
+        }
+        return hojas;
+    }
+
     public List<String> listarHojas(File baseXlsx) throws IOException, InterruptedException {
+        List<String> sheets = new ArrayList<>();
+        for (HojaInfo hoja : describirHojas(baseXlsx)) {
+            sheets.add(hoja.nombre);
+        }
+        return sheets;
+    }
+
+    private List<String> listarHojasProceso(File baseXlsx) throws IOException, InterruptedException {
         Path motoresDir = findMotoresDir();
         if (motoresDir == null) {
             throw new FileNotFoundException("No se encontró la carpeta 'motores'.");
@@ -180,6 +486,397 @@ public class MotorIvaRunner {
         return sheets;
     }
 
+    /**
+     * Cierra el motor persistente si esta activo.
+     */
+    public synchronized void cerrar() {
+        if (servidor != null) {
+            servidor.cerrar();
+            servidor = null;
+        }
+    }
+
+    private boolean servidorHabilitado() {
+        if (servidorDeshabilitado) {
+            return false;
+        }
+        String flag = System.getenv("IVASINS_SERVE");
+        if (flag == null || flag.trim().isEmpty()) {
+            flag = System.getProperty("ivasins.serve");
+        }
+        if (flag == null) {
+            return true;
+        }
+        flag = flag.trim().toLowerCase();
+        return !(flag.equals("0") || flag.equals("false") || flag.equals("no") || flag.equals("off"));
+    }
+
+    /**
+     * Envia un pedido al motor persistente (--serve). Retorna null si el servidor no esta disponible,
+     * en cuyo caso el llamador ejecuta el motor como proceso independiente. Las lineas de avance que llegan antes
+     * de la respuesta se entregan al listener.
+     */
+    private synchronized Map<String, Object> enviarAlServidor(Map<String, Object> pedido,
+            ProgresoListener listener) {
+        try {
+            if (servidor == null || !servidor.vivo()) {
+                servidor = iniciarServidor();
+            }
+            pedido.put("id", siguienteId++);
+            servidor.escribir(pedido);
+        } catch (IOException ex) {
+            // Sin servidor (motor antiguo o arranque fallido) se usa el modo por proceso.
+            cerrar();
+            servidorDeshabilitado = true;
+            return null;
+        }
+        try {
+            while (true) {
+                Map<String, Object> respuesta = servidor.leerRespuesta();
+                if (!respuesta.containsKey("progreso")) {
+                    return respuesta;
+                }
+                notificar(listener, respuesta.get("progreso"));
+            }
+        } catch (IOException ex) {
+            // El pedido ya fue enviado: no se reintenta para no aplicar el reporte dos veces.
+            cerrar();
+            Map<String, Object> error = new LinkedHashMap<>();
+            error.put("ok", Boolean.FALSE);
+            error.put("error", ex.getMessage());
+            return error;
+        }
+    }
+
+    private MotorServidor iniciarServidor() throws IOException {
+        Path motoresDir = findMotoresDir();
+        if (motoresDir == null) {
+            throw new FileNotFoundException("No se encontró la carpeta 'motores'.");
+        }
+        Path motorDir = motoresDir.resolve("FormatearIva");
+        Path exe = motorDir.resolve("FormatearIva.exe");
+        Path py = motorDir.resolve("FormatearIva.py");
+        boolean useExe = Files.exists(exe);
+        if (!useExe && !Files.exists(py)) {
+            throw new FileNotFoundException("No se encontró FormatearIva.exe ni FormatearIva.py en: " + motorDir);
+        }
+        List<String> cmd = buildCommand(useExe, exe, py);
+        cmd.add("--serve");
+        MotorServidor nuevo = new MotorServidor(new ProcessBuilder(cmd).start());
+        // Saludo inicial: un motor sin --serve termina sin responder y se descarta aqui.
+        try {
+            Map<String, Object> ping = new LinkedHashMap<>();
+            ping.put("cmd", "ping");
+            nuevo.escribir(ping);
+            if (!Boolean.TRUE.equals(nuevo.leerRespuesta().get("ok"))) {
+                throw new IOException("El motor no acepto el modo persistente.");
+            }
+        } catch (IOException ex) {
+            nuevo.cerrar();
+            throw ex;
+        }
+        if (!hookRegistrado) {
+            Runtime.getRuntime().addShutdownHook(new Thread(this::cerrar, "motor-iva-cierre"));
+            hookRegistrado = true;
+        }
+        return nuevo;
+    }
+
+    /**
+     * Proceso del motor en modo --serve: un pedido JSON por linea en stdin y una respuesta por linea en stdout.
+     */
+    private static class MotorServidor {
+        private final Process process;
+        private final BufferedWriter writer;
+        private final BufferedReader reader;
+
+        MotorServidor(Process process) {
+            this.process = process;
+            this.writer = new BufferedWriter(new OutputStreamWriter(process.getOutputStream(), StandardCharsets.UTF_8));
+            this.reader = new BufferedReader(new InputStreamReader(process.getInputStream(), StandardCharsets.UTF_8));
+            // stderr se drena aparte para que no bloquee al motor ni se mezcle con el protocolo.
+            Thread drain = new Thread(() -> drenar(process.getErrorStream()), "motor-iva-stderr");
+            drain.setDaemon(true);
+            drain.start();
+        }
+
+        boolean vivo() {
+            return process.isAlive();
+        }
+
+        void escribir(Map<String, Object> pedido) throws IOException {
+            writer.write(Json.escribir(pedido));
+            writer.newLine();
+            writer.flush();
+        }
+
+        Map<String, Object> leerRespuesta() throws IOException {
+            String line = reader.readLine();
+            if (line == null) {
+                throw new IOException("El motor persistente termino inesperadamente.");
+            }
+            Object respuesta = Json.leer(line);
+            if (!(respuesta instanceof Map)) {
+                throw new IOException("Respuesta invalida del motor: " + line);
+            }
+            @SuppressWarnings("unchecked")
+            Map<String, Object> mapa = (Map<String, Object>) respuesta;
+            return mapa;
+        }
+
+        void cerrar() {
+            try {
+                if (process.isAlive()) {
+                    writer.write("{\"cmd\":\"exit\"}");
+                    writer.newLine();
+                    writer.flush();
+                }
+            } catch (IOException ex) {
+                // ignore
+            }
+            try {
+                writer.close();
+            } catch (IOException ex) {
+                // ignore
+            }
+            process.destroy();
+        }
+
+        private static void drenar(InputStream stream) {
+            byte[] buffer = new byte[4096];
+            try {
+                while (stream.read(buffer) != -1) {
+                    // descarta; las advertencias del motor quedan fuera del protocolo
+                }
+            } catch (IOException ex) {
+                // ignore
+            }
+        }
+    }
+
+    /**
+     * JSON minimo para el protocolo del motor (objetos, listas, strings, numeros, booleanos y null).
+     */
+    static final class Json {
+        private final String text;
+        private int pos;
+
+        private Json(String text) {
+            this.text = text;
+        }
+
+        static Object leer(String text) throws IOException {
+            Json json = new Json(text);
+            Object value = json.valor();
+            json.espacios();
+            if (json.pos != text.length()) {
+                throw new IOException("JSON invalido: " + text);
+            }
+            return value;
+        }
+
+        /** Como {@link #leer(String)} pero retorna null si el texto no es JSON valido. */
+        static Object leerSeguro(String text) {
+            try {
+                return leer(text);
+            } catch (IOException | RuntimeException ex) {
+                return null;
+            }
+        }
+
+        static String escribir(Object value) {
+            StringBuilder sb = new StringBuilder();
+            escribir(sb, value);
+            return sb.toString();
+        }
+
+        private static void escribir(StringBuilder sb, Object value) {
+            if (value == null) {
+                sb.append("null");
+            } else if (value instanceof Boolean || value instanceof Number) {
+                sb.append(value);
+            } else if (value instanceof Map) {
+                sb.append('{');
+                boolean first = true;
+                for (Map.Entry<?, ?> entry : ((Map<?, ?>) value).entrySet()) {
+                    if (!first) {
+                        sb.append(',');
+                    }
+                    first = false;
+                    escribir(sb, String.valueOf(entry.getKey()));
+                    sb.append(':');
+                    escribir(sb, entry.getValue());
+                }
+                sb.append('}');
+            } else if (value instanceof List) {
+                sb.append('[');
+                boolean first = true;
+                for (Object item : (List<?>) value) {
+                    if (!first) {
+                        sb.append(',');
+                    }
+                    first = false;
+                    escribir(sb, item);
+                }
+                sb.append(']');
+            } else {
+                String str = value.toString();
+                sb.append('"');
+                for (int i = 0; i < str.length(); i++) {
+                    char c = str.charAt(i);
+                    if (c == '"' || c == '\\') {
+                        sb.append('\\').append(c);
+                    } else if (c < 0x20) {
+                        sb.append(String.format("\\u%04x", (int) c));
+                    } else {
+                        sb.append(c);
+                    }
+                }
+                sb.append('"');
+            }
+        }
+
+        private void espacios() {
+            while (pos < text.length() && Character.isWhitespace(text.charAt(pos))) {
+                pos++;
+            }
+        }
+
+        private Object valor() throws IOException {
+            espacios();
+            if (pos >= text.length()) {
+                throw new IOException("JSON incompleto: " + text);
+            }
+            char c = text.charAt(pos);
+            if (c == '{') {
+                pos++;
+                Map<String, Object> map = new LinkedHashMap<>();
+                espacios();
+                if (pos < text.length() && text.charAt(pos) == '}') {
+                    pos++;
+                    return map;
+                }
+                while (true) {
+                    espacios();
+                    String key = cadena();
+                    espacios();
+                    esperar(':');
+                    map.put(key, valor());
+                    espacios();
+                    if (pos < text.length() && text.charAt(pos) == ',') {
+                        pos++;
+                        continue;
+                    }
+                    esperar('}');
+                    return map;
+                }
+            }
+            if (c == '[') {
+                pos++;
+                List<Object> list = new ArrayList<>();
+                espacios();
+                if (pos < text.length() && text.charAt(pos) == ']') {
+                    pos++;
+                    return list;
+                }
+                while (true) {
+                    list.add(valor());
+                    espacios();
+                    if (pos < text.length() && text.charAt(pos) == ',') {
+                        pos++;
+                        continue;
+                    }
+                    esperar(']');
+                    return list;
+                }
+            }
+            if (c == '"') {
+                return cadena();
+            }
+            if (text.startsWith("true", pos)) {
+                pos += 4;
+                return Boolean.TRUE;
+            }
+            if (text.startsWith("false", pos)) {
+                pos += 5;
+                return Boolean.FALSE;
+            }
+            if (text.startsWith("null", pos)) {
+                pos += 4;
+                return null;
+            }
+            int start = pos;
+            while (pos < text.length() && "+-0123456789.eE".indexOf(text.charAt(pos)) >= 0) {
+                pos++;
+            }
+            if (start == pos) {
+                throw new IOException("JSON invalido: " + text);
+            }
+            String number = text.substring(start, pos);
+            try {
+                if (number.indexOf('.') < 0 && number.indexOf('e') < 0 && number.indexOf('E') < 0) {
+                    return Long.parseLong(number);
+                }
+                return Double.parseDouble(number);
+            } catch (NumberFormatException ex) {
+                throw new IOException("Numero JSON invalido: " + number);
+            }
+        }
+
+        private String cadena() throws IOException {
+            esperar('"');
+            StringBuilder sb = new StringBuilder();
+            while (pos < text.length()) {
+                char c = text.charAt(pos++);
+                if (c == '"') {
+                    return sb.toString();
+                }
+                if (c != '\\') {
+                    sb.append(c);
+                    continue;
+                }
+                if (pos >= text.length()) {
+                    break;
+                }
+                char esc = text.charAt(pos++);
+                switch (esc) {
+                    case 'n':
+                        sb.append('\n');
+                        break;
+                    case 'r':
+                        sb.append('\r');
+                        break;
+                    case 't':
+                        sb.append('\t');
+                        break;
+                    case 'b':
+                        sb.append('\b');
+                        break;
+                    case 'f':
+                        sb.append('\f');
+                        break;
+                    case 'u':
+                        if (pos + 4 > text.length()) {
+                            throw new IOException("Escape JSON invalido: " + text);
+                        }
+                        sb.append((char) Integer.parseInt(text.substring(pos, pos + 4), 16));
+                        pos += 4;
+                        break;
+                    default:
+                        sb.append(esc);
+                }
+            }
+            throw new IOException("String JSON sin cerrar: " + text);
+        }
+
+        private void esperar(char c) throws IOException {
+            if (pos >= text.length() || text.charAt(pos) != c) {
+                throw new IOException("JSON invalido, se esperaba '" + c + "': " + text);
+            }
+            pos++;
+        }
+    }
+
     private List<String> buildCommand(boolean useExe, Path exe, Path py) {
         List<String> cmd = new ArrayList<>();
         if (useExe) {
@@ -19,11 +19,18 @@ import java.io.BufferedReader;
 import java.io.File;
 import java.io.FileNotFoundException;
 import java.io.IOException;
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
+import java.nio.channels.Channels;
+import java.nio.channels.FileChannel;
 import java.nio.charset.StandardCharsets;
 import java.nio.file.Files;
 import java.nio.file.Path;
 import java.nio.file.Paths;
+import java.nio.file.StandardOpenOption;
+import java.util.Arrays;
 import java.util.List;
+import java.util.Map;
 import java.util.regex.Pattern;
 
 import javax.swing.BorderFactory;
@@ -52,6 +59,7 @@ import control.MotorIvaRunner;
 public class Principal extends JFrame {
 
     private static final long serialVersionUID = 1L;
+    private static final String[] REPORTE_EXTENSIONES = { "txt", "gz", "bz2", "xz", "zip" };
 
     private JPanel rootPanel;
     private JPanel panelTop;
@@ -65,6 +73,10 @@ public class Principal extends JFrame {
     private JLabel lblStatus;
     private JButton btnPreview;
     private JButton btnClear;
+    private JButton btnCancel;
+    private JButton btnPaginaAnterior;
+    private JButton btnPaginaSiguiente;
+    private JLabel lblPagina;
     private JButton btnBuscarBase;
     private JButton btnBuscarReporte;
     private JButton btnHelp;
@@ -75,6 +87,9 @@ public class Principal extends JFrame {
     private JMenu mnTitle;
 
     private File tempPreview;
+    /** Indice de paginas de la vista previa actual (null si el motor no lo genero). */
+    private IndicePreview indicePreview;
+    private int paginaPreview;
     private File tempResumen;
     private final MotorIvaRunner runner = new MotorIvaRunner();
 
@@ -117,6 +132,9 @@ public class Principal extends JFrame {
         btnBuscarReporte.addActionListener(e -> onSelectReporte());
         btnPreview.addActionListener(e -> onProcess());
         btnClear.addActionListener(e -> onClear());
+        btnCancel.addActionListener(e -> onCancel());
+        btnPaginaAnterior.addActionListener(e -> onPagina(paginaPreview - 1));
+        btnPaginaSiguiente.addActionListener(e -> onPagina(paginaPreview + 1));
 
         installFileDrop(rootPanel);
         installFileDrop(panelTop);
@@ -134,7 +152,7 @@ public class Principal extends JFrame {
     }
 
     private void onSelectReporte() {
-        File file = chooseOpenFile("Selecciona el reporte .txt", new String[] { "txt" });
+        File file = chooseOpenFile("Selecciona el reporte (.txt o comprimido)", REPORTE_EXTENSIONES);
         if (file != null) {
             txtReporte.setText(file.getAbsolutePath());
         }
@@ -149,19 +167,19 @@ public class Principal extends JFrame {
             showError("La base debe ser un archivo .csv o .xlsx.");
             return;
         }
-        File reporte = getFileFromField(txtReporte, "reporte .txt");
+        File reporte = getFileFromField(txtReporte, "reporte");
         if (reporte == null) {
             return;
         }
-        if (!isTxt(reporte)) {
-            showError("El reporte debe ser un archivo .txt.");
+        if (!isReporte(reporte)) {
+            showError("El reporte debe ser un archivo .txt, .gz, .bz2, .xz o .zip.");
             return;
         }
         String sheetName = resolveSheetName(base);
         if (isXlsx(base) && sheetName == null) {
             return;
         }
-        runMotor(base, reporte, sheetName);
+        runMotor(base, reporte, sheetName, false);
     }
 
     private void onClear() {
@@ -171,13 +189,27 @@ public class Principal extends JFrame {
         lblStatus.setText("Listo. Arrastra archivos .csv/.xlsx y .txt o usa Buscar.");
         tempPreview = null;
         tempResumen = null;
+        indicePreview = null;
+        actualizarPaginacion();
     }
 
-    private void runMotor(File base, File reporte, String sheetName) {
+    private void onPagina(int pagina) {
+        if (tempPreview == null || indicePreview == null || pagina < 0 || pagina >= indicePreview.paginas.length) {
+            return;
+        }
+        try {
+            loadPreview(tempPreview, pagina);
+        } catch (IOException ex) {
+            showError(ex.getMessage());
+        }
+    }
+
+    private void runMotor(File base, File reporte, String sheetName, boolean forzar) {
         setButtonsEnabled(false);
         lblStatus.setText("Procesando...");
 
-        SwingWorker<MotorIvaRunner.Resultado, Void> worker = new SwingWorker<MotorIvaRunner.Resultado, Void>() {
+        SwingWorker<MotorIvaRunner.Resultado, MotorIvaRunner.Progreso> worker =
+                new SwingWorker<MotorIvaRunner.Resultado, MotorIvaRunner.Progreso>() {
             @Override
             protected MotorIvaRunner.Resultado doInBackground() throws Exception {
                 File tempDir = new File(System.getProperty("java.io.tmpdir"), "IvaAsins");
@@ -187,7 +219,18 @@ public class Principal extends JFrame {
                 tempPreview = new File(tempDir, "IvaAsins.preview.csv");
                 tempResumen = new File(tempDir, "IvaAsins.resumen");
                 File reporteOut = new File(base.getParentFile(), "Reporte_Iva_Process.txt");
-                return runner.ejecutar(base, reporte, tempPreview, tempResumen, reporteOut, sheetName);
+                return runner.ejecutar(base, reporte, tempPreview, tempResumen, reporteOut, sheetName,
+                        progreso -> publish(progreso), forzar);
+            }
+
+            @Override
+            protected void process(List<MotorIvaRunner.Progreso> avances) {
+                MotorIvaRunner.Progreso progreso = avances.get(avances.size() - 1);
+                // Una vez que empieza la escritura de la base ya no se puede cancelar.
+                if ("escritura_base".equals(progreso.fase)) {
+                    btnCancel.setEnabled(false);
+                }
+                lblStatus.setText(textoProgreso(progreso));
             }
 
             @Override
@@ -195,12 +238,30 @@ public class Principal extends JFrame {
                 setButtonsEnabled(true);
                 try {
                     MotorIvaRunner.Resultado resultado = get();
+                    if (resultado.cancelado) {
+                        lblStatus.setText("Proceso cancelado durante " + nombreFase(resultado.canceladoFase)
+                                + ". La base no se modifico.");
+                        return;
+                    }
+                    if (resultado.ok && resultado.yaAplicado) {
+                        loadPreview(tempPreview, 0);
+                        lblStatus.setText("El reporte ya estaba aplicado a esta base (" + resultado.yaAplicadoFecha
+                                + "). No se hicieron cambios.");
+                        int opcion = JOptionPane.showConfirmDialog(Principal.this,
+                                "El reporte ya fue aplicado a esta base el " + resultado.yaAplicadoFecha
+                                        + ".\n¿Procesarlo de todos modos?",
+                                "Reporte ya aplicado", JOptionPane.YES_NO_OPTION);
+                        if (opcion == JOptionPane.YES_OPTION) {
+                            runMotor(base, reporte, sheetName, true);
+                        }
+                        return;
+                    }
                     if (!resultado.ok) {
                         showError(resultado.mensaje);
                         lblStatus.setText("Error en el proceso.");
                         return;
                     }
-                    loadPreview(tempPreview, 100);
+                    loadPreview(tempPreview, 0);
                     lblStatus.setText("Base actualizada. Agregados: " + resultado.agregados
                             + " | Modificados: " + resultado.modificados
                             + " | Reporte: Reporte_Iva_Process.txt");
@@ -272,12 +333,20 @@ public class Principal extends JFrame {
         return name.endsWith(".csv") || name.endsWith(".xlsx");
     }
 
-    private boolean isTxt(File file) {
+    private boolean isReporte(File file) {
         if (file == null) {
             return false;
         }
-        String name = file.getName().toLowerCase();
-        return name.endsWith(".txt");
+        return isReporteName(file.getName().toLowerCase());
+    }
+
+    private boolean isReporteName(String name) {
+        for (String ext : REPORTE_EXTENSIONES) {
+            if (name.endsWith("." + ext)) {
+                return true;
+            }
+        }
+        return false;
     }
 
     private String resolveSheetName(File base) {
@@ -285,53 +354,87 @@ public class Principal extends JFrame {
             return null;
         }
         try {
-            List<String> sheets = runner.listarHojas(base);
+            List<MotorIvaRunner.HojaInfo> sheets = runner.describirHojas(base);
             if (sheets == null || sheets.isEmpty()) {
                 showError("No se encontraron hojas en el archivo XLSX.");
                 return null;
             }
             String target = "IVA's Base de Datos";
-            for (String sheet : sheets) {
-                if (sheet.equalsIgnoreCase(target)) {
-                    return sheet;
+            MotorIvaRunner.HojaInfo selected = null;
+            for (MotorIvaRunner.HojaInfo sheet : sheets) {
+                if (sheet.nombre.equalsIgnoreCase(target)) {
+                    selected = sheet;
+                    break;
                 }
             }
-            Object selection = JOptionPane.showInputDialog(this,
-                    "No se encontró la hoja \"IVA's Base de Datos\". Selecciona una hoja:",
-                    "Seleccionar hoja", JOptionPane.QUESTION_MESSAGE, null,
-                    sheets.toArray(new String[0]), sheets.get(0));
-            return selection == null ? null : selection.toString();
+            if (selected == null) {
+                Object selection = JOptionPane.showInputDialog(this,
+                        "No se encontró la hoja \"IVA's Base de Datos\". Selecciona una hoja:",
+                        "Seleccionar hoja", JOptionPane.QUESTION_MESSAGE, null,
+                        sheets.toArray(new MotorIvaRunner.HojaInfo[0]), sheets.get(0));
+                if (selection == null) {
+                    return null;
+                }
+                selected = (MotorIvaRunner.HojaInfo) selection;
+            }
+            // Valida las columnas antes de lanzar el proceso completo.
+            if (!selected.tieneColumna("asin") || !selected.tieneColumna("iva")) {
+                showError("La hoja \"" + selected.nombre + "\" no tiene las columnas ASIN e IVA en la fila 1.");
+                return null;
+            }
+            return selected.nombre;
         } catch (Exception ex) {
             showError("No se pudieron leer las hojas del XLSX: " + ex.getMessage());
             return null;
         }
     }
 
-    private void loadPreview(File file, int maxRows) throws IOException {
+    /**
+     * Muestra una pagina de la vista previa. Con el indice del motor ({@code <preview>.ivapag}) se salta directo al
+     * inicio de la pagina; sin indice solo se muestra la primera.
+     */
+    private void loadPreview(File file, int pagina) throws IOException {
+        indicePreview = leerIndicePreview(file);
+        if (indicePreview == null || pagina >= indicePreview.paginas.length) {
+            pagina = 0;
+        }
+        paginaPreview = pagina;
+        String headerLine;
         try (BufferedReader reader = Files.newBufferedReader(file.toPath(), StandardCharsets.UTF_8)) {
-            String headerLine = reader.readLine();
-            if (headerLine == null) {
-                tablePreview.setModel(new DefaultTableModel());
-                return;
+            headerLine = reader.readLine();
+        }
+        if (headerLine == null) {
+            tablePreview.setModel(new DefaultTableModel());
+            actualizarPaginacion();
+            return;
+        }
+        String delimiter = detectDelimiter(headerLine);
+        String[] headers = splitLine(headerLine, delimiter);
+        if (headers.length > 0 && headers[headers.length - 1].isEmpty()) {
+            String[] trimmed = new String[headers.length - 1];
+            System.arraycopy(headers, 0, trimmed, 0, trimmed.length);
+            headers = trimmed;
+        }
+        DefaultTableModel model = new DefaultTableModel(headers, 0) {
+            private static final long serialVersionUID = 1L;
+
+            @Override
+            public boolean isCellEditable(int row, int column) {
+                return false;
+            }
+        };
+        int maxRows = indicePreview == null ? FILAS_PAGINA_PREVIEW : indicePreview.filasPorPagina;
+        try (FileChannel channel = FileChannel.open(file.toPath(), StandardOpenOption.READ)) {
+            if (indicePreview != null && indicePreview.paginas.length > 0) {
+                channel.position(indicePreview.paginas[pagina]);
             }
-            String delimiter = detectDelimiter(headerLine);
-            String[] headers = splitLine(headerLine, delimiter);
-            if (headers.length > 0 && headers[headers.length - 1].isEmpty()) {
-                String[] trimmed = new String[headers.length - 1];
-                System.arraycopy(headers, 0, trimmed, 0, trimmed.length);
-                headers = trimmed;
+            BufferedReader reader = new BufferedReader(Channels.newReader(channel, StandardCharsets.UTF_8.name()));
+            if (indicePreview == null || indicePreview.paginas.length == 0) {
+                reader.readLine();
             }
-            DefaultTableModel model = new DefaultTableModel(headers, 0) {
-                private static final long serialVersionUID = 1L;
-
-                @Override
-                public boolean isCellEditable(int row, int column) {
-                    return false;
-                }
-            };
             String line;
             int count = 0;
-            while ((line = reader.readLine()) != null && count < maxRows) {
+            while (count < maxRows && (line = reader.readLine()) != null) {
                 String[] row = splitLine(line, delimiter);
                 if (row.length > headers.length) {
                     String[] trimmedRow = new String[headers.length];
@@ -345,8 +448,58 @@ public class Principal extends JFrame {
                 model.addRow(row);
                 count++;
             }
-            tablePreview.setModel(model);
         }
+        tablePreview.setModel(model);
+        actualizarPaginacion();
+    }
+
+    private static final int FILAS_PAGINA_PREVIEW = 100;
+    private static final byte[] MAGIA_INDICE_PREVIEW = "IVAPAG01".getBytes(StandardCharsets.US_ASCII);
+
+    /** Indice de paginas de la vista previa: offset en bytes del inicio de cada pagina. */
+    private static class IndicePreview {
+        int filasPorPagina;
+        long filas;
+        long[] paginas;
+    }
+
+    /**
+     * Lee {@code <preview>.ivapag} (cabecera little-endian: magia, tamano de la preview, filas por pagina, filas y
+     * cantidad de paginas, seguida de un uint64 por pagina). Retorna null si falta o no describe la preview actual.
+     */
+    private IndicePreview leerIndicePreview(File preview) {
+        Path path = Paths.get(preview.getPath() + ".ivapag");
+        if (!Files.isRegularFile(path)) {
+            return null;
+        }
+        try {
+            ByteBuffer buffer = ByteBuffer.wrap(Files.readAllBytes(path)).order(ByteOrder.LITTLE_ENDIAN);
+            byte[] magia = new byte[MAGIA_INDICE_PREVIEW.length];
+            buffer.get(magia);
+            if (!Arrays.equals(magia, MAGIA_INDICE_PREVIEW) || buffer.getLong() != preview.length()) {
+                return null;
+            }
+            IndicePreview indice = new IndicePreview();
+            indice.filasPorPagina = (int) buffer.getLong();
+            indice.filas = buffer.getLong();
+            int cantidad = (int) buffer.getLong();
+            if (indice.filasPorPagina <= 0 || buffer.remaining() != cantidad * 8L) {
+                return null;
+            }
+            indice.paginas = new long[cantidad];
+            buffer.asLongBuffer().get(indice.paginas);
+            return indice;
+        } catch (IOException | RuntimeException ex) {
+            return null;
+        }
+    }
+
+    private void actualizarPaginacion() {
+        int total = indicePreview == null ? 0 : indicePreview.paginas.length;
+        btnPaginaAnterior.setEnabled(total > 1 && paginaPreview > 0);
+        btnPaginaSiguiente.setEnabled(total > 1 && paginaPreview < total - 1);
+        lblPagina.setText(total > 1 ? String.format("Pagina %,d de %,d (%,d filas)", paginaPreview + 1, total,
+                indicePreview.filas) : "");
     }
 
     private String detectDelimiter(String line) {
@@ -379,6 +532,42 @@ public class Principal extends JFrame {
     private void setButtonsEnabled(boolean enabled) {
         btnPreview.setEnabled(enabled);
         btnClear.setEnabled(enabled);
+        // Cancelar solo aplica mientras el motor esta en ejecucion.
+        btnCancel.setEnabled(!enabled);
+        // Mientras el motor corre la vista previa se esta reescribiendo; no se pagina.
+        if (enabled) {
+            actualizarPaginacion();
+        } else {
+            btnPaginaAnterior.setEnabled(false);
+            btnPaginaSiguiente.setEnabled(false);
+        }
+    }
+
+    private void onCancel() {
+        btnCancel.setEnabled(false);
+        lblStatus.setText("Cancelando...");
+        try {
+            runner.cancelar();
+        } catch (IOException ex) {
+            showError("No se pudo cancelar el proceso: " + ex.getMessage());
+        }
+    }
+
+    private String textoProgreso(MotorIvaRunner.Progreso progreso) {
+        StringBuilder texto = new StringBuilder("Procesando: ").append(nombreFase(progreso.fase));
+        if (progreso.filas > 0) {
+            texto.append(String.format(" | %,d filas", progreso.filas));
+        }
+        if (progreso.filasPorSegundo > 0) {
+            texto.append(String.format(" (%,d/s)", progreso.filasPorSegundo));
+        }
+        if (progreso.porcentaje >= 0) {
+            texto.append(String.format(" | %.0f%%", progreso.porcentaje));
+        }
+        if (progreso.etaSegundos >= 0) {
+            texto.append(String.format(" | restan %.0f s", progreso.etaSegundos));
+        }
+        return texto.toString();
     }
 
     private void showError(String message) {
@@ -422,6 +611,10 @@ public class Principal extends JFrame {
         styleTextField(txtReporte, cardBg, border);
         stylePrimaryButton(btnPreview, accent, Color.WHITE);
         styleSecondaryButton(btnClear, accentSoft, textPrimary, border);
+        styleSecondaryButton(btnCancel, accentSoft, textPrimary, border);
+        styleSecondaryButton(btnPaginaAnterior, accentSoft, textPrimary, border);
+        styleSecondaryButton(btnPaginaSiguiente, accentSoft, textPrimary, border);
+        lblPagina.setForeground(textSecondary);
         styleSecondaryButton(btnBuscarBase, accentSoft, textPrimary, border);
         styleSecondaryButton(btnBuscarReporte, accentSoft, textPrimary, border);
         styleHelpButton(btnHelp, accent, Color.WHITE);
@@ -605,13 +798,63 @@ public class Principal extends JFrame {
         lines.append("\n");
         lines.append(String.format("%-28s %8d%n", "Total base antes", baseOriginal));
         lines.append(String.format("%-28s %8d%n", "Total base despues", baseFinal));
+        if ("DIFERENCIAS".equals(resultado.verificacion)) {
+            lines.append(String.format("%-28s %8d%n", "Verificacion: diferencias", resultado.verificacionDiferencias));
+            lines.append(String.format("%-28s %8d%n", "Primera fila con error", resultado.verificacionPrimerError));
+        } else if ("OK".equals(resultado.verificacion)) {
+            lines.append(String.format("%-28s %8s%n", "Verificacion hoja", "OK"));
+        }
+        if (!resultado.tiemposMs.isEmpty()) {
+            lines.append("\n");
+            lines.append(String.format("%-28s %8s %10s%n", "Fase", "ms", "pico MB"));
+            for (Map.Entry<String, Long> fase : resultado.tiemposMs.entrySet()) {
+                Double memoria = resultado.memoriaPicoMb.get(fase.getKey());
+                lines.append(String.format("%-28s %8d %10s%n", nombreFase(fase.getKey()), fase.getValue(),
+                        memoria == null ? "-" : String.format("%.1f", memoria)));
+            }
+            lines.append(String.format("%-28s %8d %10.1f%n", "Total", resultado.tiempoTotalMs,
+                    resultado.memoriaMaximaMb));
+            for (Map.Entry<String, Long> filas : resultado.filasPorSegundo.entrySet()) {
+                lines.append(String.format("%-28s %8d%n", "Filas/s " + nombreFase(filas.getKey()), filas.getValue()));
+            }
+        }
         lines.append("\n");
         lines.append("Se genero Reporte_Iva_Process.txt junto a la base.");
+        if (resultado.perfil != null) {
+            lines.append("\nPerfil: " + resultado.perfil.getName());
+        }
 
         String html = "<html><pre>" + lines.toString();
         JOptionPane.showMessageDialog(this, html, "Resumen", JOptionPane.INFORMATION_MESSAGE);
     }
 
+    private String nombreFase(String fase) {
+        switch (fase) {
+            case "ledger":
+                return "Registro de reportes";
+            case "carga_base":
+                return "Carga base";
+            case "parseo_reportes":
+                return "Parseo reportes";
+            case "fusion":
+                return "Fusion";
+            case "escritura_base":
+                return "Escritura base";
+            case "excel":
+                return "Excel";
+            case "verificacion":
+                return "Verificacion";
+            case "preview":
+                return "Previsualizacion";
+            case "resumen":
+                return "Resumen";
+            case "reporte_detalle":
+                return "Reporte detallado";
+            default:
+                return fase;
+        }
+    }
+
     private void installFileDrop(Component component) {
         if (component == null) {
             return;
@@ -686,13 +929,13 @@ public class Principal extends JFrame {
             if (name.endsWith(".csv") || name.endsWith(".xlsx")) {
                 txtBase.setText(file.getAbsolutePath());
                 assigned = true;
-            } else if (name.endsWith(".txt")) {
+            } else if (isReporteName(name)) {
                 txtReporte.setText(file.getAbsolutePath());
                 assigned = true;
             }
         }
         if (!assigned) {
-            showError("Solo se aceptan archivos .csv/.xlsx o .txt.");
+            showError("Solo se aceptan archivos .csv/.xlsx o reportes .txt/.gz/.bz2/.xz/.zip.");
             return false;
         }
         lblStatus.setText("Archivos cargados por arrastre.");
@@ -747,7 +990,7 @@ public class Principal extends JFrame {
                 null, null));
 
         JLabel lblReporte = new JLabel();
-        lblReporte.setText("Reporte Amazon (.txt)");
+        lblReporte.setText("Reporte Amazon (.txt/.gz/.zip)");
         panelFields.add(lblReporte, new GridConstraints(1, 0, 1, 1, GridConstraints.ANCHOR_WEST,
                 GridConstraints.FILL_NONE, GridConstraints.SIZEPOLICY_FIXED, GridConstraints.SIZEPOLICY_FIXED, null,
                 null, null));
@@ -777,6 +1020,25 @@ public class Principal extends JFrame {
         btnClear.setText("Limpiar");
         panelButtons.add(btnClear);
 
+        btnCancel = new JButton();
+        btnCancel.setText("Cancelar");
+        btnCancel.setEnabled(false);
+        panelButtons.add(btnCancel);
+
+        btnPaginaAnterior = new JButton();
+        btnPaginaAnterior.setText("<");
+        btnPaginaAnterior.setEnabled(false);
+        panelButtons.add(btnPaginaAnterior);
+
+        lblPagina = new JLabel();
+        lblPagina.setText("");
+        panelButtons.add(lblPagina);
+
+        btnPaginaSiguiente = new JButton();
+        btnPaginaSiguiente.setText(">");
+        btnPaginaSiguiente.setEnabled(false);
+        panelButtons.add(btnPaginaSiguiente);
+
         scrollPane = new JScrollPane();
         rootPanel.add(scrollPane, BorderLayout.CENTER);
 